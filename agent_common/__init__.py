@@ -0,0 +1 @@
+"""Modules shared by the agents: response caching, metrics and the tool worker pool."""
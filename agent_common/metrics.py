@@ -0,0 +1,377 @@
+import bisect
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Optional, Sequence
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event
+from google.adk.models import LlmRequest, LlmResponse
+from google.adk.plugins.base_plugin import BasePlugin
+from google.adk.tools.base_tool import BaseTool
+from google.adk.tools.tool_context import ToolContext
+from google.genai import types
+from opentelemetry import trace
+
+logger = logging.getLogger(__name__)
+tracer = trace.get_tracer(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_registry: list["_Metric"] = []
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: dict[str, Any]) -> tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return super().render() + [f"{self.name}{self._labels(k)} {v:g}" for k, v in values]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (last one is +Inf), sum]
+        self._values: dict[tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = [(k, list(counts), total) for k, (counts, total) in self._values.items()]
+        lines = super().render()
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                labels = self._labels(key, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {total:g}")
+            lines.append(f"{self.name}_count{self._labels(key)} {cumulative}")
+        return lines
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    return "\n".join(line for metric in _registry for line in metric.render()) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+http_requests = Counter(
+    "http_requests_total", "HTTP requests served.", ("method", "route", "status")
+)
+http_request_seconds = Histogram(
+    "http_request_duration_seconds",
+    "Time from receiving a request to sending the last byte of its response.",
+    ("method", "route"),
+)
+http_request_bytes = Counter("http_request_bytes_total", "Request body bytes received.", ("route",))
+http_response_bytes = Counter("http_response_bytes_total", "Response body bytes sent.", ("route",))
+
+model_call_seconds = Histogram(
+    "agent_model_call_duration_seconds", "Time spent in each model call.", ("agent", "model")
+)
+model_payload_bytes = Counter(
+    "agent_model_payload_bytes_total",
+    "Approximate bytes of text, tool calls and tool results sent to and received from the model.",
+    ("agent", "direction"),
+)
+tool_call_seconds = Histogram(
+    "agent_tool_duration_seconds", "Time spent in each tool call.", ("tool", "outcome")
+)
+tool_response_bytes = Counter(
+    "agent_tool_response_bytes_total", "Approximate bytes of tool results.", ("tool",)
+)
+agent_events = Counter("agent_events_total", "Runner events by kind.", ("author", "kind"))
+invocation_seconds = Histogram(
+    "agent_invocation_duration_seconds",
+    "Time per agent turn, in total and spent in model calls and in tools. What is left "
+    "of a request's duration after the turn is session and serialization overhead.",
+    ("phase",),
+)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording the latency, status and body sizes of every request,
+    labelled by route template so ids in paths do not create new series. Each request
+    also runs in an OpenTelemetry span, the parent of ADK's invocation, model and tool
+    spans.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        sizes = {"request": 0, "response": 0}
+        status = {"code": 500}
+
+        async def counting_receive():
+            message = await receive()
+            sizes["request"] += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            elif message["type"] == "http.response.body":
+                sizes["response"] += len(message.get("body", b""))
+            await send(message)
+
+        with tracer.start_as_current_span(
+            f"{scope['method']} {scope['path']}", kind=trace.SpanKind.SERVER
+        ) as span:
+            try:
+                await self.app(scope, counting_receive, counting_send)
+            finally:
+                route = getattr(scope.get("route"), "path", None) or "unmatched"
+                span.set_attribute("http.status_code", status["code"])
+                span.set_attribute("http.response.body.size", sizes["response"])
+                http_requests.inc(method=scope["method"], route=route, status=status["code"])
+                http_request_seconds.observe(
+                    time.perf_counter() - start, method=scope["method"], route=route
+                )
+                http_request_bytes.inc(sizes["request"], route=route)
+                http_response_bytes.inc(sizes["response"], route=route)
+
+
+@dataclass
+class _Invocation:
+    start: float = field(default_factory=time.perf_counter)
+    model_seconds: float = 0.0
+    model_calls: int = 0
+    tool_seconds: float = 0.0
+    tool_calls: int = 0
+    # (agent name or function call id) -> start time of the call in progress
+    pending: dict[str, float] = field(default_factory=dict)
+
+
+class MetricsPlugin(BasePlugin):
+    """
+    Runner plugin timing every model call and tool call, counting runner events and
+    the bytes exchanged with the model and tools, and logging how each turn's time
+    split between the model and tools. Every runner event is also added to the
+    current trace span.
+    """
+
+    def __init__(self):
+        super().__init__(name="metrics")
+        self._invocations: dict[str, _Invocation] = {}
+
+    async def before_run_callback(self, *, invocation_context: InvocationContext) -> None:
+        self._invocations[invocation_context.invocation_id] = _Invocation()
+
+    async def before_model_callback(
+        self, *, callback_context: CallbackContext, llm_request: LlmRequest
+    ) -> Optional[LlmResponse]:
+        invocation = self._invocations.get(callback_context.invocation_id)
+        if invocation is not None:
+            # A model call answered by a before_model_callback never gets an after call;
+            # the next model call simply replaces its start time.
+            invocation.pending[callback_context.agent_name] = time.perf_counter()
+        model_payload_bytes.inc(
+            sum(_content_bytes(content) for content in llm_request.contents),
+            agent=callback_context.agent_name,
+            direction="request",
+        )
+        return None
+
+    async def after_model_callback(
+        self, *, callback_context: CallbackContext, llm_response: LlmResponse
+    ) -> Optional[LlmResponse]:
+        if llm_response.partial:
+            return None
+        invocation = self._invocations.get(callback_context.invocation_id)
+        start = invocation.pending.pop(callback_context.agent_name, None) if invocation else None
+        if start is not None:
+            elapsed = time.perf_counter() - start
+            invocation.model_seconds += elapsed
+            invocation.model_calls += 1
+            model_call_seconds.observe(
+                elapsed,
+                agent=callback_context.agent_name,
+                model=llm_response.model_version or "unknown",
+            )
+        model_payload_bytes.inc(
+            _content_bytes(llm_response.content),
+            agent=callback_context.agent_name,
+            direction="response",
+        )
+        return None
+
+    async def before_tool_callback(
+        self, *, tool: BaseTool, tool_args: dict[str, Any], tool_context: ToolContext
+    ) -> Optional[dict]:
+        invocation = self._invocations.get(tool_context.invocation_id)
+        if invocation is not None:
+            invocation.pending[tool_context.function_call_id or tool.name] = time.perf_counter()
+        return None
+
+    async def after_tool_callback(
+        self,
+        *,
+        tool: BaseTool,
+        tool_args: dict[str, Any],
+        tool_context: ToolContext,
+        result: Any,
+    ) -> Optional[dict]:
+        failed = isinstance(result, dict) and result.get("status") == "error"
+        self._record_tool(tool, tool_context, "error" if failed else "ok")
+        size = _payload_bytes(result)
+        tool_response_bytes.inc(size, tool=tool.name)
+        trace.get_current_span().set_attribute("tool.response.size", size)
+        return None
+
+    async def on_tool_error_callback(
+        self,
+        *,
+        tool: BaseTool,
+        tool_args: dict[str, Any],
+        tool_context: ToolContext,
+        error: Exception,
+    ) -> Optional[dict]:
+        self._record_tool(tool, tool_context, "exception")
+        return None
+
+    async def on_event_callback(
+        self, *, invocation_context: InvocationContext, event: Event
+    ) -> Optional[Event]:
+        kind = _event_kind(event)
+        agent_events.inc(author=event.author, kind=kind)
+        trace.get_current_span().add_event(
+            "agent_event",
+            {"author": event.author, "kind": kind, "bytes": _content_bytes(event.content)},
+        )
+        return None
+
+    async def after_run_callback(self, *, invocation_context: InvocationContext) -> None:
+        invocation = self._invocations.pop(invocation_context.invocation_id, None)
+        if invocation is None:
+            return
+        total = time.perf_counter() - invocation.start
+        invocation_seconds.observe(total, phase="total")
+        invocation_seconds.observe(invocation.model_seconds, phase="model")
+        invocation_seconds.observe(invocation.tool_seconds, phase="tool")
+        logger.info(
+            f"Invocation {invocation_context.invocation_id} took {total:.3f}s: "
+            f"model {invocation.model_seconds:.3f}s (calls: {invocation.model_calls}), "
+            f"tools {invocation.tool_seconds:.3f}s (calls: {invocation.tool_calls})"
+        )
+
+    async def on_run_error_callback(
+        self, *, invocation_context: InvocationContext, error: Exception
+    ) -> None:
+        self._invocations.pop(invocation_context.invocation_id, None)
+
+    def _record_tool(self, tool: BaseTool, tool_context: ToolContext, outcome: str) -> None:
+        invocation = self._invocations.get(tool_context.invocation_id)
+        if invocation is None:
+            return
+        start = invocation.pending.pop(tool_context.function_call_id or tool.name, None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        # Tools of one turn may run in parallel, so this can exceed the turn's wall time.
+        invocation.tool_seconds += elapsed
+        invocation.tool_calls += 1
+        tool_call_seconds.observe(elapsed, tool=tool.name, outcome=outcome)
+
+
+def _event_kind(event: Event) -> str:
+    parts = event.content.parts if event.content and event.content.parts else []
+    if any(part.function_call for part in parts):
+        return "tool_call"
+    if any(part.function_response for part in parts):
+        return "tool_result"
+    if event.partial:
+        return "partial_text"
+    return "text" if parts else "other"
+
+
+def _content_bytes(content: Optional[types.Content]) -> int:
+    if content is None or not content.parts:
+        return 0
+    size = 0
+    for part in content.parts:
+        if part.text:
+            size += len(part.text)
+        if part.function_call:
+            size += _payload_bytes(part.function_call.args)
+        if part.function_response:
+            size += _payload_bytes(part.function_response.response)
+    return size
+
+
+def _payload_bytes(value: Any) -> int:
+    """
+    Approximate serialized size of a tool payload: string lengths plus a few bytes
+    per scalar, without serializing it a second time.
+    """
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(len(str(k)) + _payload_bytes(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(_payload_bytes(v) for v in value)
+    return 8
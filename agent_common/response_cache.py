@@ -0,0 +1,170 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmRequest, LlmResponse
+from google.genai import types
+
+logger = logging.getLogger(__name__)
+
+# Returns a string that changes whenever state the model's answer may depend on
+# changes, e.g. the number of habits a user has logged.
+Fingerprint = Callable[[CallbackContext], str]
+
+
+class ResponseCache:
+    """
+    Replays model responses for requests seen before, skipping the model call.
+
+    Hooked in as a before/after model callback, it caches each model call rather
+    than whole turns. A turn that uses tools still runs them, and the model calls
+    after a tool are keyed on its result, so writes are never skipped and reads
+    are only answered from cache when they return the same data.
+
+    A request is keyed by:
+      - the user it is made for, so one user's answers are never replayed to another;
+      - the request config, i.e. the model, system instruction (including any
+        memory digest) and tool declarations;
+      - the current turn, from the latest user message on (so tool calls and
+        results made since are included), with its text lowercased,
+        whitespace-collapsed and stripped of trailing punctuation. Earlier turns,
+        e.g. the rolling window memory puts in front of it, are not part of the
+        key: they change every turn, and a repeated question would never hit;
+      - `fingerprint(callback_context)`, for the user's stored state, which the
+        model sees only through tools (e.g. how many habits they have logged).
+    Entries expire after `ttl_seconds`; at most `max_entries` are kept.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float,
+        max_entries: int = 1024,
+        fingerprint: Optional[Fingerprint] = None,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.fingerprint = fingerprint
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, tuple[float, types.Content]]" = OrderedDict()
+        # (invocation id, agent) -> key of the model call in progress, stored once it returns
+        self._pending: dict[tuple[str, str], str] = {}
+        self._lock = threading.Lock()
+
+    def before_model_callback(
+        self, callback_context: CallbackContext, llm_request: LlmRequest
+    ) -> Optional[LlmResponse]:
+        key = self._key(callback_context, llm_request)
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return LlmResponse(content=entry[1].model_copy(deep=True))
+            self.misses += 1
+            self._pending[_call_id(callback_context)] = key
+        return None
+
+    def after_model_callback(
+        self, callback_context: CallbackContext, llm_response: LlmResponse
+    ) -> None:
+        # Streamed chunks are skipped; the aggregated response follows them.
+        if llm_response.partial:
+            return None
+        with self._lock:
+            key = self._pending.pop(_call_id(callback_context), None)
+            if key is None or llm_response.error_code or not _cacheable(llm_response.content):
+                return None
+            content = llm_response.content.model_copy(deep=True)
+            for part in content.parts:
+                # ADK assigns call ids per event; a replayed call gets fresh ones.
+                if part.function_call:
+                    part.function_call.id = None
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, content)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def _key(self, callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[str]:
+        contents = llm_request.contents
+        current = next(
+            (
+                i for i in range(len(contents) - 1, -1, -1)
+                if contents[i].role == "user" and any(part.text for part in contents[i].parts or [])
+            ),
+            None,
+        )
+        if current is None:
+            return None
+        turn = []
+        for content in contents[current:]:
+            parts = [_part_key(part) for part in content.parts or []]
+            if any(part is None for part in parts):
+                return None
+            turn.append([content.role, parts])
+        config = llm_request.config.model_dump(
+            mode="json", exclude_none=True, exclude={"http_options", "labels"}
+        )
+        key = {
+            "user": callback_context.user_id,
+            "model": llm_request.model,
+            "config": config,
+            "turn": turn,
+            "state": self.fingerprint(callback_context) if self.fingerprint else None,
+        }
+        return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _part_key(part: types.Part):
+    """What identifies a part for caching, or None if the part cannot be keyed (e.g. files)."""
+    if part.function_call:
+        return {"call": part.function_call.name, "args": part.function_call.args}
+    if part.function_response:
+        return {"result": part.function_response.name, "response": part.function_response.response}
+    if part.text is not None:
+        return re.sub(r"\s+", " ", part.text).strip(" ?.!").lower()
+    return None
+
+
+def _cacheable(content: Optional[types.Content]) -> bool:
+    return bool(content and content.parts) and all(
+        part.text is not None or part.function_call for part in content.parts
+    )
+
+
+def _call_id(callback_context: CallbackContext) -> tuple[str, str]:
+    return (callback_context.invocation_id, callback_context.agent_name)
+
+
+def build_response_cache(fingerprint: Optional[Fingerprint] = None) -> Optional[ResponseCache]:
+    """
+    Returns the response cache configured by RESPONSE_CACHE_TTL_SECONDS and
+    RESPONSE_CACHE_MAX_ENTRIES, or None when the TTL is unset or 0 (the default).
+    """
+    ttl = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "0"))
+    if ttl <= 0:
+        return None
+    logger.info(f"Caching model responses for {ttl:g}s")
+    return ResponseCache(
+        ttl_seconds=ttl,
+        max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024")),
+        fingerprint=fingerprint,
+    )
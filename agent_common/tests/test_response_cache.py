@@ -0,0 +1,95 @@
+from types import SimpleNamespace
+
+import pytest
+from google.adk.models import LlmRequest, LlmResponse
+from google.genai import types
+
+from agent_common.response_cache import ResponseCache
+
+QUESTION = "Summarize my week"
+
+
+def _context(user_id: str, turn: int):
+    return SimpleNamespace(user_id=user_id, invocation_id=f"inv-{turn}", agent_name="coach")
+
+
+def _request(question: str, remembered: list[tuple[str, str]] = ()) -> LlmRequest:
+    # Memory puts the remembered turns in front of the current one.
+    contents = [
+        types.Content(role=role, parts=[types.Part(text=text)]) for role, text in remembered
+    ] + [types.Content(role="user", parts=[types.Part(text=question)])]
+    return LlmRequest(
+        model="gemini",
+        contents=contents,
+        config=types.GenerateContentConfig(system_instruction="You are a coach."),
+    )
+
+
+def _answer(text: str) -> LlmResponse:
+    return LlmResponse(content=types.Content(role="model", parts=[types.Part(text=text)]))
+
+
+def _ask(cache: ResponseCache, context, request: LlmRequest, answer: str) -> str:
+    """Runs one model call through the cache; the model answers `answer` on a miss."""
+    cached = cache.before_model_callback(context, request)
+    if cached is not None:
+        return cached.content.parts[0].text
+    cache.after_model_callback(context, _answer(answer))
+    return answer
+
+
+@pytest.fixture
+def habit_counts() -> dict[str, int]:
+    return {"alice": 3, "bob": 3}
+
+
+@pytest.fixture
+def cache(habit_counts) -> ResponseCache:
+    return ResponseCache(ttl_seconds=60, fingerprint=lambda ctx: str(habit_counts[ctx.user_id]))
+
+
+def test_repeated_question_hits_although_memory_changes(cache):
+    remembered = []
+    for turn in range(3):
+        answer = _ask(cache, _context("alice", turn), _request(QUESTION, remembered), f"answer {turn}")
+        assert answer == "answer 0"
+        remembered += [("user", QUESTION), ("model", answer)]
+
+    assert cache.stats() == {"entries": 1, "hits": 2, "misses": 1}
+
+
+def test_questions_are_normalized(cache):
+    _ask(cache, _context("alice", 0), _request("Summarize my week?"), "first")
+    assert _ask(cache, _context("alice", 1), _request("  summarize   MY week "), "second") == "first"
+
+
+def test_answers_are_not_shared_between_users(cache):
+    _ask(cache, _context("alice", 0), _request(QUESTION), "alice's week")
+    # Same question and the same habit count, but another user's history.
+    assert _ask(cache, _context("bob", 1), _request(QUESTION), "bob's week") == "bob's week"
+
+
+def test_writes_expire_answers(cache, habit_counts):
+    _ask(cache, _context("alice", 0), _request(QUESTION), "three habits")
+    habit_counts["alice"] += 1
+    assert _ask(cache, _context("alice", 1), _request(QUESTION), "four habits") == "four habits"
+
+
+def test_tool_calls_are_replayed_without_ids(cache):
+    context = _context("alice", 0)
+    request = _request("Log a 5 km run")
+    assert cache.before_model_callback(context, request) is None
+    call = types.Part(function_call=types.FunctionCall(id="adk-1", name="log_habit", args={"type": "workout"}))
+    cache.after_model_callback(context, LlmResponse(content=types.Content(role="model", parts=[call])))
+
+    replayed = cache.before_model_callback(_context("alice", 1), _request("Log a 5 km run"))
+    assert replayed.content.parts[0].function_call.name == "log_habit"
+    assert replayed.content.parts[0].function_call.id is None
+
+
+def test_partial_and_failed_responses_are_not_cached(cache):
+    context = _context("alice", 0)
+    cache.before_model_callback(context, _request(QUESTION))
+    cache.after_model_callback(context, LlmResponse(content=_answer("par").content, partial=True))
+    cache.after_model_callback(context, LlmResponse(error_code="500"))
+    assert cache.stats()["entries"] == 0
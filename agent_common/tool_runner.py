@@ -0,0 +1,99 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Used when neither the tool nor TOOL_TIMEOUT_SECONDS sets a timeout.
+DEFAULT_TIMEOUT_SECONDS = 30.0
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def tool_executor() -> ThreadPoolExecutor:
+    """The shared worker pool tools run on, sized by TOOL_WORKERS."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv("TOOL_WORKERS", "8")),
+                thread_name_prefix="tool",
+            )
+        return _executor
+
+
+def offload(
+    max_concurrency: Optional[int] = None,
+    timeout_seconds: Optional[float] = None,
+    timeout_result: Optional[Callable[[float], Any]] = None,
+) -> Callable:
+    """
+    Turns a blocking tool into a coroutine that runs on the shared worker pool, so
+    its work (pandas, database or network I/O) never blocks the event loop serving
+    other requests.
+
+    ADK runs the function calls of one model turn as concurrent tasks, but a plain
+    function runs on the event loop and so the calls run one after another. Offloaded,
+    the calls of a turn run at the same time and the turn takes as long as the
+    slowest of them.
+
+    At most `max_concurrency` calls of the tool run at once; the rest wait without
+    holding a worker. A call that exceeds its timeout returns
+    `timeout_result(timeout)` to the model instead of a result (by default an error
+    dict). The timeout is TOOL_TIMEOUT_SECONDS if set, else `timeout_seconds`, else
+    DEFAULT_TIMEOUT_SECONDS; 0 disables it. The worker thread of a timed-out call
+    cannot be interrupted and stays busy until the call finishes, which TOOL_WORKERS
+    bounds. Both limits can be overridden per tool with TOOL_<NAME>_MAX_CONCURRENCY
+    and TOOL_<NAME>_TIMEOUT_SECONDS.
+
+    The wrapper keeps the tool's name, signature and docstring, which ADK uses to
+    build the function declaration.
+    """
+
+    def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+        prefix = f"TOOL_{func.__name__.upper()}"
+        limit = int(os.getenv(f"{prefix}_MAX_CONCURRENCY", str(max_concurrency or 0))) or None
+        timeout = float(
+            os.getenv(f"{prefix}_TIMEOUT_SECONDS")
+            or os.getenv("TOOL_TIMEOUT_SECONDS")
+            or timeout_seconds
+            or DEFAULT_TIMEOUT_SECONDS
+        ) or None
+        # asyncio semaphores belong to one event loop, so keep one per loop.
+        semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            semaphore = semaphores.setdefault(loop, asyncio.Semaphore(limit)) if limit else None
+            if semaphore is not None:
+                await semaphore.acquire()
+            try:
+                # Run in a copy of the caller's context so tracing spans carry over.
+                call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+                future = loop.run_in_executor(tool_executor(), call)
+                return await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Tool {func.__name__} timed out after {timeout}s")
+                if timeout_result is not None:
+                    return timeout_result(timeout)
+                return {
+                    "status": "error",
+                    "error_message": f"The operation timed out after {timeout:g} seconds.",
+                }
+            finally:
+                if semaphore is not None:
+                    semaphore.release()
+
+        return wrapper
+
+    return decorator
@@ -1,5 +1,6 @@
 from google.adk.agents import LlmAgent
-from google.adk.tools.mcp_tool import MCPToolset, StreamableHTTPConnectionParams
+from google.adk.tools.mcp_tool import StreamableHTTPConnectionParams
+from .mcp_pool import PooledMCPToolset
 # Define the connection parameters for the remote FastMCP server
 # For SSE (Server-Sent Events) connections
 # mcp_server_params = SseServerParams(url="http://127.0.0.1:8001/mcp")
@@ -7,7 +8,9 @@ from google.adk.tools.mcp_tool import MCPToolset, StreamableHTTPConnectionParams
 # The MCPToolset handles the connection to the server and exposes its tools
 # Use from_server() method to create the toolset
 # mcp_tool_set = MCPToolset.from_server(mcp_server_params)
-mcp_toolset = MCPToolset(
+# The tool list is cached until the server reports a change, and a background
+# health check reconnects with backoff if the server goes away
+mcp_toolset = PooledMCPToolset(
     connection_params=StreamableHTTPConnectionParams(url="http://127.0.0.1:8001/mcp/")
 )
 # Create the agent
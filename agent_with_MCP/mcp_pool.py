@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import random
+from contextlib import AsyncExitStack
+from typing import Any, List, Optional
+
+from google.adk.agents.readonly_context import ReadonlyContext
+from google.adk.tools.base_tool import BaseTool
+from google.adk.tools.mcp_tool import MCPToolset, StreamableHTTPConnectionParams
+from mcp import ClientSession
+from mcp import types as mcp_types
+
+try:
+    from mcp.client.streamable_http import streamable_http_client
+except ImportError:  # mcp < 2
+    from mcp.client.streamable_http import streamablehttp_client as streamable_http_client
+
+logger = logging.getLogger(__name__)
+
+
+class PooledMCPToolset(MCPToolset):
+    """
+    An MCPToolset whose tool list is fetched once and kept until the server changes.
+
+    ADK already keeps one keep-alive MCP session per header set and reuses it across
+    runs; this toolset also caches the server's `tools/list` response, so after the
+    first run the only round trip left is the tool call itself. The cache is cleared
+    when:
+      - the server sends `notifications/tools/list_changed`,
+      - the server comes back after being unreachable (it may have been redeployed;
+        the pooled sessions are reopened too, since the server has forgotten them),
+      - `cache_ttl_seconds` passes, as a safety net.
+
+    The first two are detected by a background watcher holding its own session. It
+    pings the server every `health_check_interval_seconds` and, when the server is
+    unreachable, reconnects with exponential backoff and jitter, capped at
+    `max_backoff_seconds`. `healthy` reports whether the last ping succeeded.
+    """
+
+    def __init__(
+        self,
+        *,
+        connection_params: StreamableHTTPConnectionParams,
+        cache_ttl_seconds: float = 3600.0,
+        health_check_interval_seconds: float = 30.0,
+        max_backoff_seconds: float = 60.0,
+        **kwargs: Any,
+    ):
+        super().__init__(
+            connection_params=connection_params,
+            tool_list_cache_ttl_seconds=cache_ttl_seconds,
+            **kwargs,
+        )
+        self.health_check_interval_seconds = health_check_interval_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.healthy = False
+        self._watcher: Optional[asyncio.Task] = None
+
+    async def get_tools(
+        self, readonly_context: Optional[ReadonlyContext] = None
+    ) -> List[BaseTool]:
+        self._ensure_watcher()
+        return await super().get_tools(readonly_context)
+
+    def invalidate_tools(self) -> None:
+        """Forgets the cached tool list; the next run lists the tools again."""
+        self._tool_list_cache.clear()
+
+    async def close(self) -> None:
+        if self._watcher is not None:
+            self._watcher.cancel()
+            self._watcher = None
+        await super().close()
+
+    def _ensure_watcher(self) -> None:
+        # The watcher belongs to the loop that started it; restart it if that loop is gone.
+        loop = asyncio.get_running_loop()
+        if self._watcher is None or self._watcher.done() or self._watcher.get_loop() is not loop:
+            self._watcher = loop.create_task(self._watch())
+
+    async def _watch(self) -> None:
+        backoff = 1.0
+        connected_before = False
+        while True:
+            try:
+                async with AsyncExitStack() as stack:
+                    streams = await stack.enter_async_context(
+                        streamable_http_client(self._connection_params.url)
+                    )
+                    session = await stack.enter_async_context(
+                        ClientSession(streams[0], streams[1], message_handler=self._on_message)
+                    )
+                    await asyncio.wait_for(session.initialize(), self._timeout())
+                    if connected_before and not self.healthy:
+                        logger.info("MCP server is reachable again; refreshing its tool list")
+                        self.invalidate_tools()
+                        # A restarted server has forgotten the pooled sessions; open new ones.
+                        await self._mcp_session_manager.close()
+                    connected_before = True
+                    self.healthy = True
+                    backoff = 1.0
+                    while True:
+                        await asyncio.sleep(self.health_check_interval_seconds)
+                        await asyncio.wait_for(session.send_ping(), self._timeout())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if self.healthy:
+                    logger.warning(f"MCP server health check failed: {e}")
+                self.healthy = False
+                await asyncio.sleep(backoff * random.uniform(0.5, 1.5))
+                backoff = min(backoff * 2, self.max_backoff_seconds)
+
+    async def _on_message(self, message: Any) -> None:
+        # mcp 1.x wraps notifications in ServerNotification; 2.x delivers them directly.
+        notification = getattr(message, "root", message)
+        if isinstance(notification, mcp_types.ToolListChangedNotification):
+            logger.info("MCP server tool list changed; refreshing it on the next run")
+            self.invalidate_tools()
+
+    def _timeout(self) -> float:
+        return getattr(self._connection_params, "timeout", None) or 10.0
@@ -1,8 +1,11 @@
 import datetime
 from zoneinfo import ZoneInfo
 from google.adk.agents import Agent
+from agent_common.response_cache import build_response_cache
+from agent_common.tool_runner import offload
 
 
+@offload()
 def get_weather(city: str) -> dict[str, str]:
     """Retrieves the current weather report for a specified city.
 
@@ -27,6 +30,7 @@ def get_weather(city: str) -> dict[str, str]:
         }
 
 
+@offload()
 def get_current_time(city: str) -> dict[str, str]:
     """Returns the current time in a specified city.
 
@@ -51,6 +55,10 @@ def get_current_time(city: str) -> dict[str, str]:
     return {"status": "success", "report": report}
 
 
+# Opt-in replay of model responses to repeated questions (RESPONSE_CACHE_TTL_SECONDS).
+# The tools only read, so their results in the request are all the state there is.
+response_cache = build_response_cache()
+
 root_agent = Agent(
     name="weather_time_agent",
     model="gemini-2.5-flash",
@@ -59,4 +67,6 @@ root_agent = Agent(
         "You are a helpful agent who can answer user questions about the time and weather in a city."
     ),
     tools=[get_weather, get_current_time],
+    before_model_callback=response_cache.before_model_callback if response_cache else None,
+    after_model_callback=response_cache.after_model_callback if response_cache else None,
 )
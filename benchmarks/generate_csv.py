@@ -0,0 +1,88 @@
+"""
+Writes a synthetic sales CSV of about the given size, for benchmarking ingest and
+queries of the sales analyst:
+
+    python benchmarks/generate_csv.py sales_100mb.csv --size 100MB
+
+Sizes from 1 MB to 1 GB cover in-memory ingest through streaming ingest (set
+STREAMING_INGEST_MIN_BYTES below the file size to exercise it). Rows are written
+in chunks, so generating a large file takes little memory, and the same seed
+always gives the same file.
+"""
+import argparse
+import re
+
+import numpy as np
+import pandas as pd
+
+REGIONS = ["North", "South", "East", "West", "Central"]
+CATEGORIES = {
+    "Electronics": ["Laptop", "Phone", "Tablet", "Monitor", "Headphones"],
+    "Furniture": ["Desk", "Chair", "Bookshelf", "Sofa", "Lamp"],
+    "Office Supplies": ["Paper", "Pens", "Stapler", "Binder", "Notebook"],
+    "Clothing": ["Shirt", "Jacket", "Shoes", "Hat", "Scarf"],
+}
+PRODUCTS = [(product, category) for category, products in CATEGORIES.items() for product in products]
+
+CHUNK_ROWS = 100_000
+
+UNITS = {"B": 1, "KB": 1024, "MB": 1024**2, "GB": 1024**3}
+
+
+def parse_size(size: str) -> int:
+    """Parses sizes like `500KB`, `100MB` or `1GB` into bytes."""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMG]?B)?\s*", size.upper())
+    if not match:
+        raise argparse.ArgumentTypeError(f"Invalid size: {size}")
+    return int(float(match.group(1)) * UNITS[match.group(2) or "B"])
+
+
+def sales_chunk(rng: np.random.Generator, rows: int, start: int) -> pd.DataFrame:
+    product = rng.integers(len(PRODUCTS), size=rows)
+    units = rng.integers(1, 50, size=rows)
+    unit_price = np.round(rng.uniform(2, 2000, size=rows), 2)
+    dates = pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 730, size=rows), unit="D")
+    return pd.DataFrame(
+        {
+            "Order ID": np.arange(start, start + rows),
+            "Date": dates.strftime("%Y-%m-%d"),
+            "Region": np.array(REGIONS)[rng.integers(len(REGIONS), size=rows)],
+            "Product": np.array([p for p, _ in PRODUCTS])[product],
+            "Category": np.array([c for _, c in PRODUCTS])[product],
+            "Units": units,
+            "Unit Price": unit_price,
+            "Sales": np.round(units * unit_price, 2),
+        }
+    )
+
+
+def write_csv(path: str, size_bytes: int, seed: int = 0) -> int:
+    """Writes about `size_bytes` of sales rows to `path`. Returns the number of rows."""
+    rng = np.random.default_rng(seed)
+    written, rows, bytes_per_row = 0, 0, None
+    with open(path, "w", newline="") as f:
+        while written < size_bytes:
+            # A small first chunk gives the row size to aim the rest at the target.
+            chunk_rows = 1000
+            if bytes_per_row:
+                chunk_rows = max(1, min(CHUNK_ROWS, int((size_bytes - written) / bytes_per_row)))
+            text = sales_chunk(rng, chunk_rows, rows).to_csv(index=False, header=rows == 0)
+            f.write(text)
+            written += len(text)
+            rows += chunk_rows
+            bytes_per_row = written / rows
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("--size", type=parse_size, default="10MB", help="e.g. 1MB, 250MB, 1GB")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rows = write_csv(args.path, args.size, args.seed)
+    print(f"Wrote {rows} rows to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
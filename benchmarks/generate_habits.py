@@ -0,0 +1,78 @@
+"""
+Fills a habit store with synthetic history, for benchmarking the habit tracker
+against a long log:
+
+    python benchmarks/generate_habits.py /tmp/bench/habit_log.db --users 100 --events 1000
+    python benchmarks/load.py habit --workdir /tmp/bench
+
+Users are named `bench-user-<n>`, as load.py sends them, and their events are
+spread over the last `--days` days. Events are inserted in bulk and the rollups
+rebuilt once at the end, which is much faster than appending one at a time.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCHMARKS_DIR), "habit-tracker-agent", "backend"))
+
+from habit_store import HabitStore  # noqa: E402
+
+HABITS = {
+    "workout": ["ran 5 km", "30 minutes of yoga", "cycled to work", "lifted weights for an hour"],
+    "meal": ["oatmeal with berries", "grilled chicken salad", "vegetable stir fry", "lentil soup"],
+    "water": ["drank 2 liters", "drank 8 glasses", "drank 1.5 liters"],
+    "steps": ["walked 8000 steps", "walked 12000 steps", "walked 5000 steps"],
+    "sleep": ["slept 7 hours", "slept 8 hours", "slept 6 hours"],
+}
+
+BATCH_ROWS = 50_000
+
+
+def generate(db_path: str, users: int, events_per_user: int, days: int, seed: int = 0) -> int:
+    """Inserts `events_per_user` events for each user. Returns the number of rollup rows."""
+    rng = random.Random(seed)
+    store = HabitStore(db_path)
+    now = datetime.now()
+    types = list(HABITS)
+    conn = sqlite3.connect(db_path, timeout=30)
+
+    batch = []
+    for user in range(users):
+        for _ in range(events_per_user):
+            type = rng.choice(types)
+            timestamp = now - timedelta(seconds=rng.uniform(0, days * 86400))
+            batch.append((f"bench-user-{user}", timestamp.isoformat(), type, rng.choice(HABITS[type])))
+            if len(batch) >= BATCH_ROWS:
+                _insert(conn, batch)
+                batch = []
+    _insert(conn, batch)
+    conn.close()
+    return store.rebuild_rollups()
+
+
+def _insert(conn, rows) -> None:
+    with conn:
+        conn.executemany(
+            "INSERT INTO habits (user_id, timestamp, type, details) VALUES (?, ?, ?, ?)", rows
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="habit store to fill, e.g. <workdir>/habit_log.db")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--events", type=int, default=1000, help="events per user")
+    parser.add_argument("--days", type=int, default=365, help="how far back the history goes")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    os.makedirs(os.path.dirname(os.path.abspath(args.path)), exist_ok=True)
+    rollups = generate(args.path, args.users, args.events, args.days, args.seed)
+    print(f"Wrote {args.users * args.events} events ({rollups} rollup rows) to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""
+Load-tests an agent's /chat endpoint with the scripted model and reports
+latency percentiles, throughput and peak memory:
+
+    python benchmarks/load.py habit --concurrency 16 --requests 500
+    python benchmarks/load.py sales --csv sales_100mb.csv --model-latency 0.5
+    python benchmarks/load.py mcp --json results.json --baseline baseline.json
+
+The server is started with serve.py unless `--url` points at a running one (peak
+RSS is then not measured). With `--baseline`, the run fails (exit code 1) when
+p95 latency or peak RSS grew, or requests/sec dropped, by more than `--tolerance`.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+import httpx
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from generate_csv import write_csv  # noqa: E402
+from serve import TARGETS  # noqa: E402
+
+CITIES = ["London", "Paris", "Tokyo", "New York", "Sydney", "Mumbai", "Berlin", "Toronto"]
+
+
+@dataclass
+class Report:
+    target: str
+    concurrency: int
+    requests: int
+    errors: int
+    seconds: float
+    requests_per_second: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    max_ms: float
+    peak_rss_mb: Optional[float]
+
+    def __str__(self) -> str:
+        rss = f"{self.peak_rss_mb:.1f} MB" if self.peak_rss_mb is not None else "not measured"
+        return (
+            f"{self.target}: {self.requests} requests ({self.errors} errors) at concurrency "
+            f"{self.concurrency} in {self.seconds:.2f}s\n"
+            f"  requests/sec  {self.requests_per_second:.1f}\n"
+            f"  latency       p50 {self.p50_ms:.1f} ms, p95 {self.p95_ms:.1f} ms, "
+            f"p99 {self.p99_ms:.1f} ms, max {self.max_ms:.1f} ms\n"
+            f"  peak RSS      {rss}"
+        )
+
+
+class Workload:
+    """Builds the /chat requests for a target; `user` is the virtual user sending it."""
+
+    def __init__(self, target: str, users: int):
+        self.target = target
+        self.users = users
+        self.dataset_id: Optional[str] = None
+        self.sessions: dict[int, str] = {}
+
+    async def prepare(self, client: httpx.AsyncClient, csv_path: Optional[str]) -> None:
+        if self.target != "sales":
+            return
+        started = time.perf_counter()
+        with open(csv_path, "rb") as f:
+            response = await client.post("/datasets", files={"file": (os.path.basename(csv_path), f)})
+        response.raise_for_status()
+        self.dataset_id = response.json()["dataset_id"]
+        print(
+            f"Uploaded {os.path.getsize(csv_path) / 1024**2:.1f} MB in "
+            f"{time.perf_counter() - started:.2f}s",
+            flush=True,
+        )
+
+    async def send(self, client: httpx.AsyncClient, user: int, n: int) -> httpx.Response:
+        user_id = f"bench-user-{user % self.users}"
+        session_id = self.sessions.get(user)
+        if self.target == "sales":
+            response = await client.post(
+                "/chat",
+                data={
+                    "dataset_id": self.dataset_id,
+                    "message": "What are the total sales by region?",
+                    "user_id": user_id,
+                    "session_id": f"bench-session-{user}",
+                },
+            )
+        else:
+            if self.target == "habit":
+                message = "log workout ran 5 km" if n % 2 == 0 else "summarize my week"
+            else:
+                message = f"What is the weather in {CITIES[n % len(CITIES)]}?"
+            response = await client.post(
+                "/chat", json={"message": message, "user_id": user_id, "session_id": session_id}
+            )
+            if response.is_success:
+                self.sessions[user] = response.json()["session_id"]
+        return response
+
+
+async def run_load(
+    url: str, workload: Workload, concurrency: int, requests: int, warmup: int, csv_path: Optional[str]
+) -> tuple[list[float], int, float]:
+    """Returns the latency of every successful request, the error count and the wall time."""
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=600, limits=limits) as client:
+        await workload.prepare(client, csv_path)
+        for n in range(warmup):
+            await workload.send(client, n % concurrency, n)
+
+        latencies: list[float] = []
+        errors = 0
+        counter = itertools.count()
+
+        async def user(index: int):
+            nonlocal errors
+            while (n := next(counter)) < requests:
+                started = time.perf_counter()
+                try:
+                    response = await workload.send(client, index, n)
+                    ok = response.is_success
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(user(i) for i in range(concurrency)))
+        return latencies, errors, time.perf_counter() - started
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile of sorted `values`, 0 when there are none."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, round(q / 100 * len(values)) - 1))]
+
+
+def _wait_until_ready(url: str, server: subprocess.Popen, timeout: float = 120) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"serve.py exited with code {server.returncode}")
+        try:
+            if httpx.get(f"{url}/openapi.json", timeout=1).is_success:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("Timed out waiting for the server to start")
+
+
+def _peak_rss_mb(pid: int) -> Optional[float]:
+    """
+    Sum of the high-water RSS of the server and its child processes (workers and,
+    for the mcp target, the MCP server), read from /proc; None where there is no /proc.
+    """
+    total_kb, pids = 0, [pid]
+    while pids:
+        pid = pids.pop()
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                total_kb += next(int(line.split()[1]) for line in f if line.startswith("VmHWM:"))
+            with open(f"/proc/{pid}/task/{pid}/children") as f:
+                pids.extend(int(child) for child in f.read().split())
+        except (OSError, StopIteration):
+            continue
+    return total_kb / 1024 if total_kb else None
+
+
+def _children_peak_rss_mb() -> float:
+    # ru_maxrss is the largest reaped child's peak, in KiB on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+def check_baseline(report: Report, baseline_path: str, tolerance: float) -> list[str]:
+    """Returns a message for every metric that regressed beyond the tolerance."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    failures = []
+    for metric, higher_is_worse in (("p95_ms", True), ("peak_rss_mb", True), ("requests_per_second", False)):
+        current, previous = getattr(report, metric), baseline.get(metric)
+        if current is None or not previous:
+            continue
+        change = (current - previous) / previous
+        if (change > tolerance) if higher_is_worse else (-change > tolerance):
+            failures.append(f"{metric} went from {previous:.1f} to {current:.1f} ({change:+.0%})")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("target", choices=TARGETS)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=5, help="requests sent before measuring")
+    parser.add_argument("--users", type=int, default=100, help="distinct user ids to spread requests over")
+    parser.add_argument("--url", help="benchmark a server that is already running")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--workdir", help="directory the server runs in (default: a new temporary one)")
+    parser.add_argument("--model-latency", type=float, default=0.0, help="seconds each model call takes")
+    parser.add_argument("--csv", help="CSV the sales target uploads (default: a generated 1 MB file)")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--baseline", help="report of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed regression, e.g. 0.1 for 10%%")
+    args = parser.parse_args()
+
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix=f"benchmark_{args.target}_"))
+    csv_path = args.csv
+    if args.target == "sales" and not csv_path:
+        csv_path = os.path.join(workdir, "sales.csv")
+        write_csv(csv_path, 1024**2)
+
+    server = None
+    url = args.url
+    if url is None:
+        url = f"http://127.0.0.1:{args.port}"
+        log_path = os.path.join(workdir, "server.log")
+        print(f"Server log: {log_path}", flush=True)
+        server = subprocess.Popen(
+            [
+                sys.executable, os.path.join(BENCHMARKS_DIR, "serve.py"), args.target,
+                "--port", str(args.port),
+                "--workers", str(args.workers),
+                "--workdir", workdir,
+                "--model-latency", str(args.model_latency),
+            ],
+            stdout=open(log_path, "w"),
+            stderr=subprocess.STDOUT,
+        )
+    try:
+        if server is not None:
+            _wait_until_ready(url, server)
+        workload = Workload(args.target, args.users)
+        latencies, errors, seconds = asyncio.run(
+            run_load(url, workload, args.concurrency, args.requests, args.warmup, csv_path)
+        )
+        peak_rss = _peak_rss_mb(server.pid) if server is not None else None
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    if server is not None and peak_rss is None:
+        peak_rss = _children_peak_rss_mb()
+
+    latencies.sort()
+    report = Report(
+        target=args.target,
+        concurrency=args.concurrency,
+        requests=args.requests,
+        errors=errors,
+        seconds=seconds,
+        requests_per_second=len(latencies) / seconds if seconds else 0.0,
+        p50_ms=percentile(latencies, 50) * 1000,
+        p95_ms=percentile(latencies, 95) * 1000,
+        p99_ms=percentile(latencies, 99) * 1000,
+        max_ms=(latencies[-1] if latencies else 0.0) * 1000,
+        peak_rss_mb=peak_rss,
+    )
+    print(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(asdict(report), f, indent=2)
+
+    failures = check_baseline(report, args.baseline, args.tolerance) if args.baseline else []
+    for failure in failures:
+        print(f"Regression: {failure}")
+    if failures or errors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import asyncio
+import json
+from dataclasses import dataclass, field
+from typing import Any, AsyncGenerator, Callable, Union
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+
+@dataclass
+class ToolCall:
+    """One scripted step: call `name` with `args`, or with `args(message)` for the user's message."""
+
+    name: str
+    args: Union[dict, Callable[[str], dict]] = field(default_factory=dict)
+
+    def function_call(self, message: str) -> types.FunctionCall:
+        args = self.args(message) if callable(self.args) else self.args
+        return types.FunctionCall(name=self.name, args=args)
+
+
+# Picks the tool calls to make for a user message.
+Script = Callable[[str], list[ToolCall]]
+
+
+class ScriptedLlm(BaseLlm):
+    """
+    A local stand-in for Gemini that plays back a script of tool calls.
+
+    For each user message it makes the script's tool calls one model call at a
+    time, each after the previous tool's result is back, then answers with a short
+    text quoting the last result. Everything else, i.e. the Runner, callbacks,
+    plugins, sessions and the tools themselves, runs for real, so a benchmark
+    measures the service without paying for or waiting on the model.
+
+    `latency_seconds` is slept before every response to stand in for the model's
+    own time, and `response_bytes` pads the final answer to a realistic size.
+    """
+
+    model: str = "scripted"
+    script: Script
+    latency_seconds: float = 0.0
+    response_bytes: int = 200
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        message, step, last_result = _turn(llm_request.contents)
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+
+        steps = self.script(message)
+        if step < len(steps):
+            part = types.Part(function_call=steps[step].function_call(message))
+        else:
+            text = f"Done. {json.dumps(last_result, default=str)}" if last_result is not None else "Done."
+            part = types.Part(text=text[: self.response_bytes].ljust(self.response_bytes))
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[part]),
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=sum(len(str(c.parts)) for c in llm_request.contents) // 4,
+                candidates_token_count=len(str(part)) // 4,
+            ),
+        )
+
+
+def _turn(contents: list[types.Content]) -> tuple[str, int, Any]:
+    """
+    The current user message, how many tool results followed it, i.e. which step
+    of the script is next, and the last of those results.
+    """
+    step, last_result = 0, None
+    for content in reversed(contents):
+        parts = content.parts or []
+        texts = [part.text for part in parts if part.text]
+        if content.role == "user" and texts:
+            return "\n".join(texts), step, last_result
+        for part in parts:
+            if part.function_response:
+                step += 1
+                if last_result is None:
+                    last_result = part.function_response.response
+    return "", step, last_result
@@ -0,0 +1,218 @@
+"""
+Serves one of the agents with its model replaced by ScriptedLlm, for benchmarking
+without Gemini:
+
+    python benchmarks/serve.py sales --port 8100 --model-latency 0.5
+
+load.py starts this itself; run it by hand to point another load tool at it.
+The app runs in `--workdir` (a fresh temporary directory by default), so habit
+logs, memory and uploads of a run never mix with real data. The `mcp` target
+also starts mcp_server/main.py, unless one is already listening on port 8001.
+"""
+import argparse
+import os
+import re
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Optional
+
+import uvicorn
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from scripted_llm import ScriptedLlm, ToolCall  # noqa: E402
+
+TARGETS = ("sales", "habit", "mcp")
+
+APP_DIRS = {
+    "sales": os.path.join(REPO_DIR, "sales_data_analyst_agent"),
+    "habit": os.path.join(REPO_DIR, "habit-tracker-agent", "backend"),
+    "mcp": REPO_DIR,
+}
+
+MCP_SERVER_PORT = 8001
+
+# Queries the sales script runs; the columns are those of generate_csv.py.
+SALES_QUERY = "df.groupby('Region')['Sales'].sum()"
+SALES_CHART = "df.groupby('Category')['Sales'].sum().reset_index()"
+
+
+def sales_script(message: str) -> list[ToolCall]:
+    reference = re.search(r"file_path='([^']+)'", message)
+    return [
+        ToolCall("read_csv_and_get_schema", {"file_path": reference.group(1) if reference else ""}),
+        ToolCall("execute_query", {"expression": SALES_QUERY}),
+        ToolCall(
+            "generate_visualization_data",
+            {"chart_type": "bar", "pandas_expression": SALES_CHART},
+        ),
+    ]
+
+
+def habit_script(message: str) -> list[ToolCall]:
+    if message.lower().startswith("log"):
+        # "log <type> <details>"
+        _, type, details = (message.split(" ", 2) + ["", ""])[:3]
+        return [ToolCall("log_habit", {"type": type, "details": details})]
+    return [ToolCall("get_summary", {"period": "weekly"})]
+
+
+def weather_script(message: str) -> list[ToolCall]:
+    city = re.search(r"weather in (.+?)\??$", message)
+    return [ToolCall("get_weather", {"city": city.group(1) if city else "London"})]
+
+
+def create_app():
+    """
+    Builds the target's FastAPI app, configured by the BENCHMARK_* variables main()
+    sets, so that uvicorn can call it in each worker.
+    """
+    target = os.environ["BENCHMARK_TARGET"]
+    model = dict(
+        latency_seconds=float(os.getenv("BENCHMARK_MODEL_LATENCY_SECONDS", "0")),
+        response_bytes=int(os.getenv("BENCHMARK_RESPONSE_BYTES", "200")),
+    )
+    sys.path.insert(0, APP_DIRS[target])
+
+    if target == "sales":
+        import agent
+        import main
+
+        agent.root_agent.model = ScriptedLlm(script=sales_script, **model)
+        return main.app
+    if target == "habit":
+        import agent
+        import main
+
+        agent.habit_tracker_agent.model = ScriptedLlm(script=habit_script, **model)
+        return main.app
+    return _mcp_app(ScriptedLlm(script=weather_script, **model))
+
+
+def _mcp_app(model: ScriptedLlm):
+    """
+    The MCP agent is normally run with `adk web`, so it gets a /chat endpoint
+    shaped like the habit tracker's here.
+    """
+    from contextlib import asynccontextmanager
+
+    from fastapi import FastAPI
+    from google.adk.runners import Runner
+    from google.adk.sessions import InMemorySessionService
+    from google.genai import types
+    from pydantic import BaseModel
+
+    from agent_with_MCP.agent import mcp_toolset, root_agent
+
+    root_agent.model = model
+    session_service = InMemorySessionService()
+    runner = Runner(agent=root_agent, app_name="weather_app", session_service=session_service)
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        yield
+        # Stops the toolset's health check and closes its MCP session before the loop ends.
+        await mcp_toolset.close()
+
+    app = FastAPI(lifespan=lifespan)
+
+    class ChatRequest(BaseModel):
+        message: str
+        user_id: Optional[str] = "default_user"
+        session_id: Optional[str] = None
+
+    @app.post("/chat")
+    async def chat(request: ChatRequest):
+        session = None
+        if request.session_id:
+            session = await session_service.get_session(
+                app_name="weather_app", user_id=request.user_id, session_id=request.session_id
+            )
+        if session is None:
+            session = await session_service.create_session(
+                app_name="weather_app", user_id=request.user_id, session_id=request.session_id
+            )
+        response = ""
+        async for event in runner.run_async(
+            user_id=request.user_id,
+            session_id=session.id,
+            new_message=types.Content(role="user", parts=[types.Part(text=request.message)]),
+        ):
+            if event.is_final_response() and event.content and event.content.parts:
+                response = event.content.parts[0].text or ""
+        return {"response": response, "session_id": session.id}
+
+    return app
+
+
+def _start_mcp_server() -> Optional[subprocess.Popen]:
+    if _listening(MCP_SERVER_PORT):
+        return None
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(REPO_DIR, "mcp_server", "main.py")],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while not _listening(MCP_SERVER_PORT):
+        if server.poll() is not None or time.monotonic() > deadline:
+            server.kill()
+            raise RuntimeError("mcp_server/main.py did not start")
+        time.sleep(0.1)
+    return server
+
+
+def _listening(port: int) -> bool:
+    with socket.socket() as sock:
+        return sock.connect_ex(("127.0.0.1", port)) == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("target", choices=TARGETS)
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--workdir", help="directory the app runs in (default: a new temporary one)")
+    parser.add_argument("--model-latency", type=float, default=0.0, help="seconds each model call takes")
+    parser.add_argument("--response-bytes", type=int, default=200, help="size of the final answer")
+    args = parser.parse_args()
+
+    os.environ["BENCHMARK_TARGET"] = args.target
+    os.environ["BENCHMARK_MODEL_LATENCY_SECONDS"] = str(args.model_latency)
+    os.environ["BENCHMARK_RESPONSE_BYTES"] = str(args.response_bytes)
+    # The scripted model never calls Gemini, but the agents check for a key.
+    os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix=f"benchmark_{args.target}_"))
+    os.makedirs(workdir, exist_ok=True)
+    os.environ.setdefault("UPLOAD_DIR", os.path.join(workdir, "uploads"))
+    os.environ.setdefault("COLUMNAR_STORE_DIR", os.path.join(workdir, "datasets"))
+    os.chdir(workdir)
+    print(f"Serving {args.target} from {workdir}", flush=True)
+
+    mcp_server = _start_mcp_server() if args.target == "mcp" else None
+    # uvicorn re-raises SIGTERM once it has shut down; exit normally instead so the
+    # MCP server is stopped too.
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        uvicorn.run(
+            "serve:create_app",
+            factory=True,
+            host="127.0.0.1",
+            port=args.port,
+            workers=args.workers,
+            log_level="warning",
+        )
+    finally:
+        if mcp_server is not None:
+            mcp_server.terminate()
+            mcp_server.wait()
+
+
+if __name__ == "__main__":
+    main()
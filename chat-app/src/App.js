@@ -28,9 +28,146 @@ const TypingLoader = () => (
   </div>
 );
 
+const API_URL = "http://localhost:8001";
+
+const CHART_WIDTH = 480;
+const CHART_HEIGHT = 240;
+const CHART_PADDING = 32;
+
+// Renders the columnar payload of generate_visualization_data: `columns` in order,
+// `data` mapping each column to its values, and `meta` describing any downsampling.
+// The first column is the label (or x), the first numeric column after it the value (or y);
+// bar and pie results are both drawn as horizontal bars.
+const Chart = ({ visualization }) => {
+  const { chart_type: chartType, columns, data, meta } = visualization;
+  if (!columns || columns.length < 2) {
+    return null;
+  }
+  const labelColumn = columns[0];
+  const valueColumn =
+    columns.slice(1).find((col) => data[col].some((v) => typeof v === "number")) ||
+    columns[1];
+  const labels = data[labelColumn];
+  const values = data[valueColumn].map((v) => (typeof v === "number" ? v : 0));
+  const plotWidth = CHART_WIDTH - 2 * CHART_PADDING;
+  const plotHeight = CHART_HEIGHT - 2 * CHART_PADDING;
+
+  let marks;
+  if (chartType === "scatter") {
+    const xs = labels.map((v) => (typeof v === "number" ? v : Date.parse(v)));
+    const [xMin, xMax] = [Math.min(...xs), Math.max(...xs)];
+    const [yMin, yMax] = [Math.min(...values), Math.max(...values)];
+    marks = xs.map((x, i) => (
+      <circle
+        key={i}
+        className="chart-point"
+        cx={CHART_PADDING + ((x - xMin) / (xMax - xMin || 1)) * plotWidth}
+        cy={CHART_PADDING + plotHeight - ((values[i] - yMin) / (yMax - yMin || 1)) * plotHeight}
+        r={2}
+      />
+    ));
+  } else {
+    const maxValue = Math.max(...values, 0) || 1;
+    const barHeight = plotHeight / values.length;
+    marks = values.map((value, i) => (
+      <g key={i}>
+        <rect
+          className="chart-bar"
+          x={CHART_PADDING}
+          y={CHART_PADDING + i * barHeight}
+          width={(Math.max(value, 0) / maxValue) * plotWidth}
+          height={Math.max(barHeight - 2, 1)}
+        />
+        <text
+          className="chart-label"
+          x={CHART_PADDING + 4}
+          y={CHART_PADDING + i * barHeight + barHeight / 2}
+        >
+          {`${labels[i]}: ${value}`}
+        </text>
+      </g>
+    ));
+  }
+
+  return (
+    <figure className="chart">
+      <svg
+        viewBox={`0 0 ${CHART_WIDTH} ${CHART_HEIGHT}`}
+        width="100%"
+        role="img"
+        aria-label={`${chartType} chart of ${valueColumn} by ${labelColumn}`}
+      >
+        {marks}
+      </svg>
+      {meta && meta.downsampled && (
+        <figcaption className="chart-caption">
+          {`Showing ${meta.returned_rows} of ${meta.original_rows} rows (${meta.method}).`}
+        </figcaption>
+      )}
+    </figure>
+  );
+};
+
+// Files are sent in chunks so a dropped connection only re-sends the current chunk.
+const UPLOAD_CHUNK_BYTES = 8 * 1024 * 1024;
+const UPLOAD_MAX_RETRIES = 3;
+
+// Uploads a file once through the resumable upload endpoints and returns its dataset.
+async function uploadDataset(file, onProgress) {
+  const created = await fetch(`${API_URL}/datasets/uploads`, { method: "POST" });
+  if (!created.ok) {
+    throw new Error(`Could not start the upload: ${created.statusText}`);
+  }
+  const { upload_id: uploadId } = await created.json();
+
+  let offset = 0;
+  let retries = 0;
+  while (offset < file.size) {
+    const chunk = file.slice(offset, offset + UPLOAD_CHUNK_BYTES);
+    try {
+      const response = await fetch(`${API_URL}/datasets/uploads/${uploadId}`, {
+        method: "PATCH",
+        headers: { "Upload-Offset": String(offset) },
+        body: chunk,
+      });
+      if (response.status === 409) {
+        // The server has a different view of what arrived; resume from its offset.
+        offset = (await response.json()).detail.offset;
+        continue;
+      }
+      if (!response.ok) {
+        throw new Error(response.statusText);
+      }
+      offset = (await response.json()).offset;
+      retries = 0;
+      onProgress(offset / file.size);
+    } catch (error) {
+      if (++retries > UPLOAD_MAX_RETRIES) {
+        throw error;
+      }
+      const status = await fetch(`${API_URL}/datasets/uploads/${uploadId}`);
+      if (status.ok) {
+        offset = (await status.json()).offset;
+      }
+    }
+  }
+
+  const completed = await fetch(
+    `${API_URL}/datasets/uploads/${uploadId}/complete`,
+    { method: "POST" }
+  );
+  if (!completed.ok) {
+    const errorText = await completed.text();
+    throw new Error(`Could not read the file: ${errorText}`);
+  }
+  return completed.json();
+}
+
 function App() {
   const [message, setMessage] = useState("");
   const [file, setFile] = useState(null);
+  const [datasetId, setDatasetId] = useState(null);
+  const [uploadProgress, setUploadProgress] = useState(null);
   const [chatHistory, setChatHistory] = useState([]);
   const [isDragging, setIsDragging] = useState(false);
   const [isLoading, setIsLoading] = useState(false);
@@ -43,8 +180,27 @@ function App() {
     }
   }, [chatHistory, isLoading]);
 
+  const selectFile = async (selectedFile) => {
+    setFile(selectedFile);
+    setDatasetId(null);
+    setUploadProgress(0);
+    try {
+      const dataset = await uploadDataset(selectedFile, setUploadProgress);
+      setDatasetId(dataset.dataset_id);
+    } catch (error) {
+      console.error("Error uploading file:", error);
+      setFile(null);
+      setChatHistory((prev) => [
+        ...prev,
+        { type: "bot", text: `Error: ${error.message}` },
+      ]);
+    } finally {
+      setUploadProgress(null);
+    }
+  };
+
   const handleSendMessage = async () => {
-    if (!file) {
+    if (!datasetId) {
       alert("Please upload a file first.");
       return;
     }
@@ -59,14 +215,16 @@ function App() {
     setIsLoading(true);
 
     const formData = new FormData();
-    formData.append("file", file);
+    formData.append("dataset_id", datasetId);
     formData.append("message", userMessage);
     formData.append("user_id", "react-user");
     formData.append("session_id", "react-session");
 
     try {
-      const response = await fetch("http://localhost:8001/chat", {
+      const response = await fetch(`${API_URL}/chat`, {
         method: "POST",
+        // Lets a load balancer route the dataset's requests to the same replica.
+        headers: { "X-Dataset-Id": datasetId },
         body: formData,
       });
 
@@ -74,7 +232,11 @@ function App() {
         const data = await response.json();
         setChatHistory((prev) => [
           ...prev,
-          { type: "bot", text: data.responses[0] },
+          {
+            type: "bot",
+            text: data.responses[0],
+            visualization: data.visualization,
+          },
         ]);
       } else {
         const errorText = await response.text();
@@ -98,7 +260,7 @@ function App() {
   const handleFileChange = (e) => {
     const selectedFile = e.target.files[0];
     if (selectedFile) {
-      setFile(selectedFile);
+      selectFile(selectedFile);
     }
   };
 
@@ -129,7 +291,7 @@ function App() {
     setIsDragging(false);
     const droppedFile = e.dataTransfer.files[0];
     if (droppedFile) {
-      setFile(droppedFile);
+      selectFile(droppedFile);
     }
   };
 
@@ -151,7 +313,9 @@ function App() {
               Browse Files
             </button>
             <p className="file-info">
-              {file
+              {uploadProgress !== null
+                ? `Uploading ${file.name}: ${Math.round(uploadProgress * 100)}%`
+                : file
                 ? `Selected: ${file.name}`
                 : "Accepted Formats: .csv, .json, .xlsx"}
             </p>
@@ -179,6 +343,7 @@ function App() {
               className={msg.type === "user" ? "user-message" : "bot-message"}
             >
               {msg.text}
+              {msg.visualization && <Chart visualization={msg.visualization} />}
             </div>
           ))}
           {isLoading && <TypingLoader />}
@@ -192,12 +357,12 @@ function App() {
               onChange={(e) => setMessage(e.target.value)}
               onKeyPress={(e) => e.key === "Enter" && handleSendMessage()}
               placeholder="Type your message..."
-              disabled={!file || isLoading}
+              disabled={!datasetId || isLoading}
             />
             <button
               className="send-button"
               onClick={handleSendMessage}
-              disabled={!file || isLoading}
+              disabled={!datasetId || isLoading}
             >
               Send
             </button>
@@ -1,7 +1,14 @@
 import os
+import sys
+
+# Modules shared with the other agents live in agent_common at the repository root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
 from google.adk.agents import Agent
 from dotenv import load_dotenv
-from tools import log_habit, get_summary
+from tools import log_habit, get_summary, habit_state_fingerprint
+from memory import build_memory
+from agent_common.response_cache import build_response_cache
 
 load_dotenv()
 
@@ -10,6 +17,12 @@ load_dotenv()
 if not os.getenv("GOOGLE_API_KEY"):
     raise ValueError("GOOGLE_API_KEY not found in environment variables.")
 
+# Long-term conversation memory; keeps each prompt to a digest plus recent turns
+conversation_memory = build_memory()
+
+# Opt-in replay of model responses to repeated questions (RESPONSE_CACHE_TTL_SECONDS)
+response_cache = build_response_cache(fingerprint=habit_state_fingerprint)
+
 habit_tracker_agent = Agent(
     name="habit_tracker_agent",
     model="gemini-2.5-flash",
@@ -22,4 +35,8 @@ habit_tracker_agent = Agent(
         "Use the tools provided to log habits and retrieve summaries."
     ),
     tools=[log_habit, get_summary],
+    # The cache keys on the prompt as trimmed by memory, so it runs second.
+    before_model_callback=[conversation_memory.before_model_callback]
+    + ([response_cache.before_model_callback] if response_cache else []),
+    after_model_callback=response_cache.after_model_callback if response_cache else None,
 )
@@ -0,0 +1,201 @@
+import json
+import sqlite3
+import sys
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS habits (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    type TEXT NOT NULL,
+    details TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_habits_user_time ON habits (user_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_habits_time ON habits (timestamp);
+CREATE TABLE IF NOT EXISTS habit_rollups (
+    user_id TEXT NOT NULL,
+    granularity TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    type TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (user_id, granularity, bucket, type)
+);
+"""
+
+# Rollup granularities; "all" has a single bucket covering the whole history.
+GRANULARITIES = ("daily", "weekly", "monthly", "all")
+ALL_TIME_BUCKET = "all"
+
+UPSERT_ROLLUP = """
+INSERT INTO habit_rollups (user_id, granularity, bucket, type, count) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (user_id, granularity, bucket, type) DO UPDATE SET count = count + excluded.count
+"""
+
+
+def bucket_start(granularity: str, timestamp: datetime) -> Optional[datetime]:
+    """Start of the calendar day, ISO week or month containing `timestamp`."""
+    day = timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == "daily":
+        return day
+    if granularity == "weekly":
+        return day - timedelta(days=day.weekday())
+    if granularity == "monthly":
+        return day.replace(day=1)
+    return None
+
+
+def bucket_key(granularity: str, timestamp: datetime) -> str:
+    start = bucket_start(granularity, timestamp)
+    return start.date().isoformat() if start is not None else ALL_TIME_BUCKET
+
+
+class HabitStore:
+    """
+    Append-only log of habit events in SQLite.
+
+    The database runs in WAL mode so appends are a single O(1) insert that never
+    blocks readers, and concurrent writers are serialized by SQLite instead of
+    overwriting each other. Events are indexed by (user_id, timestamp) and by
+    timestamp, so period queries only read the rows in range.
+
+    Per-type counts for every day, week, month and the whole history are kept in
+    `habit_rollups` and updated in the same transaction as each append, so a
+    period's totals are a primary-key lookup however long the log grows.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def append(
+        self, user_id: str, type: str, details: str, timestamp: Optional[datetime] = None
+    ) -> Dict:
+        event = {
+            "timestamp": (timestamp or datetime.now()).isoformat(),
+            "type": type,
+            "details": details,
+        }
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO habits (user_id, timestamp, type, details) VALUES (?, ?, ?, ?)",
+                (user_id, event["timestamp"], type, details),
+            )
+            conn.executemany(UPSERT_ROLLUP, _rollup_rows([(user_id, event["timestamp"], type)]))
+        return event
+
+    def range(
+        self,
+        user_id: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict]:
+        """Returns a user's events with start <= timestamp < end, newest first."""
+        query = "SELECT timestamp, type, details FROM habits WHERE user_id = ?"
+        params: list = [user_id]
+        if start is not None:
+            query += " AND timestamp >= ?"
+            params.append(start.isoformat())
+        if end is not None:
+            query += " AND timestamp < ?"
+            params.append(end.isoformat())
+        query += " ORDER BY timestamp DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        rows = self._connect().execute(query, params).fetchall()
+        return [{"timestamp": ts, "type": type, "details": details} for ts, type, details in rows]
+
+    def count(
+        self, user_id: str, start: Optional[datetime] = None, end: Optional[datetime] = None
+    ) -> int:
+        query = "SELECT COUNT(*) FROM habits WHERE user_id = ?"
+        params: list = [user_id]
+        if start is not None:
+            query += " AND timestamp >= ?"
+            params.append(start.isoformat())
+        if end is not None:
+            query += " AND timestamp < ?"
+            params.append(end.isoformat())
+        return self._connect().execute(query, params).fetchone()[0]
+
+    def rollup(self, user_id: str, granularity: str, timestamp: datetime) -> Dict[str, int]:
+        """Returns per-type counts for the `granularity` bucket containing `timestamp`."""
+        rows = self._connect().execute(
+            "SELECT type, count FROM habit_rollups"
+            " WHERE user_id = ? AND granularity = ? AND bucket = ? ORDER BY count DESC, type",
+            (user_id, granularity, bucket_key(granularity, timestamp)),
+        ).fetchall()
+        return dict(rows)
+
+    def rebuild_rollups(self) -> int:
+        """
+        Recomputes every rollup from the event log, e.g. for a database written
+        before rollups existed. Returns the number of rollup rows written.
+        """
+        with self._connect() as conn:
+            events = conn.execute("SELECT user_id, timestamp, type FROM habits")
+            counts = Counter()
+            for user_id, granularity, bucket, type, count in _rollup_rows(events):
+                counts[(user_id, granularity, bucket, type)] += count
+            conn.execute("DELETE FROM habit_rollups")
+            conn.executemany(
+                "INSERT INTO habit_rollups (user_id, granularity, bucket, type, count)"
+                " VALUES (?, ?, ?, ?, ?)",
+                [(*key, count) for key, count in counts.items()],
+            )
+        return len(counts)
+
+    def import_json_log(self, json_path: str, user_id: str) -> int:
+        """
+        Imports a legacy habit_log.json once, when the store is still empty.
+        Returns the number of events imported.
+        """
+        try:
+            with open(json_path, "r") as f:
+                habits = json.load(f)
+        except FileNotFoundError:
+            return 0
+
+        with self._connect() as conn:
+            if conn.execute("SELECT 1 FROM habits LIMIT 1").fetchone():
+                return 0
+            conn.executemany(
+                "INSERT INTO habits (user_id, timestamp, type, details) VALUES (?, ?, ?, ?)",
+                [(user_id, h["timestamp"], h["type"], h["details"]) for h in habits],
+            )
+        self.rebuild_rollups()
+        return len(habits)
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections cannot be shared across threads, so keep one per thread.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+
+def _rollup_rows(events: Iterable[Tuple[str, str, str]]):
+    """Yields one +1 rollup row per granularity for each (user_id, timestamp, type) event."""
+    for user_id, timestamp, type in events:
+        ts = datetime.fromisoformat(timestamp)
+        for granularity in GRANULARITIES:
+            yield (user_id, granularity, bucket_key(granularity, ts), type, 1)
+
+
+if __name__ == "__main__":
+    # Usage: python habit_store.py rebuild-rollups [db_path]
+    if len(sys.argv) < 2 or sys.argv[1] != "rebuild-rollups":
+        sys.exit("Usage: python habit_store.py rebuild-rollups [db_path]")
+    db_path = sys.argv[2] if len(sys.argv) > 2 else "habit_log.db"
+    written = HabitStore(db_path).rebuild_rollups()
+    print(f"Rebuilt {written} rollup rows in {db_path}")
@@ -1,19 +1,29 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
+from google.adk.agents.run_config import RunConfig, StreamingMode
 from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
+from google.adk.telemetry.setup import maybe_set_otel_providers
 from google.genai import types
 import uvicorn
+import json
 import logging
-from agent import habit_tracker_agent
+import os
+from agent import habit_tracker_agent, conversation_memory
+from agent_common.metrics import MetricsMiddleware, MetricsPlugin, render_metrics
+from sessions import SessionManager, build_session_service
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Exports traces (ours and ADK's) when OTEL_EXPORTER_OTLP_ENDPOINT is set
+maybe_set_otel_providers()
+
 app = FastAPI()
+app.add_middleware(MetricsMiddleware)
 
 # CORS configuration
 origins = [
@@ -29,14 +39,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global session service
-session_service = InMemorySessionService()
+# Global session service (in-memory, or persistent when SESSION_DB_URL is set)
+session_service = build_session_service()
+session_manager = SessionManager(
+    session_service,
+    app_name="habit_tracker_app",
+    idle_ttl_seconds=float(os.getenv("SESSION_IDLE_TTL_SECONDS", "3600")),
+)
 
 # Initialize runner
 runner = Runner(
     agent=habit_tracker_agent,
     app_name="habit_tracker_app",
     session_service=session_service,
+    plugins=[MetricsPlugin()],
 )
 
 
@@ -51,6 +67,22 @@ class ChatResponse(BaseModel):
     session_id: str
 
 
+def _user_id(request: ChatRequest) -> str:
+    return request.user_id or "default_user"
+
+
+def _remember_turn(request: ChatRequest, response: str) -> None:
+    conversation_memory.append(_user_id(request), "user", request.message)
+    conversation_memory.append(_user_id(request), "model", response)
+
+
+async def _get_session_id(request: ChatRequest) -> str:
+    # Reuse the caller's session if it still exists, otherwise create one
+    session = await session_manager.get_or_create(_user_id(request), request.session_id)
+    logger.info(f"Using session_ID: {session.id}")
+    return session.id
+
+
 @app.post("/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     """
@@ -60,23 +92,12 @@ async def chat(request: ChatRequest):
     try:
         logger.info(f"Received chat request: {request.message}")
 
-        # Get or create session
-        session_id = None
-
-        if not session_id:
-            # Create new session
-            logger.info(f"Creating new session for user: user-1")
-            session = await session_service.create_session(
-                app_name="habit_tracker_app", user_id="user-1"
-            )
-            session_id = session.id
-        # logger.info(f"Using session ID: {session.id}")
-        logger.info(f"Using session_ID: {session_id}")
+        session_id = await _get_session_id(request)
 
         # Run the agent with the message
         events_iterator = runner.run_async(
             session_id=session_id,
-            user_id="user-1",
+            user_id=_user_id(request),
             new_message=types.Content(
                 role="user",
                 parts=[types.Part(text=request.message)],
@@ -87,8 +108,6 @@ async def chat(request: ChatRequest):
 
         # Collect all events and extract the response
         async for event in events_iterator:
-            logger.info(f"Event type: {type(event).__name__}")
-
             # Check different event types for the response
             if hasattr(event, "content") and event.content:
                 if hasattr(event.content, "parts") and event.content.parts:
@@ -107,6 +126,8 @@ async def chat(request: ChatRequest):
         if not final_response_text:
             final_response_text = "Sorry, I couldn't process that. Please try again."
             logger.warning("No response found from model")
+        else:
+            _remember_turn(request, final_response_text)
 
         return ChatResponse(response=final_response_text, session_id=session_id)
 
@@ -117,12 +138,84 @@ async def chat(request: ChatRequest):
         )
 
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Streams the agent's reply as Server-Sent Events.
+
+    Events: `session` (the session id), `text` (partial model text as it is generated),
+    `tool_call` and `tool_result` (each tool invocation as it starts and finishes),
+    `final` (the complete response) and `error`.
+    """
+    logger.info(f"Received streaming chat request: {request.message}")
+    try:
+        session_id = await _get_session_id(request)
+    except Exception as e:
+        logger.error(f"Error processing request: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=500, detail=f"Error processing request: {str(e)}"
+        )
+
+    async def event_stream():
+        yield _sse("session", {"session_id": session_id})
+        final_response_text = ""
+        try:
+            async for event in runner.run_async(
+                session_id=session_id,
+                user_id=_user_id(request),
+                new_message=types.Content(
+                    role="user",
+                    parts=[types.Part(text=request.message)],
+                ),
+                run_config=RunConfig(streaming_mode=StreamingMode.SSE),
+            ):
+                if not (event.content and event.content.parts):
+                    continue
+                for part in event.content.parts:
+                    if part.function_call:
+                        yield _sse("tool_call", {"name": part.function_call.name, "args": part.function_call.args})
+                    if part.function_response:
+                        yield _sse("tool_result", {"name": part.function_response.name})
+                    if part.text and event.content.role == "model":
+                        if event.partial:
+                            yield _sse("text", {"text": part.text})
+                        else:
+                            final_response_text = part.text
+        except Exception as e:
+            logger.error(f"Error processing request: {str(e)}", exc_info=True)
+            yield _sse("error", {"detail": f"Error processing request: {str(e)}"})
+            return
+
+        if not final_response_text:
+            final_response_text = "Sorry, I couldn't process that. Please try again."
+            logger.warning("No response found from model")
+        else:
+            _remember_turn(request, final_response_text)
+        yield _sse("final", {"response": final_response_text, "session_id": session_id})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     return {"status": "healthy"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Request, model, tool and turn latencies and payload sizes in the Prometheus text format."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -130,4 +223,6 @@ async def root():
 
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
+    # Several workers need SESSION_DB_URL so they share sessions; habits and memory are already on disk.
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=workers == 1, workers=workers)
@@ -1,19 +1,210 @@
+import fcntl
+import hashlib
 import json
-from typing import List, Dict
+import os
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List
 
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmRequest
+from google.genai import types
+
+MEMORY_DIR = "memory"
+
+# Legacy single-file history, imported into the default user's log once
 MEMORY_FILE = "memory.json"
 
+# Turns older than the window are folded into the digest
+WINDOW_TURNS = 20
+
+# Compaction runs once this many turns have piled up beyond the window, so the
+# digest is rewritten every few turns rather than on each one
+COMPACT_EVERY_TURNS = 10
+
+DIGEST_MAX_CHARS = 2000
+DIGEST_LINE_MAX_CHARS = 160
+
+# (previous digest, turns being compacted) -> new digest
+Summarizer = Callable[[str, List[Dict]], str]
+
+
+def extractive_summary(digest: str, turns: List[Dict]) -> str:
+    """
+    Default summarizer: one truncated line per user turn, keeping the most recent
+    lines that fit in DIGEST_MAX_CHARS.
+    """
+    lines = digest.splitlines() if digest else []
+    for turn in turns:
+        if turn["role"] != "user":
+            continue
+        text = " ".join(" ".join(turn["parts"]).split())
+        if len(text) > DIGEST_LINE_MAX_CHARS:
+            text = text[: DIGEST_LINE_MAX_CHARS - 3] + "..."
+        day = turn.get("timestamp", "")[:10]
+        lines.append(f"- {day}: {text}" if day else f"- {text}")
+
+    kept, size = [], 0
+    for line in reversed(lines):
+        size += len(line) + 1
+        if size > DIGEST_MAX_CHARS:
+            break
+        kept.append(line)
+    return "\n".join(reversed(kept))
+
+
+class ConversationMemory:
+    """
+    Per-user conversation history with a bounded footprint.
+
+    Turns are appended to `<dir>/<user>.jsonl` and never rewritten. A small
+    `<user>.digest.json` holds a summary of every turn before `offset`, the byte
+    position in the log up to which turns have been compacted. Reading a user's
+    memory therefore costs one small digest plus the uncompacted tail of the log,
+    which compaction keeps between WINDOW_TURNS and WINDOW_TURNS + COMPACT_EVERY_TURNS
+    turns however long the history grows.
+
+    Each user's files are guarded by a lock on `<user>.lock`, which serializes
+    threads and worker processes alike.
+    """
+
+    def __init__(
+        self,
+        directory: str = MEMORY_DIR,
+        window_turns: int = WINDOW_TURNS,
+        compact_every_turns: int = COMPACT_EVERY_TURNS,
+        summarize: Summarizer = extractive_summary,
+    ):
+        self.directory = directory
+        self.window_turns = window_turns
+        self.compact_every_turns = compact_every_turns
+        self.summarize = summarize
+        os.makedirs(directory, exist_ok=True)
+
+    def append(self, user_id: str, role: str, text: str) -> None:
+        """Appends one turn to the user's log, compacting it if enough turns have piled up."""
+        with self._locked(user_id):
+            self._append(user_id, role, text)
+
+    def load(self, user_id: str) -> tuple[str, List[Dict]]:
+        """Returns the user's digest and the turns that have not been compacted into it."""
+        with self._locked(user_id, shared=True):
+            digest = self._read_digest(user_id)
+            turns, _ = self._read_tail(user_id, digest["offset"])
+        return digest["text"], turns
+
+    def import_json_history(self, json_path: str, user_id: str) -> int:
+        """
+        Imports a legacy memory.json once, when the user has no log yet.
+        Returns the number of turns imported.
+        """
+        # Held throughout, so workers starting together import it only once.
+        with self._locked(user_id):
+            if os.path.exists(self._log_path(user_id)):
+                return 0
+            try:
+                with open(json_path, "r") as f:
+                    history = json.load(f)
+            except FileNotFoundError:
+                return 0
+            for turn in history:
+                self._append(user_id, turn["role"], " ".join(turn["parts"]))
+        return len(history)
+
+    def before_model_callback(
+        self, callback_context: CallbackContext, llm_request: LlmRequest
+    ) -> None:
+        """
+        Bounds the prompt to the digest plus the uncompacted turns from memory.
+
+        The session's earlier contents are replaced by the remembered turns; only the
+        current turn (the latest user message and any tool calls made since) is kept
+        from the request. Memory is recorded per turn by the server, so it spans
+        sessions as well.
+        """
+        digest, turns = self.load(callback_context.user_id)
+        contents = llm_request.contents
+        current = next(
+            (
+                i for i in range(len(contents) - 1, -1, -1)
+                if contents[i].role == "user" and any(part.text for part in contents[i].parts or [])
+            ),
+            0,
+        )
+        llm_request.contents = [
+            types.Content(role=turn["role"], parts=[types.Part(text=" ".join(turn["parts"]))])
+            for turn in turns
+        ] + contents[current:]
+        if digest:
+            llm_request.append_instructions(
+                [f"Summary of earlier conversations with this user:\n{digest}"]
+            )
+
+    def _append(self, user_id: str, role: str, text: str) -> None:
+        turn = {"role": role, "parts": [text], "timestamp": datetime.now().isoformat()}
+        with open(self._log_path(user_id), "a") as f:
+            f.write(json.dumps(turn) + "\n")
+        digest = self._read_digest(user_id)
+        turns, offsets = self._read_tail(user_id, digest["offset"])
+        if len(turns) > self.window_turns + self.compact_every_turns:
+            self._compact(user_id, digest, turns, offsets)
+
+    @contextmanager
+    def _locked(self, user_id: str, shared: bool = False) -> Iterator[None]:
+        with open(os.path.join(self.directory, f"{_user_key(user_id)}.lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            yield
+
+    def _compact(self, user_id: str, digest: Dict, turns: List[Dict], offsets: List[int]) -> None:
+        cut = len(turns) - self.window_turns
+        text = self.summarize(digest["text"], turns[:cut])
+        self._write_digest(user_id, {"text": text, "offset": offsets[cut]})
+
+    def _read_tail(self, user_id: str, offset: int) -> tuple[List[Dict], List[int]]:
+        """Reads the turns after `offset`, with the byte offset each one starts at."""
+        turns, offsets = [], []
+        try:
+            with open(self._log_path(user_id), "rb") as f:
+                f.seek(offset)
+                for line in f:
+                    offsets.append(offset)
+                    offset += len(line)
+                    turns.append(json.loads(line))
+        except FileNotFoundError:
+            pass
+        return turns, offsets
+
+    def _read_digest(self, user_id: str) -> Dict:
+        try:
+            with open(self._digest_path(user_id), "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"text": "", "offset": 0}
+
+    def _write_digest(self, user_id: str, digest: Dict) -> None:
+        # Written to a temporary file and renamed so readers never see a partial digest.
+        path = self._digest_path(user_id)
+        with open(path + ".tmp", "w") as f:
+            json.dump(digest, f)
+        os.replace(path + ".tmp", path)
+
+    def _log_path(self, user_id: str) -> str:
+        return os.path.join(self.directory, f"{_user_key(user_id)}.jsonl")
+
+    def _digest_path(self, user_id: str) -> str:
+        return os.path.join(self.directory, f"{_user_key(user_id)}.digest.json")
+
 
-def read_memory() -> List[Dict]:
-    """Reads the conversation history from the memory file."""
-    try:
-        with open(MEMORY_FILE, "r") as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return []
+def _user_key(user_id: str) -> str:
+    # User ids come from requests, so they are hashed rather than used as file names.
+    return hashlib.sha256(user_id.encode("utf-8")).hexdigest()[:32]
 
 
-def write_memory(history: List[Dict]):
-    """Writes the conversation history to the memory file."""
-    with open(MEMORY_FILE, "w") as f:
-        json.dump(history, f, indent=2)
+def build_memory() -> ConversationMemory:
+    """Returns the memory store configured by MEMORY_DIR and MEMORY_WINDOW_TURNS."""
+    memory = ConversationMemory(
+        os.getenv("MEMORY_DIR", MEMORY_DIR),
+        window_turns=int(os.getenv("MEMORY_WINDOW_TURNS", str(WINDOW_TURNS))),
+    )
+    memory.import_json_history(MEMORY_FILE, user_id="default_user")
+    return memory
@@ -0,0 +1,107 @@
+import logging
+import os
+import time
+from typing import Optional
+
+from google.adk.sessions import BaseSessionService, InMemorySessionService, Session
+from google.adk.sessions.base_session_service import GetSessionConfig
+
+logger = logging.getLogger(__name__)
+
+
+def build_session_service() -> BaseSessionService:
+    """
+    Returns the session backend configured by SESSION_DB_URL.
+
+    With a database URL (e.g. `sqlite+aiosqlite:///./sessions.db`) sessions are
+    persisted through ADK's DatabaseSessionService and survive restarts; without
+    one they are kept in memory.
+    """
+    db_url = os.getenv("SESSION_DB_URL")
+    if not db_url:
+        return InMemorySessionService()
+
+    # Imported lazily so the in-memory setup does not require SQLAlchemy.
+    from google.adk.sessions import DatabaseSessionService
+
+    logger.info(f"Persisting sessions to {db_url}")
+    return DatabaseSessionService(db_url=db_url)
+
+
+class SessionManager:
+    """
+    Reuses sessions across turns and deletes the ones that have gone idle.
+
+    Every lookup records when the session was last used; at most once per
+    `sweep_interval_seconds` sessions unused for longer than `idle_ttl_seconds`
+    are deleted from the session service so it does not grow without bound.
+
+    With several worker processes sharing a database-backed session service, a
+    session this worker considers idle may still be in use by another one, so it is
+    only deleted if the service's own last update time is past the TTL as well.
+    """
+
+    def __init__(
+        self,
+        session_service: BaseSessionService,
+        app_name: str,
+        idle_ttl_seconds: float,
+        sweep_interval_seconds: float = 60.0,
+    ):
+        self.session_service = session_service
+        self.app_name = app_name
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.sweep_interval_seconds = sweep_interval_seconds
+        self._last_seen: dict[tuple[str, str], float] = {}
+        self._last_sweep = time.monotonic()
+
+    async def get_or_create(self, user_id: str, session_id: Optional[str]) -> Session:
+        """Returns the existing session with this id, or creates one."""
+        await self._maybe_sweep()
+
+        session = None
+        if session_id:
+            # The runner loads the full history itself; only existence matters here.
+            session = await self.session_service.get_session(
+                app_name=self.app_name,
+                user_id=user_id,
+                session_id=session_id,
+                config=GetSessionConfig(num_recent_events=1),
+            )
+        if session is None:
+            logger.info(f"Creating new session for user: {user_id}")
+            session = await self.session_service.create_session(
+                app_name=self.app_name, user_id=user_id, session_id=session_id
+            )
+
+        self._last_seen[(user_id, session.id)] = time.monotonic()
+        return session
+
+    async def evict_idle(self) -> int:
+        """Deletes sessions idle for longer than the TTL. Returns how many were deleted."""
+        cutoff = time.monotonic() - self.idle_ttl_seconds
+        idle = [key for key, seen in self._last_seen.items() if seen < cutoff]
+        evicted = 0
+        for user_id, session_id in idle:
+            del self._last_seen[(user_id, session_id)]
+            session = await self.session_service.get_session(
+                app_name=self.app_name,
+                user_id=user_id,
+                session_id=session_id,
+                config=GetSessionConfig(num_recent_events=1),
+            )
+            if session is None or session.last_update_time > time.time() - self.idle_ttl_seconds:
+                continue
+            await self.session_service.delete_session(
+                app_name=self.app_name, user_id=user_id, session_id=session_id
+            )
+            evicted += 1
+        if evicted:
+            logger.info(f"Evicted {evicted} idle sessions")
+        return evicted
+
+    async def _maybe_sweep(self) -> None:
+        now = time.monotonic()
+        if now - self._last_sweep >= self.sweep_interval_seconds:
+            self._last_sweep = now
+            await self.evict_idle()
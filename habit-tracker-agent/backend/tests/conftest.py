@@ -0,0 +1,9 @@
+import os
+import sys
+
+# The backend's modules import each other as top-level modules, as they do when it
+# is run from this directory.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pytest imports the backend package, and with it the agent, which requires a key.
+os.environ.setdefault("GOOGLE_API_KEY", "test")
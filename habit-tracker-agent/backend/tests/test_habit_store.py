@@ -0,0 +1,100 @@
+import json
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pytest
+
+from habit_store import HabitStore, bucket_key
+
+# A Friday, so its week started on Monday the 11th.
+NOW = datetime(2024, 3, 15, 18, 30)
+
+
+@pytest.fixture
+def store(tmp_path) -> HabitStore:
+    return HabitStore(str(tmp_path / "habits.db"))
+
+
+def _log(store: HabitStore, user_id: str = "user") -> list:
+    events = [
+        ("exercise", NOW),
+        ("exercise", NOW - timedelta(hours=20)),
+        ("reading", NOW - timedelta(days=2)),
+        ("exercise", NOW - timedelta(days=5)),
+        ("reading", NOW - timedelta(days=20)),
+    ]
+    for type, timestamp in events:
+        store.append(user_id, type, f"{type} at {timestamp}", timestamp=timestamp)
+    return events
+
+
+def _expected(events, granularity):
+    key = bucket_key(granularity, NOW)
+    return dict(Counter(type for type, ts in events if bucket_key(granularity, ts) == key))
+
+
+def test_bucket_keys():
+    assert bucket_key("daily", NOW) == "2024-03-15"
+    assert bucket_key("weekly", NOW) == "2024-03-11"
+    assert bucket_key("monthly", NOW) == "2024-03-01"
+    assert bucket_key("all", NOW) == "all"
+
+
+@pytest.mark.parametrize("granularity", ["daily", "weekly", "monthly", "all"])
+def test_rollups_match_the_log(store, granularity):
+    events = _log(store)
+
+    assert store.rollup("user", granularity, NOW) == _expected(events, granularity)
+
+
+def test_rollups_are_per_user(store):
+    _log(store)
+    store.append("other", "sleep", "8 hours", timestamp=NOW)
+
+    assert store.rollup("other", "all", NOW) == {"sleep": 1}
+    assert "sleep" not in store.rollup("user", "all", NOW)
+
+
+def test_rebuild_matches_incremental_rollups(store):
+    _log(store)
+    _log(store, user_id="other")
+    incremental = {
+        (user, g): store.rollup(user, g, NOW)
+        for user in ("user", "other")
+        for g in ("daily", "weekly", "monthly", "all")
+    }
+
+    store.rebuild_rollups()
+
+    assert incremental == {
+        (user, g): store.rollup(user, g, NOW)
+        for user in ("user", "other")
+        for g in ("daily", "weekly", "monthly", "all")
+    }
+
+
+def test_legacy_log_is_imported_once_with_rollups(store, tmp_path):
+    legacy = tmp_path / "habit_log.json"
+    legacy.write_text(json.dumps([
+        {"timestamp": NOW.isoformat(), "type": "exercise", "details": "run"},
+        {"timestamp": (NOW - timedelta(days=40)).isoformat(), "type": "reading", "details": "book"},
+    ]))
+
+    assert store.import_json_log(str(legacy), user_id="legacy") == 2
+    assert store.import_json_log(str(legacy), user_id="legacy") == 0
+    assert store.rollup("legacy", "all", NOW) == {"exercise": 1, "reading": 1}
+    assert store.rollup("legacy", "monthly", NOW) == {"exercise": 1}
+
+
+def test_range_is_half_open_and_newest_first(store):
+    _log(store)
+    start = NOW - timedelta(days=5)
+
+    events = store.range("user", start=start, end=NOW)
+
+    assert [e["timestamp"] for e in events] == [
+        (NOW - timedelta(hours=20)).isoformat(),
+        (NOW - timedelta(days=2)).isoformat(),
+        start.isoformat(),
+    ]
+    assert store.count("user", start=start, end=NOW) == 3
@@ -0,0 +1,112 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+from google.adk.models import LlmRequest
+from google.genai import types
+
+from memory import ConversationMemory
+
+
+@pytest.fixture
+def memory(tmp_path) -> ConversationMemory:
+    return ConversationMemory(str(tmp_path), window_turns=4, compact_every_turns=2)
+
+
+def _converse(memory: ConversationMemory, user_id: str, turns: int) -> None:
+    for i in range(turns):
+        memory.append(user_id, "user", f"question {i}")
+        memory.append(user_id, "model", f"answer {i}")
+
+
+def _texts(turns) -> list:
+    return [" ".join(turn["parts"]) for turn in turns]
+
+
+def test_short_history_is_kept_whole(memory):
+    _converse(memory, "alice", 3)
+
+    digest, turns = memory.load("alice")
+
+    assert digest == ""
+    assert len(turns) == 6
+
+
+def test_old_turns_are_folded_into_the_digest(memory):
+    _converse(memory, "alice", 10)
+
+    digest, turns = memory.load("alice")
+
+    # The tail stays between the window and the window plus the compaction step.
+    assert 4 <= len(turns) <= 6
+    assert _texts(turns)[-2:] == ["question 9", "answer 9"]
+    # Every user turn is in either the digest or the tail, in order.
+    remembered = [line.split(": ", 1)[-1] for line in digest.splitlines()]
+    remembered += [text for text in _texts(turns) if text.startswith("question")]
+    assert remembered == [f"question {i}" for i in range(10)]
+
+
+def test_log_is_append_only(memory, tmp_path):
+    _converse(memory, "alice", 10)
+
+    logs = list(tmp_path.glob("*.jsonl"))
+
+    assert len(logs) == 1
+    assert len(logs[0].read_text().splitlines()) == 20
+
+
+def test_users_are_kept_apart(memory):
+    _converse(memory, "alice", 2)
+    memory.append("bob", "user", "hello")
+
+    assert _texts(memory.load("bob")[1]) == ["hello"]
+    assert "hello" not in _texts(memory.load("alice")[1])
+
+
+def test_custom_summarizer_receives_the_compacted_turns(tmp_path):
+    compacted = []
+
+    def summarize(digest, turns):
+        compacted.extend(turns)
+        return f"{len(compacted)} turns"
+
+    memory = ConversationMemory(str(tmp_path), window_turns=4, compact_every_turns=2, summarize=summarize)
+    _converse(memory, "alice", 10)
+    digest, turns = memory.load("alice")
+
+    assert digest == f"{len(compacted)} turns"
+    assert len(compacted) + len(turns) == 20
+
+
+def test_legacy_history_is_imported_once(memory, tmp_path):
+    legacy = tmp_path / "memory.json"
+    legacy.write_text(json.dumps([
+        {"role": "user", "parts": ["I ran 5k"]},
+        {"role": "model", "parts": ["Great job!"]},
+    ]))
+
+    assert memory.import_json_history(str(legacy), "default_user") == 2
+    assert memory.import_json_history(str(legacy), "default_user") == 0
+    assert _texts(memory.load("default_user")[1]) == ["I ran 5k", "Great job!"]
+
+
+def test_prompt_is_bounded_to_memory_and_the_current_turn(memory):
+    _converse(memory, "alice", 10)
+    _, remembered = memory.load("alice")
+    # The session's own history, which memory replaces, then the current turn.
+    session = [
+        types.Content(role=role, parts=[types.Part(text=f"session {i}")])
+        for i, role in enumerate(["user", "model"] * 20)
+    ]
+    current = [
+        types.Content(role="user", parts=[types.Part(text="How was my week?")]),
+        types.Content(role="model", parts=[types.Part(function_call=types.FunctionCall(name="get_habits"))]),
+    ]
+    request = LlmRequest(model="gemini", contents=session + current, config=types.GenerateContentConfig())
+
+    memory.before_model_callback(SimpleNamespace(user_id="alice"), request)
+
+    texts = [content.parts[0].text for content in request.contents]
+    assert texts[: len(remembered)] == _texts(remembered)
+    assert request.contents[len(remembered):] == current
+    assert "question 0" in request.config.system_instruction
@@ -1,53 +1,84 @@
-import json
 from datetime import datetime
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.tools import ToolContext
+from habit_store import HabitStore, bucket_start
+from agent_common.tool_runner import offload
 
+HABIT_DB_FILE = "habit_log.db"
+
+# Legacy whole-file log, imported into the store the first time it is opened
 HABIT_LOG_FILE = "habit_log.json"
+LEGACY_USER_ID = "default_user"
+
+PERIODS = ("daily", "weekly", "monthly")
+
+# Most events listed in a summary; the total count is always reported
+SUMMARY_MAX_EVENTS = 20
+
+habit_store = HabitStore(HABIT_DB_FILE)
+habit_store.import_json_log(HABIT_LOG_FILE, user_id=LEGACY_USER_ID)
+
+
+def _timed_out(timeout: float) -> str:
+    return f"Sorry, that took too long (over {timeout:g} seconds). Please try again."
+
+
+def _user_id(tool_context: ToolContext) -> str:
+    return tool_context._invocation_context.user_id
 
 
-def log_habit(type: str, details: str):
+def habit_state_fingerprint(callback_context: CallbackContext) -> str:
     """
-    Logs a user's habit to a JSON file.
+    The number of habits the user has logged. log_habit changes it, which expires
+    cached model responses that may depend on the user's habits, in every worker.
+    """
+    counts = habit_store.rollup(callback_context.user_id, "all", datetime.now())
+    return str(sum(counts.values()))
+
+
+@offload(timeout_result=_timed_out)
+def log_habit(type: str, details: str, tool_context: ToolContext):
+    """
+    Logs a user's habit to the habit store.
 
     Args:
         type (str): The type of habit (e.g., 'workout', 'meal').
         details (str): A description of the habit (e.g., 'ran 5 km').
+        tool_context (ToolContext): Injected by ADK; identifies the user.
     """
-    try:
-        with open(HABIT_LOG_FILE, "r") as f:
-            habits = json.load(f)
-    except FileNotFoundError:
-        habits = []
-
-    habits.append(
-        {"timestamp": datetime.now().isoformat(), "type": type, "details": details}
-    )
-
-    with open(HABIT_LOG_FILE, "w") as f:
-        json.dump(habits, f, indent=2)
+    habit_store.append(_user_id(tool_context), type, details)
 
     return f"Successfully logged habit: {type} - {details}"
 
 
-def get_summary(period: str):
+@offload(timeout_result=_timed_out)
+def get_summary(period: str, tool_context: ToolContext):
     """
     Returns a summary of logged habits for a given period.
 
     Args:
-        period (str): The period to summarize (e.g., 'daily', 'weekly').
+        period (str): The period to summarize: 'daily' (today), 'weekly' (this week)
+                      or 'monthly' (this month). Anything else summarizes all habits.
+        tool_context (ToolContext): Injected by ADK; identifies the user.
     """
-    try:
-        with open(HABIT_LOG_FILE, "r") as f:
-            habits = json.load(f)
-    except FileNotFoundError:
-        return "No habits logged yet."
-
-    # This is a simple summary. A more advanced implementation would
-    # filter by the requested period.
-    if not habits:
-        return "No habits logged yet."
-
-    summary = "Here's a summary of your recent habits:\n"
-    for habit in habits[-5:]:
+    user_id = _user_id(tool_context)
+    now = datetime.now()
+    granularity = period.lower() if period.lower() in PERIODS else "all"
+    start = bucket_start(granularity, now)
+
+    # Totals come from the rollups; only the most recent events are read from the log.
+    counts = habit_store.rollup(user_id, granularity, now)
+    total = sum(counts.values())
+    if not total:
+        return "No habits logged yet." if start is None else f"No habits logged in the {period} period."
+
+    habits = habit_store.range(user_id, start=start, limit=SUMMARY_MAX_EVENTS)
+    label = f"{period} habits" if start is not None else "habits"
+    summary = f"Here's a summary of your {label} ({total} logged):\n"
+    for type, count in counts.items():
+        summary += f"- {type}: {count}\n"
+    summary += "Most recent:\n"
+    for habit in reversed(habits):
         summary += f"- {habit['timestamp']}: {habit['type']} - {habit['details']}\n"
 
     return summary
@@ -4,6 +4,7 @@ import "./App.css";
 function App() {
   const [message, setMessage] = useState("");
   const [chatHistory, setChatHistory] = useState([]);
+  const [sessionId, setSessionId] = useState(null);
 
   const sendMessage = async () => {
     if (!message) return;
@@ -18,9 +19,10 @@ function App() {
         headers: {
           "Content-Type": "application/json",
         },
-        body: JSON.stringify({ message }),
+        body: JSON.stringify({ message, session_id: sessionId }),
       });
       const data = await response.json();
+      setSessionId(data.session_id);
       setChatHistory([
         ...newChatHistory,
         { role: "agent", text: data.response },
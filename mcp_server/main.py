@@ -1,16 +1,40 @@
 from fastmcp import FastMCP
 import datetime
+import os
+
+import httpx
+
+from tool_cache import cache_stats, cached
 
 app = FastMCP()
 
+# Upstream weather API, queried as `GET <url>?city=<city>`. Without it get_weather
+# returns a canned forecast. stub_weather_api.py serves a slow local stand-in.
+WEATHER_API_URL = os.getenv("WEATHER_API_URL")
+
+# One client for all upstream calls, so connections are kept alive between them.
+_http_client = None
+
+
+def _city_key(city: str) -> str:
+    """The form of a city name its forecast is cached under: trimmed and case-folded."""
+    return " ".join(city.split()).casefold()
+
 
 @app.tool()
-def get_weather(city: str):
+@cached(ttl_seconds=600, normalize={"city": _city_key})
+async def get_weather(city: str):
     """
-    This is a dummy function that returns a hardcoded weather forecast.
-    In a real application, this would call a weather API.
+    Returns the weather forecast for a city.
     """
-    return {"weather": f"The weather in {city} is sunny and 30 degrees Celsius."}
+    global _http_client
+    if not WEATHER_API_URL:
+        return {"weather": f"The weather in {city} is sunny and 30 degrees Celsius."}
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(timeout=float(os.getenv("WEATHER_API_TIMEOUT_SECONDS", "10")))
+    response = await _http_client.get(WEATHER_API_URL, params={"city": city})
+    response.raise_for_status()
+    return response.json()
 
 
 @app.tool()
@@ -21,5 +45,13 @@ def get_current_time():
     return {"time": datetime.datetime.now().isoformat()}
 
 
+@app.resource("stats://tool-cache")
+def get_tool_cache_stats():
+    """
+    Hit, miss and coalesced-call counts of the tool result caches.
+    """
+    return cache_stats()
+
+
 if __name__ == "__main__":
     app.run(transport="http", port=8001)
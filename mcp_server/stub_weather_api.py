@@ -0,0 +1,54 @@
+"""
+A slow stand-in for the weather API behind get_weather, for trying out the tool
+cache locally:
+
+    python mcp_server/stub_weather_api.py --delay 2
+    WEATHER_API_URL=http://127.0.0.1:8002/weather python mcp_server/main.py
+
+Every request is counted, so the log shows how many calls reached the upstream.
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+_requests = 0
+_lock = threading.Lock()
+
+
+class WeatherHandler(BaseHTTPRequestHandler):
+    delay_seconds = 1.0
+
+    def do_GET(self):
+        global _requests
+        url = urlparse(self.path)
+        if url.path != "/weather":
+            self.send_error(404)
+            return
+        city = parse_qs(url.query).get("city", ["unknown"])[0]
+        with _lock:
+            _requests += 1
+            served = _requests
+        time.sleep(self.delay_seconds)
+        body = json.dumps(
+            {"weather": f"The weather in {city} is cloudy and 18 degrees Celsius.", "request": served}
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        print(f"[upstream request {_requests}] {format % args}", flush=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8002)
+    parser.add_argument("--delay", type=float, default=1.0, help="seconds each response takes")
+    args = parser.parse_args()
+    WeatherHandler.delay_seconds = args.delay
+    ThreadingHTTPServer(("127.0.0.1", args.port), WeatherHandler).serve_forever()
@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+from main import _city_key
+from tool_cache import ToolCache, cached
+
+
+def _forecasts(ttl_seconds=600, delay=0.0, fail=False):
+    calls = []
+
+    @cached(ttl_seconds=ttl_seconds, normalize={"city": _city_key})
+    async def forecast(city: str):
+        calls.append(city)
+        await asyncio.sleep(delay)
+        if fail:
+            raise RuntimeError("upstream unavailable")
+        return {"city": city}
+
+    return forecast, calls
+
+
+def test_spellings_of_a_city_share_an_entry():
+    forecast, calls = _forecasts()
+
+    async def run():
+        return [await forecast(city) for city in ("London", " london ", "LONDON", "New  York", "new york")]
+
+    results = asyncio.run(run())
+
+    # The tool still receives the city as given.
+    assert calls == ["London", "New  York"]
+    assert results[1] == {"city": "London"}
+    assert forecast.cache.stats.hits == 3
+
+
+def test_identical_calls_in_flight_are_coalesced():
+    forecast, calls = _forecasts(delay=0.05)
+
+    async def run():
+        return await asyncio.gather(*(forecast("Paris") for _ in range(10)))
+
+    results = asyncio.run(run())
+
+    assert calls == ["Paris"]
+    assert all(result == {"city": "Paris"} for result in results)
+    assert forecast.cache.stats.coalesced == 9
+
+
+def test_errors_are_shared_but_not_cached():
+    forecast, calls = _forecasts(delay=0.05, fail=True)
+
+    async def run():
+        return await asyncio.gather(forecast("Oslo"), forecast("Oslo"), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    with pytest.raises(RuntimeError):
+        asyncio.run(forecast("Oslo"))
+
+    assert calls == ["Oslo", "Oslo"]
+    assert forecast.cache.stats.errors == 2
+
+
+def test_zero_ttl_disables_caching():
+    forecast, calls = _forecasts(ttl_seconds=0)
+
+    async def run():
+        await forecast("Rome")
+        await forecast("Rome")
+
+    asyncio.run(run())
+
+    assert calls == ["Rome", "Rome"]
+
+
+def test_expired_and_least_recently_used_entries_are_dropped(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("tool_cache.time.monotonic", lambda: now[0])
+    cache = ToolCache(ttl_seconds=10, max_entries=2)
+    calls = []
+
+    async def get(key):
+        async def call():
+            calls.append(key)
+            return key
+
+        return await cache.get_or_call(key, call)
+
+    async def run():
+        await get("a")
+        await get("b")
+        await get("a")
+        await get("c")  # evicts "b", the least recently used
+        await get("a")
+        await get("b")
+        now[0] = 11.0
+        await get("b")
+
+    asyncio.run(run())
+
+    assert calls == ["a", "b", "c", "b", "b"]
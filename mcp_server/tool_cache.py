@@ -0,0 +1,139 @@
+import asyncio
+import functools
+import inspect
+import json
+import os
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Mapping, Optional
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    # Calls that arrived while an identical call was in flight and shared its result.
+    coalesced: int = 0
+    errors: int = 0
+
+
+class ToolCache:
+    """
+    Results of one tool, keyed by its arguments, kept for `ttl_seconds`.
+
+    Identical calls that arrive while one is already running wait for that call
+    instead of starting their own, so a burst of requests for the same city costs a
+    single upstream request. Errors are shared with the calls waiting on them but
+    are not cached. At most `max_entries` results are kept, least recently used
+    first out.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.stats = CacheStats()
+        self._entries: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        self._inflight: dict[str, asyncio.Task] = {}
+
+    async def get_or_call(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.stats.hits += 1
+                return entry[1]
+            del self._entries[key]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats.coalesced += 1
+        else:
+            self.stats.misses += 1
+            task = asyncio.ensure_future(self._fill(key, call))
+            task.add_done_callback(_consume_exception)
+            self._inflight[key] = task
+        # Shielded so a caller that gives up does not cancel the call for the others.
+        return await asyncio.shield(task)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    async def _fill(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await call()
+        except Exception:
+            self.stats.errors += 1
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        if self.ttl_seconds <= 0:
+            return value
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return value
+
+
+# Caches by tool name, for reporting.
+_caches: dict[str, ToolCache] = {}
+
+
+def cached(
+    ttl_seconds: float,
+    max_entries: int = 1024,
+    normalize: Optional[Mapping[str, Callable[[Any], Any]]] = None,
+) -> Callable:
+    """
+    Caches a tool's results per argument set and coalesces identical in-flight calls.
+    See ToolCache.
+
+    `normalize` maps argument names to functions applied to those arguments when
+    building the key, so spellings that mean the same thing (e.g. "London" and
+    " london") share one entry and one upstream call. The tool itself still
+    receives the arguments as given.
+
+    Apply it below `@app.tool()`; the wrapper keeps the tool's name, signature and
+    docstring, which FastMCP uses to build the tool schema. Blocking tools are run
+    in a worker thread. The TTL can be overridden with TOOL_CACHE_<NAME>_TTL_SECONDS
+    (0 disables caching, but identical in-flight calls are still coalesced).
+    """
+
+    def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+        ttl = float(os.getenv(f"TOOL_CACHE_{func.__name__.upper()}_TTL_SECONDS", str(ttl_seconds)))
+        cache = _caches[func.__name__] = ToolCache(ttl, max_entries)
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = {
+                name: normalize[name](value) if normalize and name in normalize else value
+                for name, value in bound.arguments.items()
+            }
+            key = json.dumps(arguments, sort_keys=True, default=str)
+            if inspect.iscoroutinefunction(func):
+                call = functools.partial(func, *args, **kwargs)
+            else:
+                call = functools.partial(asyncio.to_thread, func, *args, **kwargs)
+            return await cache.get_or_call(key, call)
+
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
+
+
+def cache_stats() -> dict[str, dict[str, Any]]:
+    """Hit, miss, coalesced and error counts, plus the current size, for each cached tool."""
+    return {
+        name: {**asdict(cache.stats), "entries": len(cache._entries), "ttl_seconds": cache.ttl_seconds}
+        for name, cache in _caches.items()
+    }
+
+
+def _consume_exception(task: asyncio.Task) -> None:
+    # Every waiter may have given up before a failed call finished; don't log it as unhandled.
+    if not task.cancelled():
+        task.exception()
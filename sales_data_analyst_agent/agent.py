@@ -1,81 +1,673 @@
+import logging
+import os
+import re
+import tempfile
+import time
 import pandas as pd
 from google.adk.agents import Agent
-from typing import Any, Dict, Literal
+from google.adk.tools import ToolContext
+from typing import Any, BinaryIO, Callable, Dict, Literal, Optional, Union
 from dotenv import load_dotenv
 import json
+import ast
+import hashlib
+import sys
+
+# Modules shared with the other agents live in agent_common at the repository root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chunked_ingest import (
+    evaluate_out_of_core,
+    evaluate_out_of_core_batch,
+    ingest_chunked,
+    open_chunked,
+    save_manifest,
+    scan_chunked,
+)
+from columnar_store import ColumnarStore, sniff_encoding, sniff_stream_encoding
+from compaction import compact_dataframe, is_current
+from dataset_cache import CachedDataset, ChunkedDataset, Dataset, DatasetCache, hash_stream
+from expression_engine import check_expression, evaluate
+from profiling import profile_dataframe
+from query_cache import QueryCache, split_expression
+from visualization import build_payload
+from session_datasets import SessionDatasetRegistry, SessionKey
+from shared_state import SessionDatasetDirectory
+from agent_common.tool_runner import offload
+from workspace import Scan, dataset_name, plan_query, referenced_datasets, scan_frame, scan_table
 
 load_dotenv()
 
-# In-memory storage for the DataFrame
-data_store: dict[str, Any] = {"dataframe": None}
+logger = logging.getLogger(__name__)
+
+
+def _dataset_in_use(digest: str) -> bool:
+    """Whether any session, in this worker or another, is working with the dataset."""
+    return session_datasets.references(digest) or dataset_directory.in_use(digest)
+
+
+def _release_columnar_copy(dataset: Dataset) -> None:
+    """
+    Deletes a dataset's columnar copy once it is neither cached in this worker nor
+    used by any session. Called when the dataset is evicted and when it is released.
+
+    Copies written or loaded within the idle TTL are kept like the sessions are, so a
+    dataset id returned by /datasets stays valid until a session first uses it.
+    """
+    if isinstance(dataset, ChunkedDataset) or dataset_cache.contains(dataset.digest):
+        return
+    last_used = columnar_store.last_used(dataset.digest)
+    if last_used is None or last_used >= time.time() - SESSION_DATASETS_IDLE_TTL_SECONDS:
+        return
+    if _dataset_in_use(dataset.digest):
+        return
+    columnar_store.remove(dataset.digest)
+
+
+# Parsed DataFrames keyed by file content hash, shared across uploads and turns
+dataset_cache = DatasetCache(
+    max_bytes=int(os.getenv("DATASET_CACHE_MAX_BYTES", str(2 * 1024**3))),
+    on_evict=_release_columnar_copy,
+)
+
+# Arrow copies of ingested uploads, memory-mapped on later loads
+columnar_store = ColumnarStore(
+    root_dir=os.getenv(
+        "COLUMNAR_STORE_DIR",
+        os.path.join(tempfile.gettempdir(), "sales_agent_datasets"),
+    )
+)
+# Bounds on the disk the columnar copies use; least recently loaded ones go first
+COLUMNAR_STORE_MAX_BYTES = int(os.getenv("COLUMNAR_STORE_MAX_BYTES", str(10 * 1024**3)))
+COLUMNAR_STORE_TTL_SECONDS = float(os.getenv("COLUMNAR_STORE_TTL_SECONDS", str(24 * 3600)))
+
+# Uploads too large to load into memory are kept here, one file per digest,
+# for as long as a session is working with them
+UPLOAD_DIR = os.path.abspath(
+    os.getenv("UPLOAD_DIR", os.path.join(tempfile.gettempdir(), "sales_agent_uploads"))
+)
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+# The file_path main.py hands the agent for a dataset it ingested from an upload
+UPLOAD_REFERENCE_PREFIX = "upload:"
+
+# Dataset ids are the SHA-256 of the uploaded bytes
+DATASET_ID_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+SESSION_DATASETS_IDLE_TTL_SECONDS = float(os.getenv("SESSION_DATASETS_IDLE_TTL_SECONDS", "1800"))
+
+
+def _release_upload(dataset: Dataset) -> None:
+    """Deletes a large upload's file once no session, in any worker, is using it."""
+    if not isinstance(dataset, ChunkedDataset):
+        return
+    if os.path.dirname(os.path.abspath(dataset.file_path)) != UPLOAD_DIR:
+        return
+    if _dataset_in_use(dataset.digest):
+        return
+    dataset_cache.discard(dataset.digest)
+    for path in (dataset.file_path, f"{dataset.file_path}.json"):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _release_dataset(dataset: Dataset) -> None:
+    """Deletes what is kept on disk for a dataset no session in this worker still uses."""
+    _release_upload(dataset)
+    _release_columnar_copy(dataset)
+
+
+# The dataset each (user_id, session_id) is working with, as loaded in this process
+session_datasets = SessionDatasetRegistry(
+    max_bytes=int(os.getenv("SESSION_DATASETS_MAX_BYTES", str(4 * 1024**3))),
+    idle_ttl_seconds=SESSION_DATASETS_IDLE_TTL_SECONDS,
+    on_release=_release_dataset,
+)
+
+# The same mapping by digest, shared by every worker process on the host, so a session
+# can move between workers (`uvicorn --workers N`) without losing its dataset
+dataset_directory = SessionDatasetDirectory(
+    db_path=os.getenv("SHARED_STATE_DB", os.path.join(UPLOAD_DIR, "shared_state.db")),
+    idle_ttl_seconds=SESSION_DATASETS_IDLE_TTL_SECONDS,
+)
+
+# Results of recent expressions, shared by execute_query and generate_visualization_data
+query_cache = QueryCache(
+    max_entries=int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "256")),
+    max_bytes=int(os.getenv("QUERY_CACHE_MAX_BYTES", str(256 * 1024**2))),
+)
+
+# Uploads at least this large are streamed in chunks instead of loaded into memory
+STREAMING_INGEST_MIN_BYTES = int(os.getenv("STREAMING_INGEST_MIN_BYTES", str(1024**3)))
+STREAMING_CHUNK_ROWS = int(os.getenv("STREAMING_CHUNK_ROWS", "200000"))
+STREAMING_SAMPLE_ROWS = int(os.getenv("STREAMING_SAMPLE_ROWS", "1000"))
+
+# Most data a query over workspace datasets may load, after filters and column selection
+WORKSPACE_MAX_LOAD_BYTES = int(os.getenv("WORKSPACE_MAX_LOAD_BYTES", str(1024**3)))
+
+# Upper bounds on what generate_visualization_data returns
+VISUALIZATION_MAX_POINTS = int(os.getenv("VISUALIZATION_MAX_POINTS", "1000"))
+VISUALIZATION_TOP_N = int(os.getenv("VISUALIZATION_TOP_N", "20"))
+
+NO_DATA_ERROR = {
+    "status": "error",
+    "error_message": "No data has been loaded. Please read a CSV file first.",
+}
+
+# Tools parse and query whole datasets, so they get longer than the shared default
+TOOL_TIMEOUT_SECONDS = 120
+
+
+def _tool_timed_out(timeout: float) -> dict[str, Any]:
+    return {
+        "status": "error",
+        "error_message": f"The operation timed out after {timeout:g} seconds. "
+        "Try a simpler query or a smaller subset of the data.",
+    }
+
+
+def _session_key(tool_context: ToolContext) -> SessionKey:
+    invocation_context = tool_context._invocation_context
+    return (invocation_context.user_id, invocation_context.session.id)
+
+
+def assign_session_dataset(key: SessionKey, dataset: Dataset) -> None:
+    """Makes `dataset` the one the session works with, in this worker and for the others."""
+    session_datasets.set(key, dataset)
+    dataset_directory.assign(key, dataset.digest)
+
+
+def _session_dataset(tool_context: ToolContext) -> Optional[Dataset]:
+    key = _session_key(tool_context)
+    entry = session_datasets.get(key)
+    digest = dataset_directory.lookup(key)
+    if entry is not None and (digest is None or entry.dataset.digest == digest):
+        return entry.dataset
+    # The session was last served by another worker, which may have switched its dataset.
+    dataset = find_dataset(digest) if digest is not None else None
+    if dataset is None:
+        return entry.dataset if entry is not None else None
+    session_datasets.set(key, dataset)
+    return dataset
+
+
+def _evaluate(dataset: Dataset, expression: str) -> Any:
+    if isinstance(dataset, ChunkedDataset):
+        return evaluate_out_of_core(dataset, expression, chunk_rows=STREAMING_CHUNK_ROWS)
+    return evaluate(expression, dataset.dataframe)
+
+
+def add_to_workspace(key: SessionKey, name: str, dataset: Dataset) -> None:
+    """Lets the session's expressions refer to `dataset` by `name`, in every worker."""
+    dataset_directory.add_to_workspace(key, name, dataset.digest)
+
+
+def _session_data(tool_context: ToolContext) -> tuple[Optional[Dataset], dict[str, str]]:
+    """Returns the session's `df` and its workspace, as dataset digests by name."""
+    workspace = dataset_directory.workspace(_session_key(tool_context))
+    return _session_dataset(tool_context), workspace
+
+
+def _expression_datasets(
+    expression: str, dataset: Optional[Dataset], workspace: dict[str, str]
+) -> dict[str, str]:
+    """
+    Returns the digests, by name, of the workspace datasets an expression refers to
+    (with `df`'s, if it uses `df` too), or nothing if it only uses `df`.
+    Raises ValueError if there is no data for it to use.
+    """
+    names = referenced_datasets(expression, workspace) if workspace else set()
+    if not names:
+        if dataset is None:
+            raise ValueError(NO_DATA_ERROR["error_message"])
+        return {}
+    digests = {name: workspace[name] for name in names}
+    if dataset is not None and referenced_datasets(expression, ["df"]):
+        digests["df"] = dataset.digest
+    return digests
+
+
+def _query_target(
+    dataset: Optional[Dataset], digests: dict[str, str]
+) -> tuple[str, Callable[[str], Any]]:
+    """The query cache fingerprint and evaluation function for an expression."""
+    if not digests:
+        return dataset.digest, lambda base: _evaluate(dataset, base)
+    return _workspace_digest(digests), lambda base: _evaluate_workspace(digests, base)
+
+
+def _evaluate_batch(
+    dataset: Optional[Dataset], digests: list[dict[str, str]], bases: list[str]
+) -> list[Any]:
+    """
+    Evaluates several base expressions, each with the workspace datasets it uses,
+    sharing the work between them: aggregations over a streamed `df` are computed in
+    one pass over its file, and each workspace dataset is loaded once for all the
+    expressions that use it. Returns each result, or the exception it raised.
+    """
+    results: list[Any] = [None] * len(bases)
+    on_df = [i for i, used in enumerate(digests) if not used]
+    on_workspace = [i for i, used in enumerate(digests) if used]
+    if on_df:
+        if isinstance(dataset, ChunkedDataset):
+            values = evaluate_out_of_core_batch(
+                dataset, [bases[i] for i in on_df], chunk_rows=STREAMING_CHUNK_ROWS
+            )
+        else:
+            values = [_capture(evaluate, bases[i], dataset.dataframe) for i in on_df]
+        for i, value in zip(on_df, values):
+            results[i] = value
+    if on_workspace:
+        union = {name: digest for i in on_workspace for name, digest in digests[i].items()}
+        values = _evaluate_workspace_batch(union, [bases[i] for i in on_workspace])
+        for i, value in zip(on_workspace, values):
+            results[i] = value
+    return results
+
+
+def _capture(func: Callable[..., Any], *args: Any) -> Any:
+    try:
+        return func(*args)
+    except Exception as e:
+        return e
+
+
+def _workspace_digest(digests: dict[str, str]) -> str:
+    """Fingerprint of the datasets a workspace query runs against, for the query cache."""
+    return hashlib.sha256(
+        "\n".join(f"{name}={digest}" for name, digest in sorted(digests.items())).encode()
+    ).hexdigest()
+
+
+def _evaluate_workspace(digests: dict[str, str], expression: str) -> Any:
+    """
+    Evaluates an expression over several datasets. Each is loaded when the expression
+    first refers to it, with only the columns and rows the expression needs; see
+    workspace.plan_query.
+    """
+    plan = plan_query(expression, {name: _dataset_schema(digest) for name, digest in digests.items()})
+    frames = {name: _scan(digests[name], scan) for name, scan in plan.scans.items()}
+    return evaluate(plan.expression, frames.get("df"), frames)
+
+
+def _evaluate_workspace_batch(digests: dict[str, str], expressions: list[str]) -> list[Any]:
+    """
+    Evaluates several expressions over workspace datasets, loading each dataset
+    once with the columns and rows all of them need. Returns each result, or the
+    exception it raised.
+    """
+    try:
+        # Planned as one tuple, so every dataset gets a single scan covering all uses.
+        combined = "(" + "".join(f"({expression}),\n" for expression in expressions) + ")"
+        plan = plan_query(combined, {name: _dataset_schema(digest) for name, digest in digests.items()})
+        frames = {name: _scan(digests[name], scan) for name, scan in plan.scans.items()}
+    except Exception:
+        # Let each expression report its own error.
+        return [
+            _capture(
+                _evaluate_workspace,
+                {name: digests[name] for name in referenced_datasets(expression, digests)},
+                expression,
+            )
+            for expression in expressions
+        ]
+    planned = ast.parse(plan.expression, mode="eval").body.elts
+    return [_capture(evaluate, ast.unparse(node), frames.get("df"), frames) for node in planned]
+
+
+def _dataset_schema(digest: str) -> dict[str, str]:
+    cached = dataset_cache.get(digest)
+    if cached is not None:
+        return cached.schema
+    if columnar_store.has(digest):
+        return columnar_store.read_metadata(digest)["schema"]
+    dataset = find_dataset(digest)
+    if dataset is None:
+        raise ValueError("A dataset in this session is no longer available. Please upload it again.")
+    return dataset.schema
+
+
+def _scan(digest: str, scan: Scan) -> pd.DataFrame:
+    """
+    Loads part of a dataset: filtered in memory if it is resident, from the
+    memory-mapped columnar store if it has a copy, and otherwise by streaming the file.
+    """
+    cached = dataset_cache.get(digest)
+    if isinstance(cached, CachedDataset):
+        return scan_frame(cached.dataframe, scan)
+    if columnar_store.has(digest):
+        return scan_table(columnar_store.table(digest), scan, WORKSPACE_MAX_LOAD_BYTES)
+    dataset = cached or find_dataset(digest)
+    if dataset is None:
+        raise ValueError("A dataset in this session is no longer available. Please upload it again.")
+    return scan_chunked(dataset, scan, STREAMING_CHUNK_ROWS, WORKSPACE_MAX_LOAD_BYTES)
+
+
+def ingest_upload(stream: BinaryIO) -> Dataset:
+    """
+    Ingests an uploaded CSV straight from its spooled stream and returns the dataset.
 
+    Uploads below STREAMING_INGEST_MIN_BYTES are hashed in one pass and, unless the
+    same bytes were ingested before, parsed directly from the stream; nothing is
+    written to a temporary file. Larger uploads are re-read by every out-of-core
+    query, so they are copied into UPLOAD_DIR in the same pass that hashes them,
+    and that copy is deleted once no session is using it.
 
-def read_csv_and_get_schema(file_path: str, encoding: str = "utf-8") -> dict[str, Any]:
+    Raises:
+        ValueError: If the upload cannot be decoded or parsed as a CSV.
     """
-    Reads a CSV file from the given path, stores it in-memory, and returns the schema.
-    It will try to read with 'utf-8' and then 'latin1' if the first fails.
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+
+    if size < STREAMING_INGEST_MIN_BYTES:
+        digest = hash_stream(stream)
+        cached = dataset_cache.get(digest)
+        if cached is not None:
+            return cached
+        stream.seek(0)
+        return _load_dataset(digest, stream, size)
+
+    _sweep_uploads()
+    fd, tmp_path = tempfile.mkstemp(dir=UPLOAD_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            digest = hash_stream(stream, sink=tmp)
+        # Also finds a copy another worker already ingested.
+        cached = find_dataset(digest)
+        if cached is not None:
+            return cached
+        file_path = os.path.join(UPLOAD_DIR, f"{digest}.csv")
+        os.replace(tmp_path, file_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    dataset_cache.remember_digest(file_path, digest)
+    try:
+        dataset = _load_dataset(digest, file_path, size)
+    except Exception:
+        os.remove(file_path)
+        raise
+    if not isinstance(dataset, ChunkedDataset):
+        # Served from the columnar store, so the copy is not needed.
+        os.remove(file_path)
+    return dataset
+
+
+# Parsing is memory-hungry, so only a couple of uploads are ingested at once.
+@offload(max_concurrency=2, timeout_seconds=TOOL_TIMEOUT_SECONDS, timeout_result=_tool_timed_out)
+def read_csv_and_get_schema(
+    file_path: str,
+    tool_context: ToolContext,
+    encoding: Optional[str] = None,
+    name: Optional[str] = None,
+) -> dict[str, Any]:
+    """
+    Reads a CSV file from the given path, stores it in-memory for the current session, and returns the schema.
+    The file becomes `df` and is also added to the session's workspace under `name`, so later
+    queries can refer to it, and join it with other files, by that name.
+    The encoding is detected from a prefix of the file unless one is given.
+    Files whose content has already been parsed are served from the dataset cache or,
+    after a restart, memory-mapped from the columnar store instead of being re-parsed.
+    Files larger than STREAMING_INGEST_MIN_BYTES are streamed in chunks and never fully loaded;
+    their schema is inferred from a sample and only aggregations can be queried.
+    The response also profiles each column (null and distinct counts, min/max and most
+    common values) and includes a few sample rows, computed once when the file is ingested.
 
     Args:
-        file_path (str): The temporary path to the CSV file.
-        encoding (str): The encoding of the file. Defaults to 'utf-8'.
+        file_path (str): The temporary path to the CSV file, or the `upload:<id>` reference
+                         given for an uploaded file.
+        tool_context (ToolContext): Injected by ADK; identifies the calling session.
+        encoding (Optional[str]): The encoding of the file. Detected when not given.
+        name (Optional[str]): The name to refer to the dataset by in expressions.
+                              Defaults to the file name without its extension.
 
     Returns:
-        Dict[str, Any]: A dictionary containing the status and the schema (column names and dtypes) or an error message.
+        Dict[str, Any]: A dictionary containing the status, the schema (column names and dtypes),
+                        the column profile, the dataset's name and the names of every dataset
+                        in the workspace, or an error message.
     """
-    try:
-        # Try to read with the specified encoding, default to utf-8
-        df = pd.read_csv(file_path, encoding=encoding)
-    except UnicodeDecodeError:
-        try:
-            # If default fails, try latin1 as a common fallback
-            df = pd.read_csv(file_path, encoding="latin1")
-        except Exception as e:
+    if file_path.startswith(UPLOAD_REFERENCE_PREFIX):
+        dataset = _uploaded_dataset(file_path[len(UPLOAD_REFERENCE_PREFIX):], tool_context)
+        if dataset is None:
             return {
                 "status": "error",
-                "error_message": f"Failed to read CSV with both 'utf-8' and 'latin1' encodings. Error: {e}",
+                "error_message": "The uploaded file is no longer available. Please upload it again.",
             }
+        return _read_dataset(tool_context, dataset, name, default_name="data")
+
+    try:
+        digest = dataset_cache.digest_file(file_path)
     except FileNotFoundError:
         return {"status": "error", "error_message": f"File not found at: {file_path}"}
+
+    cached = dataset_cache.get(digest)
+    if cached is not None:
+        return _read_dataset(tool_context, cached, name, default_name=file_path)
+
+    try:
+        dataset = _load_dataset(digest, file_path, os.path.getsize(file_path), encoding)
+    except UnicodeDecodeError as e:
+        return {
+            "status": "error",
+            "error_message": f"Failed to decode the CSV. Error: {e}",
+        }
     except Exception as e:
         return {
             "status": "error",
             "error_message": f"An error occurred while reading the CSV: {e}",
         }
 
-    data_store["dataframe"] = df
-    schema = {col: str(dtype) for col, dtype in df.dtypes.items()}
-    return {"status": "success", "schema": schema, "num_rows": len(df)}
+    return _read_dataset(tool_context, dataset, name, default_name=file_path)
+
+
+def _read_dataset(
+    tool_context: ToolContext, dataset: Dataset, name: Optional[str], default_name: str
+) -> dict[str, Any]:
+    key = _session_key(tool_context)
+    if name is None:
+        # Keep the name the dataset already has in this session, if any.
+        workspace = dataset_directory.workspace(key)
+        name = next((n for n, digest in workspace.items() if digest == dataset.digest), None)
+    name = dataset_name(name or default_name)
+    assign_session_dataset(key, dataset)
+    add_to_workspace(key, name, dataset)
+    response = _schema_response(dataset)
+    response["name"] = name
+    response["workspace"] = sorted(dataset_directory.workspace(key))
+    return response
+
+
+def find_dataset(dataset_id: str) -> Optional[Dataset]:
+    """
+    Returns a previously ingested dataset by id, from the dataset cache, the
+    columnar store or a large upload kept in UPLOAD_DIR (possibly ingested by
+    another worker), or None if it is no longer available.
+    """
+    if not DATASET_ID_PATTERN.fullmatch(dataset_id):
+        return None
+    cached = dataset_cache.get(dataset_id)
+    if cached is not None:
+        return cached
+    if columnar_store.has(dataset_id):
+        return _load_dataset(dataset_id, None, 0)
+    chunked = open_chunked(
+        os.path.join(UPLOAD_DIR, f"{dataset_id}.csv"), dataset_id, STREAMING_SAMPLE_ROWS
+    )
+    if chunked is not None:
+        dataset_cache.put_entry(chunked)
+    return chunked
+
+
+def _sweep_uploads() -> None:
+    """
+    Deletes large uploads no session has used within the idle TTL. Normally a file is
+    deleted when its last session lets go of it; this catches files whose sessions
+    were dropped by a worker that has since exited.
+    """
+    dataset_directory.sweep()
+    cutoff = time.time() - SESSION_DATASETS_IDLE_TTL_SECONDS
+    for name in os.listdir(UPLOAD_DIR):
+        digest, ext = os.path.splitext(name)
+        if ext != ".csv" or not DATASET_ID_PATTERN.fullmatch(digest):
+            continue
+        path = os.path.join(UPLOAD_DIR, name)
+        try:
+            if os.path.getmtime(path) >= cutoff:
+                continue
+        except FileNotFoundError:
+            continue
+        if not _dataset_in_use(digest):
+            dataset_cache.discard(digest)
+            for stale in (path, f"{path}.json"):
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    pass
+
+
+def _uploaded_dataset(digest: str, tool_context: ToolContext) -> Optional[Dataset]:
+    current = _session_dataset(tool_context)
+    if current is not None and current.digest == digest:
+        return current
+    return find_dataset(digest)
 
 
-def execute_query(expression: str) -> dict[str, Any]:
+def _load_dataset(
+    digest: str,
+    source: Union[str, BinaryIO, None],
+    size: int,
+    encoding: Optional[str] = None,
+) -> Dataset:
     """
-    Executes a pandas expression on the in-memory DataFrame using eval().
+    Loads a dataset that is not in the dataset cache and caches it.
+
+    `source` is the CSV's path or a binary stream positioned at its start; it is not
+    read when the columnar store already has the dataset. Only a path can be ingested
+    in chunks, since ChunkedDataset re-reads the file for every query.
+    Parsed DataFrames are compacted (Arrow-backed strings, parsed dates) before they are
+    profiled and stored, so the columnar copy is compact too.
+    """
+    if not columnar_store.has(digest) and size >= STREAMING_INGEST_MIN_BYTES:
+        chunked = ingest_chunked(
+            source,
+            digest,
+            encoding=encoding or sniff_encoding(source),
+            chunk_rows=STREAMING_CHUNK_ROWS,
+            sample_rows=STREAMING_SAMPLE_ROWS,
+        )
+        if os.path.dirname(os.path.abspath(source)) == UPLOAD_DIR:
+            save_manifest(chunked)
+        dataset_cache.put_entry(chunked)
+        return chunked
+
+    if columnar_store.has(digest):
+        df = columnar_store.load(digest)
+        metadata = columnar_store.read_metadata(digest)
+        # Sidecars written before profiling existed have no profile.
+        profile = metadata.get("profile") or profile_dataframe(df)
+        compaction = metadata.get("compaction")
+        if not is_current(compaction):
+            # Stored before compaction existed, or by a version that narrowed numbers or
+            # made categoricals: compact it now and store it again, so scans of the
+            # columnar copy agree.
+            compaction = compact_dataframe(df)
+            columnar_store.write(
+                digest, df, encoding=metadata.get("encoding"), profile=profile, compaction=compaction
+            )
+    else:
+        if encoding is None:
+            encoding = sniff_encoding(source) if isinstance(source, str) else sniff_stream_encoding(source)
+        df, encoding = _parse_csv(source, encoding)
+        compaction = compact_dataframe(df)
+        logger.info(
+            f"Compacted dataset {digest[:12]} from {compaction['bytes_before'] / 1024**2:.1f} MB "
+            f"to {compaction['bytes_after'] / 1024**2:.1f} MB"
+        )
+        profile = profile_dataframe(df)
+        columnar_store.sweep(COLUMNAR_STORE_MAX_BYTES, COLUMNAR_STORE_TTL_SECONDS, _dataset_in_use)
+        columnar_store.write(digest, df, encoding=encoding, profile=profile, compaction=compaction)
+    return dataset_cache.put(digest, df, profile, compaction)
+
+
+def _schema_response(dataset: Dataset) -> dict[str, Any]:
+    response = {"status": "success", "schema": dataset.schema, "num_rows": dataset.num_rows}
+    if dataset.profile:
+        response["profile"] = dataset.profile
+    if isinstance(dataset, ChunkedDataset):
+        response["streaming"] = True
+        response["note"] = (
+            "This file is too large to load into memory. The schema is inferred from a sample; "
+            "queries must be groupby/column aggregations (sum, count, mean, min, max, size), "
+            "len(df), df.shape, df.columns, df.dtypes or df.head(n)."
+        )
+    return response
+
+
+def _parse_csv(source: Union[str, BinaryIO], encoding: str) -> tuple[pd.DataFrame, str]:
+    start = None if isinstance(source, str) else source.tell()
+    try:
+        return pd.read_csv(source, encoding=encoding), encoding
+    except UnicodeDecodeError:
+        if encoding == "latin1":
+            raise
+        # The sniffed prefix was valid UTF-8 but a later byte was not.
+        if start is not None:
+            source.seek(start)
+        return pd.read_csv(source, encoding="latin1"), "latin1"
+
+
+@offload(max_concurrency=4, timeout_seconds=TOOL_TIMEOUT_SECONDS, timeout_result=_tool_timed_out)
+def execute_query(
+    expression: str, tool_context: ToolContext, expressions: Optional[list[str]] = None
+) -> dict[str, Any]:
+    """
+    Executes a pandas expression on the session's in-memory DataFrame.
+    Expressions are validated against a whitelist of pandas operations before they run.
+    To answer several questions about the data, pass the rest as `expressions` instead of
+    calling this tool again: they are evaluated together, sharing one pass over the data.
 
     Args:
         expression (str): A string containing a pandas expression to execute.
-                          The DataFrame is available as the variable 'df'.
+                          The DataFrame is available as the variable 'df', and every dataset
+                          in the session's workspace by its name.
                           Example: "df[df['Sales'] > 100].to_json(orient='records')"
+                          Example: "orders.merge(customers, on='customer_id').groupby('segment')['amount'].sum()"
+        tool_context (ToolContext): Injected by ADK; identifies the calling session.
+        expressions (Optional[list[str]]): More expressions to evaluate in the same call.
+                          Example: ["df['Sales'].sum()", "df.groupby('Region')['Sales'].mean()"]
 
     Returns:
         Dict[str, Any]: A dictionary containing the status and the query result (as a JSON string) or an error message.
+                        With `expressions`, `results` holds one such dictionary per expression,
+                        starting with `expression`.
     """
-    df = data_store.get("dataframe")
-    if df is None:
-        return {
-            "status": "error",
-            "error_message": "No data has been loaded. Please read a CSV file first.",
-        }
-
     try:
-        # Use eval to execute the expression. The dataframe is available as 'df'.
-        result = eval(expression, {"pd": pd, "df": df})
+        dataset, workspace = _session_data(tool_context)
+        if dataset is None and not workspace:
+            return dict(NO_DATA_ERROR)
+        if expressions:
+            return {
+                "status": "success",
+                "results": _execute_queries([expression, *expressions], dataset, workspace),
+            }
 
-        # If the result is a DataFrame or Series, convert it to JSON.
-        if isinstance(result, (pd.DataFrame, pd.Series)):
-            result_json = result.to_json(orient="records")
-        else:
-            # Otherwise, assume the expression already produced a serializable result (e.g., a JSON string).
-            result_json = result
+        digests = _expression_datasets(expression, dataset, workspace)
+        check_expression(expression, digests)
+
+        # Evaluate the expression, or reuse the result of an identical earlier one.
+        # DataFrame and Series results are converted to JSON; anything else is
+        # assumed to be serializable already (e.g., a JSON string).
+        digest, compute = _query_target(dataset, digests)
+        result_json = query_cache.evaluate(
+            digest,
+            expression,
+            compute,
+            default_serializer="_result.to_json(orient='records')",
+        )
 
         return {"status": "success", "result": result_json}
     except Exception as e:
@@ -85,8 +677,48 @@ def execute_query(expression: str) -> dict[str, Any]:
         }
 
 
+def _execute_queries(
+    expressions: list[str], dataset: Optional[Dataset], workspace: dict[str, str]
+) -> list[dict[str, Any]]:
+    """
+    Evaluates the expressions of a batched execute_query call. Results already in the
+    query cache are reused; the rest are computed together by _evaluate_batch.
+    """
+    outcomes: list[Any] = [None] * len(expressions)
+    queries = []
+    used_by_base: dict[str, dict[str, str]] = {}
+    for i, expression in enumerate(expressions):
+        try:
+            digests = _expression_datasets(expression, dataset, workspace)
+            check_expression(expression, digests)
+            used_by_base[split_expression(expression)[0]] = digests
+            queries.append((i, expression, _query_target(dataset, digests)[0]))
+        except Exception as e:
+            outcomes[i] = e
+
+    values = query_cache.evaluate_many(
+        [(digest, expression) for _, expression, digest in queries],
+        lambda bases: _evaluate_batch(dataset, [used_by_base[base] for base in bases], bases),
+        default_serializer="_result.to_json(orient='records')",
+    )
+    for (i, _, _), value in zip(queries, values):
+        outcomes[i] = value
+    return [
+        {
+            "status": "error",
+            "error_message": f"An error occurred while executing the query: {outcome}",
+        }
+        if isinstance(outcome, Exception)
+        else {"status": "success", "result": outcome}
+        for outcome in outcomes
+    ]
+
+
+@offload(max_concurrency=4, timeout_seconds=TOOL_TIMEOUT_SECONDS, timeout_result=_tool_timed_out)
 def generate_visualization_data(
-    chart_type: Literal["bar", "pie", "scatter"], pandas_expression: str
+    chart_type: Literal["bar", "pie", "scatter"],
+    pandas_expression: str,
+    tool_context: ToolContext,
 ) -> Dict[str, Any]:
     """
     Generates data suitable for D3.js visualization based on a pandas expression.
@@ -95,28 +727,33 @@ def generate_visualization_data(
         chart_type (Literal["bar", "pie", "scatter"]): The type of chart to generate.
         pandas_expression (str): The pandas expression to execute to get the data.
                                  Example: "df.groupby('Category')['Sales'].sum().reset_index().to_dict('records')"
+        tool_context (ToolContext): Injected by ADK; identifies the calling session.
 
     Returns:
-        Dict[str, Any]: A dictionary containing the chart type and the data, or an error message.
+        Dict[str, Any]: A dictionary containing the chart type, the data as one list per column,
+                        and metadata reporting the original row count and any downsampling,
+                        or an error message.
     """
-    df = data_store.get("dataframe")
-    if df is None:
-        return {
-            "status": "error",
-            "error_message": "No data has been loaded. Please read a CSV file first.",
-        }
-
     try:
-        # Execute the expression to get the data
-        data = eval(pandas_expression, {"pd": pd, "df": df})
+        dataset, workspace = _session_data(tool_context)
+        if dataset is None and not workspace:
+            return dict(NO_DATA_ERROR)
+        digests = _expression_datasets(pandas_expression, dataset, workspace)
+        check_expression(pandas_expression, digests)
 
-        # Ensure data is in a suitable format (list of dicts)
-        if isinstance(data, (pd.DataFrame, pd.Series)):
-            data = data.to_dict("records")
+        # Execute the expression to get the data, reusing a result already computed
+        # for execute_query, then cap and downsample it into columnar arrays
+        digest, compute = _query_target(dataset, digests)
+        data = query_cache.result(digest, pandas_expression, compute)
 
         return {
             "status": "success",
-            "visualization": {"chart_type": chart_type, "data": data},
+            "visualization": build_payload(
+                chart_type,
+                data,
+                max_points=VISUALIZATION_MAX_POINTS,
+                top_n=VISUALIZATION_TOP_N,
+            ),
         }
     except Exception as e:
         return {
@@ -132,8 +769,20 @@ root_agent = Agent(
     instruction=(
         "You are an agent that analyzes data from a CSV file. "
         "1. For EVERY query Call the `read_csv_and_get_schema` tool first to determine the schema and number of rows. "
+        "   The result also profiles every column (null and distinct counts, min/max, most common values) "
+        "   and includes sample rows; use it instead of running exploratory queries such as "
+        "   df.head(), unique() or describe(). "
+        "   When several files are given, call it once for each; every file is kept in the session's "
+        "   workspace under the name the tool returns. "
         "2. Based on the user's question and the schema, formulate a valid pandas expression to execute. "
         "   The dataframe is available in a variable named `df`. The expression MUST be a valid, executable pandas operation. "
+        "   Every dataset in the workspace is also available by its name, e.g. "
+        "   `orders.merge(customers, on='customer_id').groupby('segment')['amount'].sum()` to answer a question "
+        "   across files. Filter rows with `name[name['col'] == value]` and select the needed columns before joining, "
+        "   so only that part of each file is loaded. "
+        "   When answering needs several independent queries, send them in one `execute_query` call, "
+        "   the first as `expression` and the rest as `expressions`, or request several tool calls at once; "
+        "   they are evaluated together. "
         "   For example, for a bar chart of sales by category, the expression might be: "
         "   `df.groupby('Category')['Sales'].sum().reset_index().to_dict('records')` "
         "3. If the user asks for a visualization or a chart, use the `generate_visualization_data` tool. "
@@ -0,0 +1,430 @@
+import ast
+import json
+import os
+from typing import Any, Iterator, Optional, Sequence
+
+import pandas as pd
+
+from dataset_cache import ChunkedDataset
+from expression_engine import SAFE_BUILTINS, check_expression, evaluate
+from profiling import DatasetProfiler
+from workspace import Scan, check_load_size
+
+# Aggregations that can be computed per chunk and then combined.
+SUPPORTED_AGGREGATIONS = ("sum", "count", "mean", "min", "max", "size")
+
+# Methods on `df` that only need the resident sample, not the full file.
+SAMPLE_METHODS = ("head",)
+SAMPLE_ATTRIBUTES = ("columns", "dtypes")
+
+# How per-chunk partial results of each aggregation are merged.
+_COMBINERS = {"sum": "sum", "count": "sum", "min": "min", "max": "max"}
+
+
+class OutOfCoreUnsupported(ValueError):
+    """Raised when an expression cannot be answered without loading the whole file."""
+
+
+def ingest_chunked(
+    file_path: str,
+    digest: str,
+    encoding: str,
+    chunk_rows: int,
+    sample_rows: int,
+) -> ChunkedDataset:
+    """
+    Streams through a CSV once, keeping only a sample of rows, a running row count
+    and the column profile.
+
+    Args:
+        file_path (str): Path to the CSV. It must stay on disk while the dataset is in use.
+        digest (str): The content hash of the file.
+        encoding (str): The encoding to read the file with.
+        chunk_rows (int): Rows parsed per chunk; bounds peak memory.
+        sample_rows (int): Rows kept resident to infer the schema and answer `df.head()`.
+    """
+    sample: Optional[pd.DataFrame] = None
+    num_rows = 0
+    profiler = DatasetProfiler()
+    for chunk in pd.read_csv(file_path, encoding=encoding, chunksize=chunk_rows):
+        if sample is None:
+            sample = chunk.head(sample_rows).copy()
+        num_rows += len(chunk)
+        profiler.update(chunk)
+    if sample is None:
+        sample = pd.read_csv(file_path, encoding=encoding, nrows=0)
+
+    return ChunkedDataset(
+        digest=digest,
+        file_path=file_path,
+        encoding=encoding,
+        sample=sample,
+        schema={col: str(dtype) for col, dtype in sample.dtypes.items()},
+        num_rows=num_rows,
+        nbytes=int(sample.memory_usage(deep=True).sum()),
+        profile=profiler.result(),
+    )
+
+
+def save_manifest(dataset: ChunkedDataset) -> None:
+    """
+    Records what ingest_chunked learned about a file next to it, as `<file>.json`, so
+    other worker processes can open the dataset with open_chunked instead of
+    streaming through the file again.
+    """
+    manifest = {
+        "digest": dataset.digest,
+        "encoding": dataset.encoding,
+        "schema": dataset.schema,
+        "num_rows": dataset.num_rows,
+        "profile": dataset.profile,
+    }
+    tmp_path = f"{dataset.file_path}.json.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, f"{dataset.file_path}.json")
+
+
+def open_chunked(file_path: str, digest: str, sample_rows: int) -> Optional[ChunkedDataset]:
+    """
+    Opens a file ingested by another process from its manifest, reading only the
+    sample. Returns None if the file or its manifest is missing.
+    """
+    try:
+        with open(f"{file_path}.json", "r") as f:
+            manifest = json.load(f)
+        sample = pd.read_csv(file_path, encoding=manifest["encoding"], nrows=sample_rows)
+    except FileNotFoundError:
+        return None
+    if manifest["digest"] != digest:
+        return None
+    try:
+        # Keep the dtypes inferred from the first chunk, which the schema reports.
+        sample = sample.astype(manifest["schema"])
+    except (TypeError, ValueError):
+        pass
+    return ChunkedDataset(
+        digest=digest,
+        file_path=file_path,
+        encoding=manifest["encoding"],
+        sample=sample,
+        schema=manifest["schema"],
+        num_rows=manifest["num_rows"],
+        nbytes=int(sample.memory_usage(deep=True).sum()),
+        profile=manifest["profile"],
+    )
+
+
+def evaluate_out_of_core(dataset: ChunkedDataset, expression: str, chunk_rows: int) -> Any:
+    """
+    Evaluates a pandas expression against a ChunkedDataset without loading it.
+
+    Every use of `df` in the expression must be one of:
+      - `df.groupby(keys)[col_or_cols].<agg>()` or `df.groupby(keys).size()`
+      - `df[col_or_cols].<agg>()`
+      - `len(df)`, `df.shape`, `df.columns`, `df.dtypes` or `df.head(n)`
+    where <agg> is one of SUPPORTED_AGGREGATIONS (or `.agg('<name>')`). Each of these
+    is computed by streaming the file, and whatever the expression does with the
+    (small) results, e.g. `.reset_index()` or `.to_dict('records')`, is evaluated normally.
+
+    Raises:
+        UnsafeExpressionError: If the expression fails validation.
+        OutOfCoreUnsupported: If some use of `df` does not fit these forms.
+    """
+    (result,) = evaluate_out_of_core_batch(dataset, [expression], chunk_rows)
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+def evaluate_out_of_core_batch(
+    dataset: ChunkedDataset, expressions: Sequence[str], chunk_rows: int
+) -> list[Any]:
+    """
+    Evaluates several expressions like evaluate_out_of_core, computing the
+    aggregations of all of them in a single streaming pass over the file.
+
+    Returns one item per expression: its result, or the exception evaluating it
+    raised, so one unsupported expression does not fail the others.
+    """
+    substitution = _Substitution(dataset)
+    trees: list[Any] = []
+    for expression in expressions:
+        try:
+            check_expression(expression)
+            tree = ast.parse(expression.strip(), mode="eval")
+            tree = ast.fix_missing_locations(substitution.visit(tree))
+            if any(isinstance(node, ast.Name) and node.id == "df" for node in ast.walk(tree)):
+                raise OutOfCoreUnsupported(
+                    "This dataset is too large to load into memory. Use groupby/column "
+                    f"aggregations ({', '.join(SUPPORTED_AGGREGATIONS)}), len(df), df.shape, "
+                    "df.columns, df.dtypes or df.head(n)."
+                )
+            trees.append(tree)
+        except Exception as e:
+            trees.append(e)
+
+    try:
+        substitution.compute(chunk_rows)
+    except Exception as e:
+        return [tree if isinstance(tree, Exception) else e for tree in trees]
+
+    results = []
+    for tree in trees:
+        if isinstance(tree, Exception):
+            results.append(tree)
+            continue
+        try:
+            results.append(eval(
+                compile(tree, "<out-of-core>", "eval"),
+                {"__builtins__": SAFE_BUILTINS, "pd": pd, **substitution.values},
+            ))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+def scan_chunked(dataset: ChunkedDataset, scan: Scan, chunk_rows: int, max_bytes: int) -> pd.DataFrame:
+    """
+    Loads only the columns and rows a scan selects from a ChunkedDataset, filtering
+    each chunk as it is read. Rows keep their position in the file as their label.
+
+    Raises:
+        MemoryError: If what is kept grows larger than `max_bytes`.
+    """
+    columns = scan.columns if scan.columns is not None else list(dataset.schema)
+    parts = []
+    nbytes = 0
+    for chunk in _read_chunks(dataset, list(dict.fromkeys([*columns, *scan.filter_columns])), chunk_rows):
+        if scan.row_filter is not None:
+            chunk = chunk.loc[evaluate(scan.row_filter, chunk)]
+        chunk = chunk[columns]
+        nbytes += int(chunk.memory_usage(deep=True).sum())
+        check_load_size(nbytes, max_bytes)
+        parts.append(chunk)
+    if not parts:
+        return dataset.sample.head(0)[columns]
+    return pd.concat(parts) if len(parts) > 1 else parts[0]
+
+
+class _Substitution(ast.NodeTransformer):
+    """
+    Replaces each supported use of `df` with a name bound to its value. Aggregations
+    are only collected while visiting; compute() then streams the file once for all
+    of them, however many expressions were visited.
+    """
+
+    def __init__(self, dataset: ChunkedDataset):
+        self.dataset = dataset
+        self.values: dict[str, Any] = {}
+        # aggregation spec -> (bound name, accumulator)
+        self.aggregations: dict[tuple, tuple[str, _Aggregation]] = {}
+
+    def _bind(self, value: Any) -> ast.Name:
+        name = f"_ooc_{len(self.values) + len(self.aggregations)}"
+        self.values[name] = value
+        return ast.Name(id=name, ctx=ast.Load())
+
+    def _bind_aggregation(
+        self, keys: list[str], columns: Optional[list[str]], columns_is_list: bool, agg: str
+    ) -> ast.Name:
+        if agg == "size" and not keys:
+            return self._bind(self.dataset.num_rows)
+        aggregation = _Aggregation(keys, columns, columns_is_list, agg)
+        missing = [col for col in aggregation.usecols if col not in self.dataset.schema]
+        if missing:
+            raise KeyError(f"Columns not found: {missing}")
+        spec = (tuple(keys), tuple(columns) if columns is not None else None, columns_is_list, agg)
+        if spec not in self.aggregations:
+            name = f"_ooc_{len(self.values) + len(self.aggregations)}"
+            self.aggregations[spec] = (name, aggregation)
+        return ast.Name(id=self.aggregations[spec][0], ctx=ast.Load())
+
+    def compute(self, chunk_rows: int) -> None:
+        """Computes every collected aggregation with a single streaming pass over the file."""
+        pending = [agg for name, agg in self.aggregations.values() if name not in self.values]
+        if not pending:
+            return
+        usecols = list(dict.fromkeys(col for agg in pending for col in agg.usecols))
+        for chunk in _read_chunks(self.dataset, usecols, chunk_rows):
+            for aggregation in pending:
+                aggregation.update(chunk)
+        for name, aggregation in self.aggregations.values():
+            self.values[name] = aggregation.result(self.dataset)
+
+    def visit_Call(self, node: ast.Call) -> ast.AST:
+        aggregation = _match_aggregation(node)
+        if aggregation is not None:
+            return self._bind_aggregation(*aggregation)
+        if (
+            isinstance(node.func, ast.Name)
+            and node.func.id == "len"
+            and len(node.args) == 1
+            and _is_df(node.args[0])
+        ):
+            return self._bind(self.dataset.num_rows)
+        if (
+            isinstance(node.func, ast.Attribute)
+            and node.func.attr in SAMPLE_METHODS
+            and _is_df(node.func.value)
+        ):
+            node.func.value = self._bind(self.dataset.sample)
+            return self.generic_visit(node)
+        return self.generic_visit(node)
+
+    def visit_Attribute(self, node: ast.Attribute) -> ast.AST:
+        if _is_df(node.value):
+            if node.attr == "shape":
+                return self._bind((self.dataset.num_rows, len(self.dataset.schema)))
+            if node.attr in SAMPLE_ATTRIBUTES:
+                return self._bind(getattr(self.dataset.sample, node.attr))
+        return self.generic_visit(node)
+
+
+def _is_df(node: ast.AST) -> bool:
+    return isinstance(node, ast.Name) and node.id == "df"
+
+
+def _string_or_list(node: ast.AST) -> Optional[tuple[list[str], bool]]:
+    """Returns (names, is_list) for a string constant or a list of string constants."""
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return [node.value], False
+    if isinstance(node, ast.List) and all(
+        isinstance(elt, ast.Constant) and isinstance(elt.value, str) for elt in node.elts
+    ):
+        return [elt.value for elt in node.elts], True
+    return None
+
+
+def _match_aggregation(
+    node: ast.Call,
+) -> Optional[tuple[list[str], Optional[list[str]], bool, str]]:
+    """
+    Matches `df[.groupby(keys)][selection].<agg>()`.
+
+    Returns (keys, columns, columns_is_list, agg), with columns None when nothing
+    was selected (only valid for `.size()`), or None if the call does not match.
+    """
+    if not isinstance(node.func, ast.Attribute) or node.keywords:
+        return None
+    agg = node.func.attr
+    if agg == "agg":
+        if len(node.args) != 1 or not isinstance(node.args[0], ast.Constant):
+            return None
+        agg = node.args[0].value
+    elif node.args:
+        return None
+    if agg not in SUPPORTED_AGGREGATIONS:
+        return None
+
+    target = node.func.value
+    columns, columns_is_list = None, False
+    if isinstance(target, ast.Subscript):
+        selection = _string_or_list(target.slice)
+        if selection is None:
+            return None
+        columns, columns_is_list = selection
+        target = target.value
+
+    if _is_df(target):
+        keys: list[str] = []
+        if columns is None:
+            return None
+    elif (
+        isinstance(target, ast.Call)
+        and isinstance(target.func, ast.Attribute)
+        and target.func.attr == "groupby"
+        and _is_df(target.func.value)
+        and len(target.args) == 1
+        and not target.keywords
+    ):
+        grouping = _string_or_list(target.args[0])
+        if grouping is None:
+            return None
+        keys = grouping[0]
+        if columns is None and agg != "size":
+            return None
+    else:
+        return None
+    return keys, columns, columns_is_list, agg
+
+
+def _read_chunks(
+    dataset: ChunkedDataset, columns: Sequence[str], chunk_rows: int
+) -> Iterator[pd.DataFrame]:
+    missing = [col for col in columns if col not in dataset.schema]
+    if missing:
+        raise KeyError(f"Columns not found: {missing}")
+    yield from pd.read_csv(
+        dataset.file_path,
+        encoding=dataset.encoding,
+        usecols=list(columns),
+        chunksize=chunk_rows,
+    )
+
+
+class _Aggregation:
+    """One aggregation, accumulated over the chunks of a file."""
+
+    def __init__(
+        self, keys: list[str], columns: Optional[list[str]], columns_is_list: bool, agg: str
+    ):
+        self.keys = keys
+        self.columns = columns
+        self.columns_is_list = columns_is_list
+        self.agg = agg
+        # mean is carried as (sum, count) and divided once all chunks are combined.
+        self.partial_aggs = ["sum", "count"] if agg == "mean" else [agg]
+        self.totals: Any = None
+
+    @property
+    def usecols(self) -> list[str]:
+        if self.agg == "size":
+            # Group sizes do not depend on the selected columns.
+            return list(self.keys)
+        return list(dict.fromkeys(self.keys + self.columns))
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        keys, columns = self.keys, self.columns
+        if self.agg == "size":
+            part = chunk.groupby(keys).size()
+            self.totals = part if self.totals is None else self.totals.add(part, fill_value=0).astype("int64")
+            return
+        if keys:
+            grouped = chunk.groupby(keys)[columns]
+            part = {a: grouped.agg(a) for a in self.partial_aggs}
+        else:
+            part = {a: chunk[columns].agg(a).to_frame().T for a in self.partial_aggs}
+        if self.totals is None:
+            self.totals = part
+        else:
+            self.totals = {a: _combine(self.totals[a], part[a], keys, a) for a in self.partial_aggs}
+
+    def result(self, dataset: ChunkedDataset) -> Any:
+        keys, columns, agg = self.keys, self.columns, self.agg
+        if agg == "size":
+            sizes = self.totals if self.totals is not None else dataset.sample.head(0).groupby(keys).size()
+            if columns is not None and not self.columns_is_list:
+                sizes.name = columns[0]
+            return sizes
+
+        if self.totals is None:
+            empty = dataset.sample.head(0)
+            result = (empty.groupby(keys)[columns] if keys else empty[columns]).agg(agg)
+            return result if self.columns_is_list else result[columns[0]]
+
+        if agg == "mean":
+            result = self.totals["sum"] / self.totals["count"]
+        else:
+            result = self.totals[agg]
+        if not keys:
+            result = result.iloc[0]
+        return result if self.columns_is_list else result[columns[0]]
+
+
+def _combine(total: pd.DataFrame, part: pd.DataFrame, keys: list[str], agg: str) -> pd.DataFrame:
+    """Merges the running result of one partial aggregation with the next chunk's."""
+    stacked = pd.concat([total, part])
+    if keys:
+        return getattr(stacked.groupby(level=list(range(len(keys)))), _COMBINERS[agg])()
+    return getattr(stacked, _COMBINERS[agg])().to_frame().T
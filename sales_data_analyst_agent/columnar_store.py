@@ -0,0 +1,206 @@
+import codecs
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, BinaryIO, Callable, Optional, Sequence
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+except ImportError:  # pyarrow is optional; without it every load goes through pd.read_csv
+    pa = None
+    ipc = None
+
+logger = logging.getLogger(__name__)
+
+# How much of a file is inspected to pick its encoding.
+ENCODING_SNIFF_BYTES = 64 * 1024
+
+
+def sniff_encoding(file_path: str, sample_size: int = ENCODING_SNIFF_BYTES) -> str:
+    """
+    Picks the encoding for a CSV by decoding a prefix of the file.
+
+    Returns 'utf-8-sig' when the file starts with a UTF-8 BOM, 'utf-8' when the
+    prefix decodes cleanly, and 'latin1' (which accepts any byte) otherwise.
+    """
+    with open(file_path, "rb") as f:
+        return sniff_stream_encoding(f, sample_size)
+
+
+def sniff_stream_encoding(stream: BinaryIO, sample_size: int = ENCODING_SNIFF_BYTES) -> str:
+    """Like sniff_encoding, for an open binary stream. The stream position is restored."""
+    position = stream.tell()
+    prefix = stream.read(sample_size)
+    stream.seek(position)
+    if prefix.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    try:
+        # final=False tolerates a multi-byte character cut off at the end of the sample.
+        codecs.getincrementaldecoder("utf-8")().decode(prefix, final=False)
+    except UnicodeDecodeError:
+        return "latin1"
+    return "utf-8"
+
+
+class ColumnarStore:
+    """
+    On-disk copies of ingested CSVs in the Arrow IPC file format.
+
+    Each dataset is written once, uncompressed, as `<digest>.arrow` so later loads
+    can memory-map it, with a `<digest>.json` sidecar holding the inferred pandas
+    dtypes, row count, column profile and compaction report so the schema is
+    available without touching the data. Loading a dataset touches its sidecar,
+    whose mtime is the last use `sweep` goes by.
+    """
+
+    def __init__(self, root_dir: str):
+        self.root_dir = root_dir
+        self.enabled = pa is not None
+        if self.enabled:
+            os.makedirs(root_dir, exist_ok=True)
+
+    def has(self, digest: str) -> bool:
+        return (
+            self.enabled
+            and os.path.exists(self._data_path(digest))
+            and os.path.exists(self._meta_path(digest))
+        )
+
+    def read_metadata(self, digest: str) -> dict[str, Any]:
+        with open(self._meta_path(digest), "r") as f:
+            return json.load(f)
+
+    def write(
+        self,
+        digest: str,
+        df: pd.DataFrame,
+        encoding: str,
+        profile: Optional[dict[str, Any]] = None,
+        compaction: Optional[dict[str, Any]] = None,
+    ) -> bool:
+        """Persists a parsed DataFrame. Returns False if it could not be converted to Arrow."""
+        if not self.enabled:
+            return False
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+        except (pa.ArrowException, TypeError, ValueError) as e:
+            logger.warning(f"Not persisting dataset {digest} as Arrow: {e}")
+            return False
+
+        # Unique per process and thread, since tools may ingest the same file concurrently.
+        suffix = f"{os.getpid()}.{threading.get_ident()}.tmp"
+        data_path = self._data_path(digest)
+        tmp_path = f"{data_path}.{suffix}"
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, data_path)
+
+        metadata = {
+            "schema": {col: str(dtype) for col, dtype in df.dtypes.items()},
+            "num_rows": len(df),
+            "encoding": encoding,
+            "profile": profile,
+            "compaction": compaction,
+        }
+        meta_path = self._meta_path(digest)
+        with open(f"{meta_path}.{suffix}", "w") as f:
+            json.dump(metadata, f)
+        os.replace(f"{meta_path}.{suffix}", meta_path)
+        return True
+
+    def load(self, digest: str, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """
+        Memory-maps a stored dataset and returns it as a DataFrame.
+
+        Args:
+            digest (str): The content hash the dataset was stored under.
+            columns (Optional[Sequence[str]]): Only read these columns. Defaults to all.
+        """
+        table = self.table(digest)
+        if columns is not None:
+            table = table.select(list(columns))
+        return table.to_pandas()
+
+    def table(self, digest: str) -> "pa.Table":
+        """
+        Memory-maps a stored dataset as an Arrow table. Nothing is read until columns
+        are used, so selecting and filtering it only touches the pages needed.
+        """
+        source = pa.memory_map(self._data_path(digest), "r")
+        table = ipc.open_file(source).read_all()
+        try:
+            os.utime(self._meta_path(digest))
+        except FileNotFoundError:
+            pass
+        return table
+
+    def last_used(self, digest: str) -> Optional[float]:
+        """When the dataset was last written or loaded, or None if it is not stored."""
+        try:
+            return os.path.getmtime(self._meta_path(digest))
+        except FileNotFoundError:
+            return None
+
+    def remove(self, digest: str) -> None:
+        """Deletes a stored dataset. Tables already memory-mapped stay readable."""
+        for path in (self._data_path(digest), self._meta_path(digest)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def sweep(self, max_bytes: int, idle_ttl_seconds: float, in_use: Callable[[str], bool]) -> int:
+        """
+        Deletes datasets not loaded within `idle_ttl_seconds`, then the least recently
+        loaded ones until the store fits in `max_bytes`, skipping those `in_use`
+        reports. Temp files left by interrupted writes are deleted after the TTL.
+        Returns how many datasets were deleted.
+        """
+        if not self.enabled:
+            return 0
+        cutoff = time.time() - idle_ttl_seconds
+        stored = []
+        for name in os.listdir(self.root_dir):
+            path = os.path.join(self.root_dir, name)
+            try:
+                if name.endswith(".tmp"):
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                    continue
+                digest, ext = os.path.splitext(name)
+                if ext != ".arrow":
+                    continue
+                nbytes = os.path.getsize(path)
+                meta_path = self._meta_path(digest)
+                # The sidecar is written after the data; without one, go by the data.
+                if os.path.exists(meta_path):
+                    nbytes += os.path.getsize(meta_path)
+                    path = meta_path
+                stored.append((os.path.getmtime(path), digest, nbytes))
+            except FileNotFoundError:
+                continue
+
+        stored.sort()
+        total = sum(nbytes for _, _, nbytes in stored)
+        removed = 0
+        for last_used, digest, nbytes in stored:
+            if last_used >= cutoff and total <= max_bytes:
+                break
+            if in_use(digest):
+                continue
+            self.remove(digest)
+            total -= nbytes
+            removed += 1
+        return removed
+
+    def _data_path(self, digest: str) -> str:
+        return os.path.join(self.root_dir, f"{digest}.arrow")
+
+    def _meta_path(self, digest: str) -> str:
+        return os.path.join(self.root_dir, f"{digest}.json")
@@ -0,0 +1,101 @@
+import warnings
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+
+# Bumped whenever compaction changes which dtypes it produces, so columnar copies
+# written by an older version are re-ingested rather than loaded as they are.
+COMPACTION_VERSION = 3
+
+# Arrow-backed strings with NaN for missing values, as pandas parses text columns by
+# default. They take a fraction of the memory of Python string objects and, unlike
+# unordered categoricals, still support comparisons, concatenation and `.str`.
+STRING_DTYPE = pd.StringDtype("pyarrow", na_value=np.nan)
+
+# A string column is only parsed as dates when this many of its values all parse.
+DATE_SAMPLE_SIZE = 100
+
+
+def compact_dataframe(df: pd.DataFrame) -> dict[str, Any]:
+    """
+    Converts the string columns of a freshly parsed DataFrame, in place, to dtypes
+    that take less memory:
+      - strings that all parse as dates become datetime64,
+      - other strings held as Python objects become Arrow-backed strings.
+
+    Numeric columns keep their parsed int64/float64 dtypes, and narrower ones (left
+    by an older version of compaction) are widened back. Pandas computes in a
+    column's dtype, so products overflow int32 and sums lose precision in float32.
+    Categoricals (also left by an older version) become strings again, since an
+    unordered categorical rejects `df['Region'] > 'M'` and `df['Region'] + '-x'`.
+
+    Returns:
+        Dict[str, Any]: `bytes_before` and `bytes_after` (deep memory usage),
+        `converted`, mapping each converted column to "<old dtype> -> <new dtype>",
+        and the `version` of compaction that produced them.
+    """
+    before = int(df.memory_usage(deep=True).sum())
+    converted = {}
+    for col in df.columns:
+        series = df[col]
+        compacted = _compact_column(series)
+        if compacted is not series:
+            df[col] = compacted
+            converted[str(col)] = f"{series.dtype} -> {compacted.dtype}"
+    return {
+        "bytes_before": before,
+        "bytes_after": int(df.memory_usage(deep=True).sum()),
+        "converted": converted,
+        "version": COMPACTION_VERSION,
+    }
+
+
+def is_current(report: Optional[dict[str, Any]]) -> bool:
+    """Whether a stored compaction report was produced by this version of compaction."""
+    return bool(report) and report.get("version") == COMPACTION_VERSION
+
+
+def _compact_column(series: pd.Series) -> pd.Series:
+    if pd.api.types.is_bool_dtype(series):
+        return series
+    # Narrowing was lossless, so widening restores the parsed values exactly.
+    if series.dtype in (np.int8, np.int16, np.int32):
+        return series.astype(np.int64)
+    if series.dtype == np.float32:
+        return series.astype(np.float64)
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        if pd.api.types.is_string_dtype(series.cat.categories):
+            return series.astype(STRING_DTYPE)
+        return series
+    if pd.api.types.is_string_dtype(series):
+        dates = _parse_dates(series)
+        if dates is not None:
+            return dates
+        if series.dtype != STRING_DTYPE and _all_strings(series):
+            return series.astype(STRING_DTYPE)
+    return series
+
+
+def _all_strings(series: pd.Series) -> bool:
+    # Object columns can mix strings with numbers; those are left as they are.
+    return all(isinstance(v, str) for v in series.dropna())
+
+
+def _parse_dates(series: pd.Series):
+    sample = series.dropna().head(DATE_SAMPLE_SIZE)
+    if sample.empty or not _all_strings(sample):
+        return None
+    # Plain numbers (ids, years, amounts) would otherwise parse as timestamps.
+    if pd.to_numeric(sample, errors="coerce").notna().any():
+        return None
+    with warnings.catch_warnings():
+        # Raised when the format has to be guessed per value; failures become NaT.
+        warnings.simplefilter("ignore", UserWarning)
+        if pd.to_datetime(sample, errors="coerce").isna().any():
+            return None
+        dates = pd.to_datetime(series, errors="coerce")
+    # Only when no value was lost to parsing.
+    if dates.isna().sum() != series.isna().sum():
+        return None
+    return dates
@@ -0,0 +1,182 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, BinaryIO, Callable, Optional, Union
+
+import pandas as pd
+
+# Files are hashed in 1 MiB blocks so hashing never holds a whole upload in memory.
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class CachedDataset:
+    """
+    A parsed DataFrame together with the schema and profile returned to the agent,
+    and what compacting its dtypes saved (see compaction.compact_dataframe).
+    """
+
+    digest: str
+    dataframe: pd.DataFrame
+    schema: dict[str, str]
+    num_rows: int
+    nbytes: int
+    profile: dict[str, Any] = field(default_factory=dict)
+    compaction: dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class ChunkedDataset:
+    """
+    A CSV too large to hold in memory, kept on disk and read in chunks.
+
+    Only a bounded sample of rows is resident; `schema` is inferred from that
+    sample and `num_rows` is counted while streaming through the file once.
+    """
+
+    digest: str
+    file_path: str
+    encoding: str
+    sample: pd.DataFrame
+    schema: dict[str, str]
+    num_rows: int
+    nbytes: int
+    profile: dict[str, Any] = field(default_factory=dict)
+
+
+Dataset = Union[CachedDataset, ChunkedDataset]
+
+
+def hash_stream(stream: BinaryIO, sink: Optional[BinaryIO] = None) -> str:
+    """
+    Returns the SHA-256 of a stream, read from its current position in blocks.
+    If `sink` is given, every block is also written to it, in the same pass.
+    """
+    hasher = hashlib.sha256()
+    for block in iter(lambda: stream.read(HASH_CHUNK_SIZE), b""):
+        hasher.update(block)
+        if sink is not None:
+            sink.write(block)
+    return hasher.hexdigest()
+
+
+class DatasetCache:
+    """
+    LRU cache of parsed DataFrames keyed by the SHA-256 of the source file.
+
+    Entries are evicted least-recently-used first once the summed in-memory size
+    of the cached DataFrames exceeds `max_bytes`. A single DataFrame larger than
+    the budget is still returned to the caller but is never retained.
+    `on_evict` is called, outside the cache lock, with each evicted entry.
+    """
+
+    def __init__(self, max_bytes: int, on_evict: Optional[Callable[[Dataset], None]] = None):
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict
+        self._entries: "OrderedDict[str, Dataset]" = OrderedDict()
+        self._total_bytes = 0
+        # (path, size, mtime_ns) -> digest, so the same file is only hashed once.
+        self._digests: dict[tuple[str, int, int], str] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def digest_file(self, file_path: str) -> str:
+        """Returns the content hash of a file, reusing a previous hash if the file is unchanged."""
+        key = self._stat_key(file_path)
+        with self._lock:
+            digest = self._digests.get(key)
+        if digest is not None:
+            return digest
+
+        with open(file_path, "rb") as f:
+            digest = hash_stream(f)
+        self.remember_digest(file_path, digest)
+        return digest
+
+    def remember_digest(self, file_path: str, digest: str) -> None:
+        """Records a digest computed elsewhere (e.g. while an upload was being written)."""
+        key = self._stat_key(file_path)
+        with self._lock:
+            self._digests[key] = digest
+
+    def get(self, digest: str) -> Optional[Dataset]:
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return entry
+
+    def put(
+        self,
+        digest: str,
+        df: pd.DataFrame,
+        profile: Optional[dict[str, Any]] = None,
+        compaction: Optional[dict[str, Any]] = None,
+    ) -> CachedDataset:
+        """
+        Adds a parsed DataFrame, and its column profile and compaction report if
+        known, to the cache and returns its entry.
+        """
+        entry = CachedDataset(
+            digest=digest,
+            dataframe=df,
+            schema={col: str(dtype) for col, dtype in df.dtypes.items()},
+            num_rows=len(df),
+            nbytes=int(df.memory_usage(deep=True).sum()),
+            profile=profile or {},
+            compaction=compaction or {},
+        )
+        self.put_entry(entry)
+        return entry
+
+    def put_entry(self, entry: Dataset) -> None:
+        """Adds an already built entry, such as a ChunkedDataset, to the cache."""
+        if entry.nbytes > self.max_bytes:
+            return
+
+        evicted = []
+        with self._lock:
+            previous = self._entries.pop(entry.digest, None)
+            if previous is not None:
+                self._total_bytes -= previous.nbytes
+            self._entries[entry.digest] = entry
+            self._total_bytes += entry.nbytes
+            while self._total_bytes > self.max_bytes:
+                _, oldest = self._entries.popitem(last=False)
+                self._total_bytes -= oldest.nbytes
+                evicted.append(oldest)
+        if self.on_evict is not None:
+            for dataset in evicted:
+                self.on_evict(dataset)
+
+    def contains(self, digest: str) -> bool:
+        """Whether the dataset is cached, without counting a hit or miss."""
+        with self._lock:
+            return digest in self._entries
+
+    def discard(self, digest: str) -> None:
+        with self._lock:
+            entry = self._entries.pop(digest, None)
+            if entry is not None:
+                self._total_bytes -= entry.nbytes
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    @staticmethod
+    def _stat_key(file_path: str) -> tuple[str, int, int]:
+        st = os.stat(file_path)
+        return (os.path.abspath(file_path), st.st_size, st.st_mtime_ns)
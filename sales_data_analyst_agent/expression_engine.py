@@ -0,0 +1,388 @@
+import ast
+import builtins
+import copy
+from functools import lru_cache
+from types import CodeType
+from typing import Any, Optional, Sequence
+
+import pandas as pd
+
+try:
+    import numexpr
+
+    # DataFrame.query hands masks to numexpr, which wins by splitting the work across
+    # threads; on a single core it is slower than plain numpy boolean indexing.
+    VECTORIZE_FILTERS = numexpr.detect_number_of_cores() > 1
+except ImportError:
+    VECTORIZE_FILTERS = False
+
+# Frames with fewer rows than this are filtered with plain boolean indexing; numexpr's
+# setup cost only pays off on larger frames.
+VECTORIZE_MIN_ROWS = 100_000
+
+COMPILED_CACHE_SIZE = 1024
+
+ALLOWED_NODES = (
+    ast.Expression,
+    ast.Call,
+    ast.keyword,
+    ast.Attribute,
+    ast.Subscript,
+    ast.Slice,
+    ast.Name,
+    ast.Load,
+    ast.Constant,
+    ast.List,
+    ast.Tuple,
+    ast.Dict,
+    ast.Set,
+    ast.Compare,
+    ast.BinOp,
+    ast.UnaryOp,
+    ast.BoolOp,
+    ast.IfExp,
+    ast.Lambda,
+    ast.arguments,
+    ast.arg,
+    ast.ListComp,
+    ast.DictComp,
+    ast.GeneratorExp,
+    ast.comprehension,
+    ast.Store,
+    ast.operator,
+    ast.unaryop,
+    ast.boolop,
+    ast.cmpop,
+)
+
+SAFE_BUILTINS = {
+    name: getattr(builtins, name)
+    for name in (
+        "abs", "all", "any", "bool", "dict", "enumerate", "float", "int", "len",
+        "list", "max", "min", "range", "round", "set", "sorted", "str", "sum",
+        "tuple", "zip",
+    )
+}
+
+# The only attributes that may be taken from the `pd` module.
+ALLOWED_PANDAS_ATTRIBUTES = {
+    "DataFrame", "Series", "Index", "Categorical", "Grouper", "NamedAgg",
+    "Timestamp", "Timedelta", "NA", "NaT", "concat", "merge", "crosstab",
+    "pivot_table", "cut", "qcut", "date_range", "to_datetime", "to_numeric",
+    "to_timedelta", "get_dummies", "isna", "isnull", "notna", "notnull",
+}
+
+# Methods that read or write files, run other code, evaluate nested strings (query
+# resolves `@name` against the evaluation globals), or (format) can walk attributes
+# of their arguments. The filters _VectorizeFilters rewrites to `query` are generated
+# after validation and never contain `@`.
+FORBIDDEN_METHODS = {
+    "eval", "query", "pipe", "to_pickle", "to_parquet", "to_feather", "to_hdf", "to_sql",
+    "to_excel", "to_stata", "to_clipboard", "to_orc", "to_gbq", "format", "format_map",
+}
+
+# Methods that change their receiver in place. Datasets are shared between sessions
+# (and cached results are keyed by their digest), so an expression must never
+# modify the frames it is given; `inplace=` keywords are rejected for the same reason.
+MUTATING_METHODS = {
+    "insert", "pop", "update", "set_axis", "clear", "popitem", "setdefault",
+    "fill", "put", "itemset", "resize", "sort", "partition", "setflags",
+}
+MUTATING_KEYWORD = "inplace"
+
+# Methods that look up and call another method when given its name as a string.
+STRING_DISPATCH_METHODS = {"agg", "aggregate", "apply", "transform", "map"}
+
+# The only method names those may be given. Anything else in their function
+# position must be a lambda, so a name assembled at runtime ('to_' + 'csv') can
+# never reach the lookup.
+DISPATCH_FUNCTIONS = {
+    "sum", "mean", "median", "min", "max", "count", "size", "nunique", "std", "var",
+    "sem", "prod", "first", "last", "any", "all", "idxmin", "idxmax", "skew", "kurt",
+    "mode", "quantile", "describe", "abs", "cumsum", "cumprod", "cummin", "cummax",
+    "rank", "diff", "pct_change", "shift", "ffill", "bfill",
+}
+# Keywords that name the function of a dispatch method, when it is not passed first.
+DISPATCH_KEYWORDS = {"func", "arg", "aggfunc"}
+
+# Serializers that return a string when called without a destination, but write
+# to a file when one is given.
+PATH_SERIALIZERS = {
+    "to_csv", "to_json", "to_string", "to_markdown", "to_html", "to_latex", "to_xml",
+}
+PATH_KEYWORDS = {"path_or_buf", "buf"}
+
+
+class UnsafeExpressionError(ValueError):
+    """Raised when an expression uses syntax, names or methods outside the whitelist."""
+
+
+def check_expression(expression: str, names: Sequence[str] = ()) -> None:
+    """
+    Validates an expression without evaluating it. Raises UnsafeExpressionError.
+
+    `names` are the extra DataFrames, besides `df`, the expression may refer to.
+    """
+    _validated_tree(expression.strip(), tuple(sorted(names)))
+
+
+def evaluate(
+    expression: str, df: Optional[pd.DataFrame], frames: Optional[dict[str, pd.DataFrame]] = None
+) -> Any:
+    """
+    Evaluates a validated pandas expression against `df` and any other `frames`,
+    which the expression refers to by name.
+
+    Compiled code is cached per expression. On large frames, when numexpr can use
+    several cores, numeric boolean-mask filters like `df[(df['a'] > 1) & (df['b'] < 5)]`
+    are rewritten to `df.query(...)` so pandas evaluates them with numexpr.
+    """
+    frames = frames or {}
+    vectorize = VECTORIZE_FILTERS and df is not None and len(df) >= VECTORIZE_MIN_ROWS
+    code = compile_expression(expression.strip(), vectorize, tuple(sorted(frames)))
+    return eval(code, {"__builtins__": SAFE_BUILTINS, "pd": pd, **frames, "df": df})
+
+
+@lru_cache(maxsize=COMPILED_CACHE_SIZE)
+def compile_expression(expression: str, vectorize: bool = False, names: tuple[str, ...] = ()) -> CodeType:
+    tree = _parse_and_validate(expression, names)
+    if vectorize:
+        tree = ast.fix_missing_locations(_VectorizeFilters().visit(tree))
+    return compile(tree, "<expression>", "eval")
+
+
+@lru_cache(maxsize=COMPILED_CACHE_SIZE)
+def _validated_tree(expression: str, names: tuple[str, ...] = ()) -> ast.Expression:
+    try:
+        tree = ast.parse(expression, mode="eval")
+    except SyntaxError as e:
+        raise UnsafeExpressionError(f"Invalid expression syntax: {e.msg}") from e
+
+    local_names = {
+        arg.arg for node in ast.walk(tree) if isinstance(node, ast.Lambda)
+        for arg in node.args.args
+    } | {
+        target.id
+        for node in ast.walk(tree)
+        if isinstance(node, ast.comprehension)
+        for target in ast.walk(node.target)
+        if isinstance(target, ast.Name)
+    }
+    allowed_names = {"df", "pd"} | set(SAFE_BUILTINS) | set(names) | local_names
+
+    for node in ast.walk(tree):
+        if not isinstance(node, ALLOWED_NODES):
+            raise UnsafeExpressionError(
+                f"'{type(node).__name__}' is not allowed in expressions."
+            )
+        if isinstance(node, ast.Name) and node.id not in allowed_names:
+            raise UnsafeExpressionError(f"Unknown name '{node.id}'.")
+        if isinstance(node, ast.Attribute):
+            _check_attribute(node)
+        if isinstance(node, ast.keyword):
+            _check_keyword(node)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+            _check_method_call(node)
+    return tree
+
+
+def _parse_and_validate(expression: str, names: tuple[str, ...] = ()) -> ast.Expression:
+    # The validated tree is shared through the cache, so callers get a copy to transform.
+    return copy.deepcopy(_validated_tree(expression, names))
+
+
+def _check_attribute(node: ast.Attribute) -> None:
+    if node.attr.startswith("_"):
+        raise UnsafeExpressionError(f"Private attribute '{node.attr}' is not allowed.")
+    if isinstance(node.value, ast.Name) and node.value.id == "pd":
+        if node.attr not in ALLOWED_PANDAS_ATTRIBUTES:
+            raise UnsafeExpressionError(f"'pd.{node.attr}' is not allowed.")
+    if node.attr in FORBIDDEN_METHODS:
+        raise UnsafeExpressionError(f"'{node.attr}' is not allowed.")
+    if node.attr in MUTATING_METHODS:
+        raise UnsafeExpressionError(
+            f"'{node.attr}' modifies data in place, which is not allowed."
+        )
+
+
+def _check_keyword(node: ast.keyword) -> None:
+    if node.arg == MUTATING_KEYWORD:
+        if not (isinstance(node.value, ast.Constant) and node.value.value is False):
+            raise UnsafeExpressionError("'inplace=True' is not allowed; use the returned result.")
+    elif node.arg is None and any(
+        isinstance(n, ast.Constant) and n.value == MUTATING_KEYWORD for n in ast.walk(node.value)
+    ):
+        raise UnsafeExpressionError("'inplace' cannot be passed through '**'.")
+
+
+def _check_method_call(node: ast.Call) -> None:
+    method = node.func.attr
+    if method in PATH_SERIALIZERS and (
+        node.args or any(kw.arg in PATH_KEYWORDS for kw in node.keywords)
+    ):
+        raise UnsafeExpressionError(
+            f"'{method}' may only be called with keyword options, not a destination."
+        )
+    if method in STRING_DISPATCH_METHODS:
+        _check_dispatch(node, method)
+
+
+def _check_dispatch(node: ast.Call, method: str) -> None:
+    """Checks every function an agg/apply/transform/map call may look up by name."""
+    functions = [kw.value for kw in node.keywords if kw.arg in DISPATCH_KEYWORDS]
+    if node.args:
+        functions.append(node.args[0])
+    for function in functions:
+        # Series.map also takes a dict of values to substitute.
+        if method == "map" and isinstance(function, ast.Dict):
+            if not all(_is_literal(n) for n in function.keys + function.values):
+                raise UnsafeExpressionError("'map' may only be given a dict of literal values.")
+            continue
+        _check_dispatch_function(function, method)
+    # Named aggregations: agg(total='sum'), agg(total=('Sales', 'sum')) or
+    # agg(total=pd.NamedAgg(...)). Other options must be non-string literals.
+    if method in ("agg", "aggregate"):
+        for kw in node.keywords:
+            if kw.arg in DISPATCH_KEYWORDS:
+                continue
+            if isinstance(kw.value, ast.Tuple) and len(kw.value.elts) == 2:
+                _check_dispatch_function(kw.value.elts[1], method)
+            elif isinstance(kw.value, ast.Call) and _is_named_agg(kw.value.func):
+                for function in kw.value.args[1:2] + [
+                    k.value for k in kw.value.keywords if k.arg in DISPATCH_KEYWORDS
+                ]:
+                    _check_dispatch_function(function, method)
+            elif not _is_literal(kw.value) or (
+                isinstance(kw.value, ast.Constant) and isinstance(kw.value.value, str)
+            ):
+                _check_dispatch_function(kw.value, method, nested=True)
+
+
+def _check_dispatch_function(node: ast.AST, method: str, nested: bool = False) -> None:
+    if isinstance(node, ast.Lambda):
+        return
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        if node.value in DISPATCH_FUNCTIONS:
+            return
+        raise UnsafeExpressionError(f"'{node.value}' cannot be passed to '{method}'.")
+    if not nested and isinstance(node, (ast.List, ast.Tuple)):
+        for element in node.elts:
+            _check_dispatch_function(element, method, nested=True)
+        return
+    if not nested and isinstance(node, ast.Dict):
+        # {column: function or [functions]}; the keys are column labels.
+        if not all(_is_literal(key) for key in node.keys):
+            raise UnsafeExpressionError(f"The columns passed to '{method}' must be literals.")
+        for value in node.values:
+            if isinstance(value, (ast.List, ast.Tuple)):
+                for element in value.elts:
+                    _check_dispatch_function(element, method, nested=True)
+            else:
+                _check_dispatch_function(value, method, nested=True)
+        return
+    raise UnsafeExpressionError(
+        f"'{method}' must be given a lambda or an aggregation name written out as a "
+        "string literal, such as 'sum' or 'mean'."
+    )
+
+
+def _is_literal(node: Optional[ast.AST]) -> bool:
+    # Dict keys are None for `**mapping` unpacking, which is not a literal.
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        return _is_literal(node.operand)
+    return isinstance(node, ast.Constant)
+
+
+def _is_named_agg(node: ast.AST) -> bool:
+    return (
+        isinstance(node, ast.Attribute)
+        and node.attr == "NamedAgg"
+        and isinstance(node.value, ast.Name)
+        and node.value.id == "pd"
+    )
+
+
+class _VectorizeFilters(ast.NodeTransformer):
+    """Rewrites `df[<mask over df columns>]` as `df.query('<mask>')`."""
+
+    def visit_Subscript(self, node: ast.Subscript) -> ast.AST:
+        self.generic_visit(node)
+        if not _is_df(node.value):
+            return node
+        query = _to_query(node.slice)
+        if query is None:
+            return node
+        return ast.Call(
+            func=ast.Attribute(value=ast.Name(id="df", ctx=ast.Load()), attr="query", ctx=ast.Load()),
+            args=[ast.Constant(value=query)],
+            keywords=[],
+        )
+
+
+_QUERY_COMPARATORS = {
+    ast.Eq: "==", ast.NotEq: "!=", ast.Lt: "<", ast.LtE: "<=", ast.Gt: ">", ast.GtE: ">=",
+}
+
+
+def _is_df(node: ast.AST) -> bool:
+    return isinstance(node, ast.Name) and node.id == "df"
+
+
+def _column_ref(node: ast.AST) -> Optional[str]:
+    """Returns the query-syntax reference for `df['col']` or `df.col`."""
+    if isinstance(node, ast.Subscript) and _is_df(node.value):
+        if isinstance(node.slice, ast.Constant) and isinstance(node.slice.value, str):
+            name = node.slice.value
+            return f"`{name}`" if "`" not in name else None
+    return None
+
+
+def _literal(node: ast.AST) -> Optional[str]:
+    # Only numbers: numexpr cannot evaluate string comparisons, so pandas would fall
+    # back to Python for them and the rewrite would only add parsing overhead.
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float, bool)):
+        return repr(node.value)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        inner = _literal(node.operand)
+        return f"-{inner}" if inner is not None else None
+    return None
+
+
+def _operand(node: ast.AST) -> Optional[str]:
+    return _column_ref(node) or _literal(node)
+
+
+def _to_query(node: ast.AST) -> Optional[str]:
+    """Translates a boolean mask expression to DataFrame.query syntax, if it is one."""
+    if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.BitAnd, ast.BitOr)):
+        left, right = _to_query(node.left), _to_query(node.right)
+        if left is None or right is None:
+            return None
+        joiner = "and" if isinstance(node.op, ast.BitAnd) else "or"
+        return f"({left}) {joiner} ({right})"
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Invert):
+        inner = _to_query(node.operand)
+        return f"not ({inner})" if inner is not None else None
+    if isinstance(node, ast.Compare) and len(node.ops) == 1:
+        op = _QUERY_COMPARATORS.get(type(node.ops[0]))
+        left, right = _operand(node.left), _operand(node.comparators[0])
+        if op is None or left is None or right is None:
+            return None
+        # At least one side must be a column, or this is not a row mask.
+        if _column_ref(node.left) is None and _column_ref(node.comparators[0]) is None:
+            return None
+        return f"{left} {op} {right}"
+    if (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Attribute)
+        and node.func.attr == "isin"
+        and len(node.args) == 1
+        and not node.keywords
+        and isinstance(node.args[0], (ast.List, ast.Tuple))
+    ):
+        column = _column_ref(node.func.value)
+        values = [_literal(elt) for elt in node.args[0].elts]
+        if column is None or any(value is None for value in values):
+            return None
+        return f"{column} in [{', '.join(values)}]"
+    return None
@@ -1,19 +1,39 @@
-from fastapi import FastAPI, HTTPException, File, UploadFile, Depends, Form
+from fastapi import FastAPI, HTTPException, File, UploadFile, Depends, Form, Header, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
+from google.adk.agents.run_config import RunConfig, StreamingMode
 from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
+from google.adk.telemetry.setup import maybe_set_otel_providers
 from google.protobuf.json_format import MessageToDict
 from google.genai import types
 import uvicorn
-import shutil
-import tempfile
+import asyncio
+import json
+import os
 
 # from pprint import pformat
-from agent import root_agent
+from agent import (
+    root_agent,
+    add_to_workspace,
+    assign_session_dataset,
+    find_dataset,
+    ingest_upload,
+    UPLOAD_DIR,
+    UPLOAD_REFERENCE_PREFIX,
+)
+from dataset_cache import ChunkedDataset, Dataset
+from agent_common.metrics import MetricsMiddleware, MetricsPlugin, render_metrics
+from sessions import build_session_service
+from uploads import ResumableUploads, TooManyUploads, UploadConflict, UploadTooLarge
+from workspace import dataset_name as to_dataset_name
+
+# Exports traces (ours and ADK's) when OTEL_EXPORTER_OTLP_ENDPOINT is set
+maybe_set_otel_providers()
 
 app = FastAPI()
+app.add_middleware(MetricsMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Allows all origins
@@ -23,13 +43,31 @@ app.add_middleware(
 )
 
 
-# Global session service and runner
-session_service = InMemorySessionService()
+# Global session service (in-memory, or shared by all workers when SESSION_DB_URL is set) and runner
+session_service = build_session_service()
 runner = Runner(
-    agent=root_agent, app_name="social_media_assistant", session_service=session_service
+    agent=root_agent,
+    app_name="social_media_assistant",
+    session_service=session_service,
+    plugins=[MetricsPlugin()],
 )
 
-sessions_store = {}
+# Set on responses to the dataset the request worked with, and sent by the chat app on
+# requests that reference one, so a load balancer in front of several replicas can
+# route a dataset's requests to the replica that already has it in memory
+# (e.g. nginx `hash $http_x_dataset_id consistent;`).
+DATASET_AFFINITY_HEADER = "X-Dataset-Id"
+
+# Partial uploads sent in chunks through /datasets/uploads
+resumable_uploads = ResumableUploads(
+    root_dir=os.path.join(UPLOAD_DIR, "parts"),
+    ttl_seconds=float(os.getenv("UPLOAD_PART_TTL_SECONDS", str(24 * 3600))),
+    max_bytes=int(os.getenv("UPLOAD_MAX_BYTES", str(10 * 1024**3))),
+    max_open=int(os.getenv("UPLOAD_MAX_OPEN", "32")),
+)
+
+# Largest chunk accepted by a single PATCH to /datasets/uploads/{upload_id}
+UPLOAD_MAX_CHUNK_BYTES = int(os.getenv("UPLOAD_MAX_CHUNK_BYTES", str(64 * 1024**2)))
 
 
 # class AgentRequest(BaseModel):
@@ -45,83 +83,173 @@ class AgentResponse(BaseModel):
     visualization: Optional[Dict[str, Any]] = None
 
 
+class DatasetResponse(BaseModel):
+    dataset_id: str
+    num_rows: int
+    schema_: Dict[str, str] = Field(alias="schema")
+    streaming: bool
+    profile: Dict[str, Any] = {}
+    # Memory before and after dtype compaction; empty for streamed datasets
+    compaction: Dict[str, Any] = {}
+
+
+class UploadStatus(BaseModel):
+    upload_id: str
+    offset: int
+
+
+def _dataset_response(dataset: Dataset) -> DatasetResponse:
+    return DatasetResponse(
+        dataset_id=dataset.digest,
+        num_rows=dataset.num_rows,
+        schema=dataset.schema,
+        streaming=isinstance(dataset, ChunkedDataset),
+        profile=dataset.profile,
+        compaction={} if isinstance(dataset, ChunkedDataset) else dataset.compaction,
+    )
+
+
+async def _ingest(stream) -> Dataset:
+    # Parse straight from the upload's spool into the dataset cache; the tool then
+    # finds the dataset by reference instead of reading a temporary copy.
+    try:
+        return await asyncio.to_thread(ingest_upload, stream)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Could not read the uploaded CSV: {e}")
+
+
+async def _prepare_turn(
+    files: Optional[List[UploadFile]],
+    dataset_ids: Optional[List[str]],
+    dataset_names: Optional[List[str]],
+    message: Optional[str],
+    user_id: str,
+    session_id: Optional[str],
+) -> tuple[Any, Dataset, types.Content]:
+    """
+    Resolves the session and the datasets for a turn, returning the session, the
+    dataset that becomes `df` (the last one) and the user turn.
+    Datasets are uploaded with the message or referenced by a `dataset_id` from
+    /datasets, so follow-up questions do not need to re-send the files. Several can
+    be sent at once; each is added to the session's workspace under its
+    `dataset_name` (given in the order of the files, then the dataset ids) or its
+    file name, so one question can join them.
+    """
+    files = files or []
+    dataset_ids = dataset_ids or []
+    if not files and not dataset_ids:
+        raise HTTPException(status_code=400, detail="Send either a file or a dataset_id.")
+
+    # Get or create session
+    session = None
+    if session_id:
+        session = await session_service.get_session(
+            app_name="social_media_assistant", user_id=user_id, session_id=session_id
+        )
+    if session is None:
+        session = await session_service.create_session(
+            app_name="social_media_assistant",
+            user_id=user_id,
+            session_id=session_id,
+        )
+
+    datasets: list[tuple[Dataset, Optional[str]]] = []
+    for file in files:
+        datasets.append((await _ingest(file.file), file.filename))
+    for dataset_id in dataset_ids:
+        dataset = await asyncio.to_thread(find_dataset, dataset_id)
+        if dataset is None:
+            raise HTTPException(
+                status_code=404,
+                detail="Dataset not found or no longer available. Please upload it again.",
+            )
+        datasets.append((dataset, None))
+
+    key = (user_id, session.id)
+    names = list(dataset_names or [])
+    lines = []
+    used = set()
+    for i, (dataset, filename) in enumerate(datasets):
+        label = names[i] if i < len(names) and names[i] else filename
+        reference = f"{UPLOAD_REFERENCE_PREFIX}{dataset.digest}"
+        if label is None:
+            lines.append(f"read_csv_and_get_schema(file_path='{reference}')")
+            continue
+        name = to_dataset_name(label)
+        # Two files may share a name, e.g. data.csv from two folders.
+        while name in used:
+            name = f"{name}_{i + 1}"
+        used.add(name)
+        add_to_workspace(key, name, dataset)
+        lines.append(f"read_csv_and_get_schema(file_path='{reference}', name='{name}')")
+    dataset = datasets[-1][0]
+    assign_session_dataset(key, dataset)
+
+    new_message = types.Content(
+        role="user",
+        parts=[types.Part(text="\n".join([*lines, message or ""]))],
+    )
+    return session, dataset, new_message
+
+
+def _visualization_from(part: types.Part) -> Optional[Dict[str, Any]]:
+    if part.function_response and part.function_response.name == "generate_visualization_data":
+        # Access response directly - it should be a dict or dict-like object
+        tool_output = part.function_response.response
+
+        # Handle if it's already a dict
+        if isinstance(tool_output, dict):
+            if tool_output.get("status") == "success" and "visualization" in tool_output:
+                return tool_output["visualization"]
+    return None
+
+
+def _final_text(event) -> str:
+    if event.content and event.content.parts:
+        return event.content.parts[0].text
+    elif event.actions and event.actions.escalate:
+        return f"Agent escalated: {event.error_message or 'No specific message.'}"
+    return "No response content available."
+
+
 @app.post("/chat")
 async def chat(
-    file: UploadFile = File(...),
+    response: Response,
+    file: Optional[List[UploadFile]] = File(None),
+    dataset_id: Optional[List[str]] = Form(None),
+    dataset_name: Optional[List[str]] = Form(None),
     message: Optional[str] = Form(None),
     user_id: Optional[str] = Form("default_user"),
     session_id: Optional[str] = Form(None),
 ):
     """
-    Endpoint to interact with the sales data analyst agent.
+    Endpoint to interact with the sales data analyst agent. `file` and `dataset_id`
+    may be repeated to work with several datasets in one session.
     """
-    """
-       Chat with the social media agent
-       """
     try:
-        # Get or create session
-        session_key = f"{user_id}_{session_id}" if session_id else user_id
-
-        # if session_key not in sessions_store:
-        session = await session_service.create_session(
-            app_name="social_media_assistant",
-            user_id=user_id,
-            session_id=session_id,
+        session, dataset, new_message = await _prepare_turn(
+            file, dataset_id, dataset_name, message, user_id, session_id
         )
-        sessions_store[session_key] = session
-        # else:
-        #     session = sessions_store[session_key]
-
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".csv") as tmp:
-            shutil.copyfileobj(file.file, tmp)
-            tmp_path = tmp.name
+        response.headers[DATASET_AFFINITY_HEADER] = dataset.digest
 
         # Process the message
         events_iterator = runner.run_async(
             user_id=user_id,
-            session_id=session_id,
-            new_message=types.Content(
-                role="user",
-                parts=[
-                    types.Part(
-                        text=f"read_csv_and_get_schema(file_path='{tmp_path}')\n{message or ''}"
-                    )
-                ],
-            ),
+            session_id=session.id,
+            new_message=new_message,
         )
 
         responses = []
-        final_response_text = ""
         visualization_data = None
 
         async for event in events_iterator:
             if event.content and event.content.parts:
                 for part in event.content.parts:
-                    if (
-                        part.function_response
-                        and part.function_response.name == "generate_visualization_data"
-                    ):
-                        # Access response directly - it should be a dict or dict-like object
-                        tool_output = part.function_response.response
-
-                        # Handle if it's already a dict
-                        if isinstance(tool_output, dict):
-                            if (
-                                tool_output.get("status") == "success"
-                                and "visualization" in tool_output
-                            ):
-                                visualization_data = tool_output["visualization"]
+                    visualization_data = _visualization_from(part) or visualization_data
 
             # Handle final response
             if event.is_final_response():
-                if event.content and event.content.parts:
-                    final_response_text = event.content.parts[0].text
-                elif event.actions and event.actions.escalate:
-                    final_response_text = f"Agent escalated: {event.error_message or 'No specific message.'}"
-                else:
-                    final_response_text = "No response content available."
-
-                responses.append(final_response_text)
+                responses.append(_final_text(event))
                 break
 
         return AgentResponse(
@@ -131,13 +259,206 @@ async def chat(
             visualization=visualization_data,
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Error processing request: {str(e)}"
         )
+    finally:
+        for upload in file or []:
+            upload.file.close()
+
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@app.post("/chat/stream")
+async def chat_stream(
+    file: Optional[List[UploadFile]] = File(None),
+    dataset_id: Optional[List[str]] = Form(None),
+    dataset_name: Optional[List[str]] = Form(None),
+    message: Optional[str] = Form(None),
+    user_id: Optional[str] = Form("default_user"),
+    session_id: Optional[str] = Form(None),
+):
+    """
+    Streams the agent's turn as Server-Sent Events while it runs.
+
+    Events: `session` (ids), `text` (partial model text), `tool_call` and `tool_result`
+    (each tool invocation as it starts and finishes), `visualization` (the chart payload
+    as soon as it is generated), `final` (the complete response) and `error`.
+    """
+    try:
+        session, dataset, new_message = await _prepare_turn(
+            file, dataset_id, dataset_name, message, user_id, session_id
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error processing request: {str(e)}"
+        )
+    finally:
+        for upload in file or []:
+            upload.file.close()
+
+    async def event_stream():
+        yield _sse("session", {"session_id": session.id, "user_id": user_id})
+        try:
+            async for event in runner.run_async(
+                user_id=user_id,
+                session_id=session.id,
+                new_message=new_message,
+                run_config=RunConfig(streaming_mode=StreamingMode.SSE),
+            ):
+                if event.content and event.content.parts:
+                    for part in event.content.parts:
+                        if part.text and event.partial:
+                            yield _sse("text", {"text": part.text})
+                        if part.function_call:
+                            yield _sse(
+                                "tool_call",
+                                {"name": part.function_call.name, "args": part.function_call.args},
+                            )
+                        if part.function_response:
+                            response = part.function_response.response or {}
+                            yield _sse(
+                                "tool_result",
+                                {
+                                    "name": part.function_response.name,
+                                    "status": response.get("status") if isinstance(response, dict) else None,
+                                },
+                            )
+                        visualization = _visualization_from(part)
+                        if visualization is not None:
+                            yield _sse("visualization", visualization)
+
+                if event.is_final_response():
+                    yield _sse("final", {"response": _final_text(event)})
+                    break
+        except Exception as e:
+            yield _sse("error", {"detail": f"Error processing request: {str(e)}"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            DATASET_AFFINITY_HEADER: dataset.digest,
+        },
+    )
+
+
+@app.post("/datasets", response_model=DatasetResponse)
+async def upload_dataset(response: Response, file: UploadFile = File(...)):
+    """
+    Uploads a CSV once and returns its `dataset_id`, which /chat accepts in place of
+    the file. Uploading the same bytes again returns the same id without re-parsing.
+    """
+    try:
+        dataset = await _ingest(file.file)
     finally:
         file.file.close()
+    response.headers[DATASET_AFFINITY_HEADER] = dataset.digest
+    return _dataset_response(dataset)
+
+
+@app.post("/datasets/uploads", response_model=UploadStatus)
+async def create_upload():
+    """
+    Starts a resumable upload. Send the file in order with
+    `PATCH /datasets/uploads/{upload_id}` and finish it with `.../complete`.
+    """
+    try:
+        upload_id = await asyncio.to_thread(resumable_uploads.create)
+    except TooManyUploads as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return UploadStatus(upload_id=upload_id, offset=0)
+
+
+@app.get("/datasets/uploads/{upload_id}", response_model=UploadStatus)
+async def upload_status(upload_id: str):
+    """Returns how many bytes have been received, i.e. where to resume."""
+    offset = resumable_uploads.offset(upload_id)
+    if offset is None:
+        raise HTTPException(status_code=404, detail="Upload not found.")
+    return UploadStatus(upload_id=upload_id, offset=offset)
+
+
+@app.patch("/datasets/uploads/{upload_id}", response_model=UploadStatus)
+async def append_upload(
+    upload_id: str, request: Request, upload_offset: int = Header(...)
+):
+    """
+    Appends the request body to the upload. The `Upload-Offset` header must equal the
+    number of bytes received so far; otherwise the response is 409 and its detail
+    carries the offset to resume from.
+    """
+    try:
+        content_length = int(request.headers.get("content-length") or 0)
+    except ValueError:
+        content_length = -1
+    if content_length < 0:
+        raise HTTPException(status_code=400, detail="Content-Length must be a byte count.")
+    if content_length > UPLOAD_MAX_CHUNK_BYTES:
+        raise HTTPException(
+            status_code=413, detail=f"Chunks may be at most {UPLOAD_MAX_CHUNK_BYTES} bytes."
+        )
+    # append checks this against the actual offset; checking here saves reading the body.
+    if upload_offset + content_length > resumable_uploads.max_bytes:
+        raise HTTPException(
+            status_code=413, detail=f"Uploads may be at most {resumable_uploads.max_bytes} bytes."
+        )
+    chunk = await request.body()
+    if len(chunk) > UPLOAD_MAX_CHUNK_BYTES:
+        raise HTTPException(
+            status_code=413, detail=f"Chunks may be at most {UPLOAD_MAX_CHUNK_BYTES} bytes."
+        )
+    try:
+        offset = await asyncio.to_thread(
+            resumable_uploads.append, upload_id, upload_offset, chunk
+        )
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Upload not found.")
+    except UploadConflict as e:
+        raise HTTPException(
+            status_code=409, detail={"message": str(e), "offset": e.offset}
+        )
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    return UploadStatus(upload_id=upload_id, offset=offset)
+
+
+@app.post("/datasets/uploads/{upload_id}/complete", response_model=DatasetResponse)
+async def complete_upload(upload_id: str, response: Response):
+    """Ingests a fully received upload and returns its `dataset_id`."""
+    if resumable_uploads.offset(upload_id) is None:
+        raise HTTPException(status_code=404, detail="Upload not found.")
+    try:
+        with open(resumable_uploads.path(upload_id), "rb") as stream:
+            dataset = await _ingest(stream)
+    finally:
+        resumable_uploads.discard(upload_id)
+    response.headers[DATASET_AFFINITY_HEADER] = dataset.digest
+    return _dataset_response(dataset)
+
+
+@app.delete("/datasets/uploads/{upload_id}")
+async def cancel_upload(upload_id: str):
+    """Abandons an upload and deletes what was received."""
+    resumable_uploads.discard(upload_id)
+    return {"status": "deleted"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Request, model, tool and turn latencies and payload sizes in the Prometheus text format."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8001)
+    # Workers share sessions (with SESSION_DB_URL) and datasets through the database and files on disk.
+    uvicorn.run("main:app", host="0.0.0.0", port=8001, workers=int(os.getenv("WEB_CONCURRENCY", "1")))
@@ -0,0 +1,122 @@
+import math
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+
+# Most common values reported per column.
+PROFILE_TOP_K = 5
+
+# Rows included verbatim in the profile.
+PROFILE_SAMPLE_ROWS = 3
+
+# Columns beyond this many are listed in the schema but not profiled, to keep the
+# profile small enough to send to the model with every schema.
+PROFILE_MAX_COLUMNS = 100
+
+# Value counts are only tracked while a column has at most this many distinct
+# values; past that it is reported as high-cardinality with a lower bound.
+DISTINCT_TRACK_LIMIT = 10_000
+
+# Long strings are cut to this length in top values and sample rows.
+VALUE_MAX_CHARS = 64
+
+
+class DatasetProfiler:
+    """
+    Column statistics accumulated over one or more chunks of a dataset.
+
+    For each profiled column: null count, distinct count, min and max (numeric and
+    datetime columns) and the most common values. The same profiler serves an
+    in-memory DataFrame (a single update) and a file streamed in chunks, so
+    out-of-core datasets are profiled in the pass that counts their rows.
+    """
+
+    def __init__(
+        self,
+        top_k: int = PROFILE_TOP_K,
+        sample_rows: int = PROFILE_SAMPLE_ROWS,
+        max_columns: int = PROFILE_MAX_COLUMNS,
+    ):
+        self.top_k = top_k
+        self.sample_rows = sample_rows
+        self.max_columns = max_columns
+        self._sample: Optional[pd.DataFrame] = None
+        self._columns: dict[str, dict[str, Any]] = {}
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        if self._sample is None:
+            self._sample = chunk.head(self.sample_rows)
+        for col in list(chunk.columns)[: self.max_columns]:
+            series = chunk[col]
+            stats = self._columns.setdefault(
+                str(col), {"nulls": 0, "min": None, "max": None, "counts": pd.Series(dtype="int64")}
+            )
+            stats["nulls"] += int(series.isna().sum())
+
+            if _has_range(series):
+                low, high = series.min(), series.max()
+                if not pd.isna(low):
+                    stats["min"] = low if stats["min"] is None else min(stats["min"], low)
+                    stats["max"] = high if stats["max"] is None else max(stats["max"], high)
+
+            if stats["counts"] is not None:
+                counts = stats["counts"].add(series.value_counts(), fill_value=0)
+                if len(counts) > DISTINCT_TRACK_LIMIT:
+                    counts = None
+                stats["counts"] = counts
+
+    def result(self) -> dict[str, Any]:
+        columns = {}
+        for col, stats in self._columns.items():
+            counts = stats["counts"]
+            profile: dict[str, Any] = {"nulls": stats["nulls"]}
+            if counts is None:
+                profile["distinct"] = f">{DISTINCT_TRACK_LIMIT}"
+            else:
+                profile["distinct"] = len(counts)
+                # Only worth listing when values repeat; unique ids would just be noise.
+                if len(counts) and counts.max() > 1:
+                    top = counts.sort_values(ascending=False, kind="stable").head(self.top_k)
+                    profile["top_values"] = [[_jsonable(v), int(n)] for v, n in top.items()]
+            if stats["min"] is not None:
+                profile["min"] = _jsonable(stats["min"])
+                profile["max"] = _jsonable(stats["max"])
+            columns[col] = profile
+
+        sample = self._sample if self._sample is not None else pd.DataFrame()
+        return {
+            "columns": columns,
+            "sample_rows": [
+                {str(k): _jsonable(v) for k, v in row.items()}
+                for row in sample.to_dict("records")
+            ],
+        }
+
+
+def profile_dataframe(df: pd.DataFrame) -> dict[str, Any]:
+    """Profiles an in-memory DataFrame. See DatasetProfiler."""
+    profiler = DatasetProfiler()
+    profiler.update(df)
+    return profiler.result()
+
+
+def _has_range(series: pd.Series) -> bool:
+    return (
+        pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)
+    ) or pd.api.types.is_datetime64_any_dtype(series)
+
+
+def _jsonable(value: Any) -> Any:
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, (pd.Timestamp, pd.Timedelta)):
+        return value.isoformat()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if value is pd.NA or value is pd.NaT:
+        return None
+    text = str(value)
+    return text if len(text) <= VALUE_MAX_CHARS else text[: VALUE_MAX_CHARS - 3] + "..."
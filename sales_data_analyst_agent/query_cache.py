@@ -0,0 +1,249 @@
+import ast
+import sys
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional, Sequence
+
+import pandas as pd
+
+from expression_engine import evaluate
+
+# Trailing calls that only change how a result is serialized. They are split off so
+# `df.groupby(...).sum()` is computed once however each tool chooses to serialize it.
+SERIALIZATION_METHODS = (
+    "to_json",
+    "to_dict",
+    "to_list",
+    "tolist",
+    "to_csv",
+    "to_string",
+    "to_markdown",
+)
+
+# Expressions calling these are never cached because they are not deterministic.
+NON_DETERMINISTIC_METHODS = ("sample",)
+
+# Name the computed result is bound to when a serializer is applied to it.
+RESULT_NAME = "_result"
+
+
+@dataclass
+class _Entry:
+    value: Any
+    nbytes: int
+    # serializer source -> serialized output
+    serialized: dict[str, Any] = field(default_factory=dict)
+
+
+def split_expression(expression: str) -> tuple[str, Optional[str]]:
+    """
+    Normalizes an expression and separates its computation from its serialization.
+
+    Returns (base, serializer) where `base` is the canonical source of the
+    computation and `serializer` is the trailing serialization call rewritten to
+    apply to `_result` (e.g. "_result.to_dict('records')"), or None if there is none.
+    """
+    tree = ast.parse(expression.strip(), mode="eval").body
+    if (
+        isinstance(tree, ast.Call)
+        and isinstance(tree.func, ast.Attribute)
+        and tree.func.attr in SERIALIZATION_METHODS
+    ):
+        base = ast.unparse(tree.func.value)
+        tree.func.value = ast.Name(id=RESULT_NAME, ctx=ast.Load())
+        return base, ast.unparse(tree)
+    return ast.unparse(tree), None
+
+
+def _is_deterministic(base: str) -> bool:
+    return not any(
+        isinstance(node, ast.Attribute) and node.attr in NON_DETERMINISTIC_METHODS
+        for node in ast.walk(ast.parse(base, mode="eval"))
+    )
+
+
+def _result_nbytes(value: Any) -> int:
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if isinstance(usage, pd.Series) else usage)
+    return sys.getsizeof(value)
+
+
+class QueryCache:
+    """
+    LRU memo of query results keyed by (dataset digest, normalized expression).
+
+    The raw result of the computation is cached together with every serialized form
+    requested for it, so a groupby answered by `execute_query` can be reused as-is
+    by `generate_visualization_data`. Entries are evicted once either `max_entries`
+    or `max_bytes` (summed result sizes) is exceeded.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[tuple[str, str], _Entry]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def evaluate(
+        self,
+        digest: str,
+        expression: str,
+        compute: Callable[[str], Any],
+        default_serializer: Optional[str] = None,
+    ) -> Any:
+        """
+        Returns the (serialized) result of an expression, computing it only on a miss.
+
+        Args:
+            digest (str): Fingerprint of the dataset the expression runs against.
+            expression (str): The pandas expression as written by the model.
+            compute (Callable[[str], Any]): Evaluates a base expression against the dataset.
+            default_serializer (Optional[str]): Applied to DataFrame/Series results when
+                the expression does not serialize its result itself.
+        """
+        base, serializer = split_expression(expression)
+        key, entry = self._entry(digest, base, compute)
+        return self._serialize(key, entry, serializer, default_serializer)
+
+    def evaluate_many(
+        self,
+        queries: Sequence[tuple[str, str]],
+        compute_many: Callable[[list[str]], list[Any]],
+        default_serializer: Optional[str] = None,
+    ) -> list[Any]:
+        """
+        Like evaluate, for several (digest, expression) pairs at once. Every miss is
+        handed to `compute_many` in a single call, so it can share work between them,
+        e.g. one pass over the data for all of them.
+
+        `compute_many` returns one item per base expression: its value, or the
+        exception computing it raised. Exceptions are returned in place of results,
+        so one failing expression does not fail the others.
+        """
+        split = [(digest, *split_expression(expression)) for digest, expression in queries]
+        entries: dict[tuple[str, str], Any] = {}
+        missing: list[tuple[str, str]] = []
+        with self._lock:
+            for digest, base, _ in split:
+                key = (digest, base)
+                if key in entries or key in missing:
+                    continue
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    entries[key] = entry
+                else:
+                    self.misses += 1
+                    missing.append(key)
+
+        if missing:
+            values = compute_many([base for _, base in missing])
+            for key, value in zip(missing, values):
+                if isinstance(value, Exception):
+                    entries[key] = value
+                    continue
+                entry = _Entry(value=value, nbytes=_result_nbytes(value))
+                if _is_deterministic(key[1]):
+                    self._store(key, entry)
+                entries[key] = entry
+
+        results = []
+        for digest, base, serializer in split:
+            entry = entries[(digest, base)]
+            if isinstance(entry, Exception):
+                results.append(entry)
+                continue
+            try:
+                results.append(self._serialize((digest, base), entry, serializer, default_serializer))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def result(self, digest: str, expression: str, compute: Callable[[str], Any]) -> Any:
+        """
+        Returns the unserialized result of an expression's computation.
+
+        Any trailing serialization call in `expression` is ignored, for callers that
+        format results themselves.
+        """
+        base, _ = split_expression(expression)
+        return self._entry(digest, base, compute)[1].value
+
+    def _entry(
+        self, digest: str, base: str, compute: Callable[[str], Any]
+    ) -> tuple[tuple[str, str], _Entry]:
+        key = (digest, base)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if entry is None:
+            value = compute(base)
+            entry = _Entry(value=value, nbytes=_result_nbytes(value))
+            if _is_deterministic(base):
+                self._store(key, entry)
+        return key, entry
+
+    def _serialize(
+        self,
+        key: tuple[str, str],
+        entry: _Entry,
+        serializer: Optional[str],
+        default_serializer: Optional[str],
+    ) -> Any:
+        if serializer is None and isinstance(entry.value, (pd.DataFrame, pd.Series)):
+            serializer = default_serializer
+        if serializer is None:
+            return entry.value
+
+        if serializer not in entry.serialized:
+            # Validated and run with the same restricted builtins as the computation.
+            output = evaluate(serializer, None, {RESULT_NAME: entry.value})
+            entry.serialized[serializer] = output
+            self._grow(key, entry, sys.getsizeof(output))
+        return entry.serialized[serializer]
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def _store(self, key: tuple[str, str], entry: _Entry) -> None:
+        if entry.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= previous.nbytes
+            self._entries[key] = entry
+            self._total_bytes += entry.nbytes
+            self._evict()
+
+    def _grow(self, key: tuple[str, str], entry: _Entry, nbytes: int) -> None:
+        """Charges a newly added serialized form to an entry that may be cached."""
+        with self._lock:
+            entry.nbytes += nbytes
+            if self._entries.get(key) is entry:
+                self._total_bytes += nbytes
+                self._evict()
+
+    def _evict(self) -> None:
+        while self._entries and (
+            len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes
+        ):
+            _, evicted = self._entries.popitem(last=False)
+            self._total_bytes -= evicted.nbytes
@@ -0,0 +1,120 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+from dataset_cache import Dataset
+
+SessionKey = tuple[str, str]
+
+
+@dataclass
+class SessionDataset:
+    """The dataset a session is currently working with."""
+
+    dataset: Dataset
+    last_access: float = field(default_factory=time.monotonic)
+
+
+class SessionDatasetRegistry:
+    """
+    Maps (user_id, session_id) to the dataset loaded in that session.
+
+    Memory is accounted per distinct dataset digest, so sessions that loaded the
+    same file share one DataFrame and are only charged for it once. Sessions idle
+    for longer than `idle_ttl_seconds` are dropped, and when the accounted bytes
+    exceed `max_bytes` the least recently used sessions are dropped first.
+
+    `on_release` is called, outside the registry lock, with each dataset that is
+    no longer referenced by any session.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        idle_ttl_seconds: float,
+        on_release: Optional[Callable[[Dataset], None]] = None,
+    ):
+        self.max_bytes = max_bytes
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.on_release = on_release
+        self._released: list[Dataset] = []
+        self._sessions: "OrderedDict[SessionKey, SessionDataset]" = OrderedDict()
+        # digest -> number of sessions referencing it
+        self._refcounts: dict[str, int] = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def set(self, key: SessionKey, dataset: Dataset) -> None:
+        with self._lock:
+            self._drop(key)
+            self._sessions[key] = SessionDataset(dataset=dataset)
+            self._retain(dataset)
+            self._evict(now=time.monotonic())
+        self._notify_released()
+
+    def get(self, key: SessionKey) -> Optional[SessionDataset]:
+        with self._lock:
+            now = time.monotonic()
+            self._evict(now=now)
+            entry = self._sessions.get(key)
+            if entry is not None:
+                entry.last_access = now
+                self._sessions.move_to_end(key)
+        self._notify_released()
+        return entry
+
+    def discard(self, key: SessionKey) -> None:
+        with self._lock:
+            self._drop(key)
+        self._notify_released()
+
+    def references(self, digest: str) -> bool:
+        """Whether any session is still working with the dataset."""
+        with self._lock:
+            return digest in self._refcounts
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "datasets": len(self._refcounts),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _retain(self, dataset: Dataset) -> None:
+        count = self._refcounts.get(dataset.digest, 0)
+        if count == 0:
+            self._total_bytes += dataset.nbytes
+        self._refcounts[dataset.digest] = count + 1
+
+    def _drop(self, key: SessionKey) -> None:
+        entry = self._sessions.pop(key, None)
+        if entry is None:
+            return
+        digest = entry.dataset.digest
+        self._refcounts[digest] -= 1
+        if self._refcounts[digest] == 0:
+            del self._refcounts[digest]
+            self._total_bytes -= entry.dataset.nbytes
+            self._released.append(entry.dataset)
+
+    def _evict(self, now: float) -> None:
+        # Sessions are kept in access order, so idle ones are always at the front.
+        while self._sessions:
+            key, entry = next(iter(self._sessions.items()))
+            if now - entry.last_access <= self.idle_ttl_seconds:
+                break
+            self._drop(key)
+        # Never evict the most recent session to make room for itself.
+        while self._total_bytes > self.max_bytes and len(self._sessions) > 1:
+            self._drop(next(iter(self._sessions)))
+
+    def _notify_released(self) -> None:
+        with self._lock:
+            released, self._released = self._released, []
+        if self.on_release is not None:
+            for dataset in released:
+                self.on_release(dataset)
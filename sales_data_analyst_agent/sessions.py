@@ -0,0 +1,26 @@
+import logging
+import os
+
+from google.adk.sessions import BaseSessionService, InMemorySessionService
+
+logger = logging.getLogger(__name__)
+
+
+def build_session_service() -> BaseSessionService:
+    """
+    Returns the session backend configured by SESSION_DB_URL.
+
+    With a database URL (e.g. `sqlite+aiosqlite:///./sessions.db`) sessions are
+    stored through ADK's DatabaseSessionService, so every worker process sees the
+    same sessions and they survive restarts; without one they are kept in memory,
+    which only works with a single worker.
+    """
+    db_url = os.getenv("SESSION_DB_URL")
+    if not db_url:
+        return InMemorySessionService()
+
+    # Imported lazily so the in-memory setup does not require SQLAlchemy.
+    from google.adk.sessions import DatabaseSessionService
+
+    logger.info(f"Persisting sessions to {db_url}")
+    return DatabaseSessionService(db_url=db_url)
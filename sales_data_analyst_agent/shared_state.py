@@ -0,0 +1,125 @@
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from session_datasets import SessionKey
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS session_datasets (
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    last_access REAL NOT NULL,
+    PRIMARY KEY (user_id, session_id)
+);
+CREATE INDEX IF NOT EXISTS idx_session_datasets_digest ON session_datasets (digest, last_access);
+CREATE TABLE IF NOT EXISTS session_workspaces (
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    last_access REAL NOT NULL,
+    PRIMARY KEY (user_id, session_id, name)
+);
+CREATE INDEX IF NOT EXISTS idx_session_workspaces_digest ON session_workspaces (digest, last_access);
+"""
+
+
+class SessionDatasetDirectory:
+    """
+    Which dataset each session is working with, shared by every worker process.
+
+    SessionDatasetRegistry holds the DataFrames a worker has loaded; this records
+    only (user_id, session_id) -> digest and when the session last used it, in a
+    SQLite file all workers on the host open. A worker that picks up a session
+    another worker started looks up the digest here and loads the dataset from the
+    columnar store. A dataset counts as in use while some session used it within
+    `idle_ttl_seconds`, so one worker never deletes a file another worker still
+    needs.
+
+    Each session also has a workspace: every dataset it has read, by the name
+    expressions refer to it with. Datasets in a workspace count as in use the same
+    way, so a join can still find them after the session has moved on to another `df`.
+
+    Another backend, e.g. Redis for replicas on several hosts, only needs the same
+    methods.
+    """
+
+    def __init__(self, db_path: str, idle_ttl_seconds: float):
+        self.db_path = db_path
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def assign(self, key: SessionKey, digest: str) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO session_datasets (user_id, session_id, digest, last_access) "
+                "VALUES (?, ?, ?, ?) ON CONFLICT (user_id, session_id) DO UPDATE SET "
+                "digest = excluded.digest, last_access = excluded.last_access",
+                (*key, digest, time.time()),
+            )
+
+    def lookup(self, key: SessionKey) -> Optional[str]:
+        """Returns the session's dataset digest and marks it as used, or None if it has none."""
+        cutoff = time.time() - self.idle_ttl_seconds
+        with self._connect() as conn:
+            row = conn.execute(
+                "UPDATE session_datasets SET last_access = ? "
+                "WHERE user_id = ? AND session_id = ? AND last_access >= ? RETURNING digest",
+                (time.time(), *key, cutoff),
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def add_to_workspace(self, key: SessionKey, name: str, digest: str) -> None:
+        """Adds a dataset to the session's workspace, replacing any dataset of the same name."""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO session_workspaces (user_id, session_id, name, digest, last_access) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT (user_id, session_id, name) DO UPDATE SET "
+                "digest = excluded.digest, last_access = excluded.last_access",
+                (*key, name, digest, time.time()),
+            )
+
+    def workspace(self, key: SessionKey) -> dict[str, str]:
+        """Returns the session's datasets by name and marks them as used."""
+        cutoff = time.time() - self.idle_ttl_seconds
+        with self._connect() as conn:
+            rows = conn.execute(
+                "UPDATE session_workspaces SET last_access = ? "
+                "WHERE user_id = ? AND session_id = ? AND last_access >= ? RETURNING name, digest",
+                (time.time(), *key, cutoff),
+            ).fetchall()
+        return dict(rows)
+
+    def in_use(self, digest: str) -> bool:
+        """Whether any session, in any worker, used the dataset within the idle TTL."""
+        cutoff = time.time() - self.idle_ttl_seconds
+        row = self._connect().execute(
+            "SELECT 1 FROM session_datasets WHERE digest = ? AND last_access >= ? "
+            "UNION ALL SELECT 1 FROM session_workspaces WHERE digest = ? AND last_access >= ? "
+            "LIMIT 1",
+            (digest, cutoff, digest, cutoff),
+        ).fetchone()
+        return row is not None
+
+    def sweep(self) -> int:
+        """Deletes sessions idle for longer than the TTL. Returns how many were deleted."""
+        cutoff = time.time() - self.idle_ttl_seconds
+        with self._connect() as conn:
+            conn.execute("DELETE FROM session_workspaces WHERE last_access < ?", (cutoff,))
+            return conn.execute(
+                "DELETE FROM session_datasets WHERE last_access < ?", (cutoff,)
+            ).rowcount
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections cannot be shared across threads, so keep one per thread.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The agent's modules import each other as top-level modules, as they do when the
+# app is run from this directory.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from compaction import COMPACTION_VERSION, STRING_DTYPE, compact_dataframe, is_current
+from expression_engine import evaluate
+
+ROWS = 10_000
+
+QUERIES = [
+    "(df['units'] * df['price_cents']).max()",
+    "df.groupby('region')['amount'].sum()",
+    "df['amount'].cumsum().iloc[-1]",
+    "df['amount'].mean()",
+    "df.groupby('region', observed=True)['units'].sum()",
+    "df[df['region'] == 'West']['price_cents'].sum()",
+    "df.groupby(df['date'].dt.month)['amount'].sum()",
+    "df['region'].value_counts().sort_index()",
+    # Ordering, concatenation and string methods on a low-cardinality column.
+    "df[df['region'] > 'M']['amount'].sum()",
+    "(df['region'] + '-x').value_counts().sort_index()",
+    "df['region'].str.upper().value_counts().sort_index()",
+    "df[df['region'].str.startswith('W')]['units'].sum()",
+    "df['region'].min()",
+]
+
+
+@pytest.fixture
+def sales() -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        # Values whose product overflows int32 and whose sums need float64.
+        "units": rng.integers(1, 50_000, ROWS),
+        "price_cents": rng.integers(1, 100_000, ROWS),
+        "amount": rng.integers(1, 10_000_000, ROWS) / 100,
+        "region": rng.choice(["North", "South", "East", "West"], ROWS),
+        "date": pd.date_range("2024-01-01", periods=ROWS, freq="h").strftime("%Y-%m-%d %H:%M"),
+        "order_id": [f"ORD-{i}" for i in range(ROWS)],
+    })
+
+
+def _assert_same(before, after):
+    if isinstance(before, pd.Series):
+        before, after = before.to_dict(), after.to_dict()
+    assert before == after
+
+
+@pytest.mark.parametrize("expression", QUERIES)
+@pytest.mark.parametrize("string_dtype", [None, object])
+def test_query_results_unchanged(sales, expression, string_dtype):
+    # Also as Python objects, as parsed without Arrow-backed strings.
+    if string_dtype is not None:
+        sales = sales.astype({"region": string_dtype, "date": string_dtype, "order_id": string_dtype})
+    # Dates are compared as dates, as they are once compacted.
+    reference = sales.assign(date=pd.to_datetime(sales["date"]))
+    compacted = sales.copy()
+    compact_dataframe(compacted)
+    _assert_same(evaluate(expression, reference), evaluate(expression, compacted))
+
+
+def test_only_strings_are_converted(sales):
+    report = compact_dataframe(sales)
+
+    assert set(report["converted"]) == {"date"}
+    assert sales["region"].dtype == STRING_DTYPE
+    assert pd.api.types.is_datetime64_any_dtype(sales["date"])
+    assert sales["order_id"].dtype == STRING_DTYPE
+    assert sales["units"].dtype == np.int64
+    assert sales["amount"].dtype == np.float64
+    assert report["bytes_after"] < report["bytes_before"]
+    assert is_current(report)
+
+
+def test_narrowed_numbers_are_widened(sales):
+    # As stored by the version of compaction that narrowed numbers.
+    expected = evaluate(QUERIES[0], sales)
+    sales["units"] = sales["units"].astype(np.int32)
+    sales["price_cents"] = sales["price_cents"].astype(np.int32)
+
+    compact_dataframe(sales)
+
+    assert sales["units"].dtype == np.int64
+    assert evaluate(QUERIES[0], sales) == expected
+
+
+def test_object_strings_become_arrow_strings(sales):
+    sales["region"] = sales["region"].astype(object)
+    sales["mixed"] = pd.Series(["a", 1] * (ROWS // 2), dtype=object)
+
+    report = compact_dataframe(sales)
+
+    assert report["converted"]["region"] == f"object -> {STRING_DTYPE}"
+    assert sales["region"].dtype == STRING_DTYPE
+    # Strings mixed with numbers are left as they are.
+    assert "mixed" not in report["converted"]
+    assert report["bytes_after"] < report["bytes_before"]
+
+
+def test_categoricals_become_strings(sales):
+    # As stored by the version of compaction that made low-cardinality strings categorical.
+    expected = evaluate("df[df['region'] > 'M']['amount'].sum()", sales)
+    sales["region"] = sales["region"].astype("category")
+    with pytest.raises(TypeError):
+        evaluate("df[df['region'] > 'M']['amount'].sum()", sales)
+
+    compact_dataframe(sales)
+
+    assert sales["region"].dtype == STRING_DTYPE
+    assert evaluate("df[df['region'] > 'M']['amount'].sum()", sales) == expected
+    assert (evaluate("df['region'] + '-x'", sales) == sales["region"] + "-x").all()
+
+
+def test_reports_of_older_versions_are_not_current():
+    assert not is_current(None)
+    assert not is_current({"bytes_before": 1, "bytes_after": 1, "converted": {}})
+    assert not is_current({"converted": {}, "version": 2})
+    assert is_current({"converted": {}, "version": COMPACTION_VERSION})
@@ -0,0 +1,76 @@
+import pandas as pd
+import pytest
+
+from expression_engine import UnsafeExpressionError, check_expression, evaluate
+
+
+@pytest.fixture
+def df() -> pd.DataFrame:
+    return pd.DataFrame({
+        "a": [1, 2, 3, 4],
+        "b": [10.0, 20.0, 30.0, 40.0],
+        "region": ["West", "East", "West", "North"],
+    })
+
+
+@pytest.mark.parametrize("expression", [
+    # Method names assembled at runtime for the string-dispatch methods.
+    "df.apply('to_'+'csv', path_or_buf='{path}')",
+    "df.agg('ins'+'ert', 0, 0, 'z', 5)",
+    "df.apply('qu'+'ery', expr='a > 1')",
+    "df.agg(f'{{\"sum\"}}')",
+    "df.agg(['sum', 'po'+'p'])",
+    "df.agg({{'a': 'up'+'date'}})",
+    "df.groupby('region').agg(t=('a', 'ins'+'ert'))",
+    "df.groupby('region')['a'].agg(t='ins'+'ert')",
+    "df['a'].map({{1: 'x'+'y'}})",
+    "df.agg(str)",
+    "df.apply(pd.to_numeric)",
+])
+def test_runtime_dispatch_names_are_rejected(df, tmp_path, expression):
+    path = tmp_path / "x.csv"
+    with pytest.raises(UnsafeExpressionError):
+        evaluate(expression.format(path=path), df)
+    assert not path.exists()
+    assert list(df.columns) == ["a", "b", "region"]
+
+
+@pytest.mark.parametrize("expression", [
+    "df.query('@pd.io.common.os.system(\"echo PWNED\") == 0')",
+    "df.agg('query')",
+    "df.drop(columns=['b'], inplace=True)",
+    "df.drop(columns=['b'], **{'inplace': True})",
+    "df.insert(0, 'z', 1)",
+    "df.pop('a')",
+    "df['a'].values.sort()",
+    "df.apply('pop')",
+    "df.to_csv('/tmp/out.csv')",
+    "df.__class__",
+    "pd.read_csv('/etc/passwd')",
+    "open('/etc/passwd')",
+])
+def test_unsafe_expressions_are_rejected(expression):
+    with pytest.raises(UnsafeExpressionError):
+        check_expression(expression)
+
+
+@pytest.mark.parametrize("expression, expected", [
+    ("df.groupby('region')['b'].agg('sum').to_dict()", {"East": 20.0, "North": 40.0, "West": 40.0}),
+    ("df.agg({'a': ['min', 'max']})['a'].tolist()", [1, 4]),
+    ("df.groupby('region').agg(total=('b', 'sum'))['total'].to_dict()", {"East": 20.0, "North": 40.0, "West": 40.0}),
+    ("df.apply(lambda r: r['a'] * 2, axis=1).tolist()", [2, 4, 6, 8]),
+    ("df['region'].map({'West': 'W'}).fillna('-').tolist()", ["W", "-", "W", "-"]),
+    ("df.drop(columns=['b'], inplace=False).columns.tolist()", ["a", "region"]),
+])
+def test_safe_expressions_evaluate(df, expression, expected):
+    assert evaluate(expression, df) == expected
+
+
+def test_vectorized_filters_match_boolean_indexing(df, monkeypatch):
+    import expression_engine
+
+    expression = "df[(df['a'] > 1) & (df['b'] < 40)]"
+    expected = evaluate(expression, df)
+    monkeypatch.setattr(expression_engine, "VECTORIZE_FILTERS", True)
+    monkeypatch.setattr(expression_engine, "VECTORIZE_MIN_ROWS", 0)
+    pd.testing.assert_frame_equal(evaluate(expression, df), expected)
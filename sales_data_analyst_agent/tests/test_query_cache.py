@@ -0,0 +1,111 @@
+import pandas as pd
+import pytest
+
+from expression_engine import UnsafeExpressionError, evaluate
+from query_cache import QueryCache, split_expression
+
+DF = pd.DataFrame({"region": ["North", "South", "North"], "amount": [1.0, 2.0, 3.0]})
+
+
+@pytest.fixture
+def cache() -> QueryCache:
+    return QueryCache(max_entries=8, max_bytes=1024**2)
+
+
+class Counter:
+    """A compute function that records the expressions it was asked to evaluate."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, base):
+        self.calls.append(base)
+        return evaluate(base, DF)
+
+    def many(self, bases):
+        results = []
+        for base in bases:
+            try:
+                results.append(self(base))
+            except Exception as e:
+                results.append(e)
+        return results
+
+
+def test_split_separates_serialization():
+    base, serializer = split_expression("df.groupby('region')['amount'].sum().to_dict()")
+
+    assert base == "df.groupby('region')['amount'].sum()"
+    assert serializer == "_result.to_dict()"
+    assert split_expression("df['amount'].sum()") == ("df['amount'].sum()", None)
+
+
+def test_serializations_share_one_computation(cache):
+    compute = Counter()
+    as_dict = cache.evaluate("d", "df.groupby('region')['amount'].sum().to_dict()", compute)
+    as_list = cache.evaluate("d", "df.groupby( 'region' )['amount'].sum().tolist()", compute)
+
+    assert as_dict == {"North": 4.0, "South": 2.0}
+    assert as_list == [4.0, 2.0]
+    assert len(compute.calls) == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_datasets_are_cached_separately(cache):
+    compute = Counter()
+    cache.evaluate("a", "df['amount'].sum()", compute)
+    cache.evaluate("b", "df['amount'].sum()", compute)
+
+    assert len(compute.calls) == 2
+
+
+def test_sampling_is_not_cached(cache):
+    compute = Counter()
+    cache.evaluate("d", "df.sample(1)", compute)
+    cache.evaluate("d", "df.sample(1)", compute)
+
+    assert len(compute.calls) == 2
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = QueryCache(max_entries=2, max_bytes=1024**2)
+    compute = Counter()
+    for expression in ("df['amount'].sum()", "df['amount'].max()", "df['amount'].sum()", "df['amount'].min()"):
+        cache.evaluate("d", expression, compute)
+
+    cache.evaluate("d", "df['amount'].sum()", compute)
+    cache.evaluate("d", "df['amount'].max()", compute)
+
+    assert compute.calls.count("df['amount'].sum()") == 1
+    assert compute.calls.count("df['amount'].max()") == 2
+
+
+def test_serializers_are_validated(cache, tmp_path):
+    target = tmp_path / "owned"
+    expression = f"df['amount'].sum().to_string(__import__('os').system('touch {target}'))"
+
+    with pytest.raises(UnsafeExpressionError):
+        cache.evaluate("d", expression, Counter())
+    assert not target.exists()
+
+
+def test_evaluate_many_isolates_errors(cache):
+    compute = Counter()
+    results = cache.evaluate_many(
+        [
+            ("d", "df['amount'].sum()"),
+            ("d", "df['missing'].sum()"),
+            ("d", "df['amount'].sum()"),
+            ("d", "df['amount'].to_dict(__import__('os'))"),
+        ],
+        compute.many,
+    )
+
+    assert results[0] == results[2] == 6.0
+    assert isinstance(results[1], KeyError)
+    assert isinstance(results[3], UnsafeExpressionError)
+    # Duplicates are computed once, and failures are not cached.
+    assert compute.calls.count("df['amount'].sum()") == 1
+    assert cache.evaluate("d", "df['amount'].sum()", compute) == 6.0
+    assert cache.stats()["entries"] == 2
@@ -0,0 +1,76 @@
+import pytest
+
+from shared_state import SessionDatasetDirectory
+
+KEY = ("user", "session")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("shared_state.time.time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def db_path(tmp_path) -> str:
+    return str(tmp_path / "shared_state.sqlite")
+
+
+def test_workers_see_each_others_sessions(db_path, clock):
+    # Two directories on one file stand in for two worker processes.
+    first = SessionDatasetDirectory(db_path, idle_ttl_seconds=60)
+    second = SessionDatasetDirectory(db_path, idle_ttl_seconds=60)
+
+    first.assign(KEY, "digest-a")
+    first.add_to_workspace(KEY, "sales", "digest-a")
+    first.add_to_workspace(KEY, "targets", "digest-b")
+
+    assert second.lookup(KEY) == "digest-a"
+    assert second.workspace(KEY) == {"sales": "digest-a", "targets": "digest-b"}
+    assert second.lookup(("user", "other")) is None
+
+
+def test_reassigning_replaces_the_dataset(db_path, clock):
+    directory = SessionDatasetDirectory(db_path, idle_ttl_seconds=60)
+    directory.assign(KEY, "digest-a")
+    directory.assign(KEY, "digest-b")
+    directory.add_to_workspace(KEY, "sales", "digest-a")
+    directory.add_to_workspace(KEY, "sales", "digest-b")
+
+    assert directory.lookup(KEY) == "digest-b"
+    assert directory.workspace(KEY) == {"sales": "digest-b"}
+    assert not directory.in_use("digest-a")
+
+
+def test_datasets_stay_in_use_while_sessions_touch_them(db_path, clock):
+    directory = SessionDatasetDirectory(db_path, idle_ttl_seconds=60)
+    directory.assign(KEY, "digest-a")
+    directory.add_to_workspace(("user", "joins"), "targets", "digest-b")
+
+    clock[0] += 50
+    # Looking a session up marks its dataset as used again.
+    assert directory.lookup(KEY) == "digest-a"
+    clock[0] += 50
+
+    assert directory.in_use("digest-a")
+    assert not directory.in_use("digest-b")
+    assert directory.workspace(("user", "joins")) == {}
+
+
+def test_sweep_deletes_idle_sessions(db_path, clock):
+    directory = SessionDatasetDirectory(db_path, idle_ttl_seconds=60)
+    directory.assign(KEY, "digest-a")
+    directory.assign(("user", "active"), "digest-b")
+    directory.add_to_workspace(KEY, "sales", "digest-a")
+
+    clock[0] += 40
+    directory.assign(("user", "active"), "digest-b")
+    clock[0] += 40
+
+    assert directory.sweep() == 1
+    assert directory.lookup(("user", "active")) == "digest-b"
+    clock[0] -= 80
+    # Deleted, not just idle: rolling the clock back does not bring it back.
+    assert directory.lookup(KEY) is None
+    assert directory.workspace(KEY) == {}
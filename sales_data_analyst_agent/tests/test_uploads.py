@@ -0,0 +1,92 @@
+import os
+import tempfile
+
+import pytest
+
+# main builds its stores and upload directory at import time.
+os.environ.setdefault("UPLOAD_DIR", tempfile.mkdtemp(prefix="sales_agent_uploads_"))
+os.environ.setdefault("COLUMNAR_STORE_DIR", tempfile.mkdtemp(prefix="sales_agent_store_"))
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import main  # noqa: E402
+from uploads import ResumableUploads, TooManyUploads, UploadConflict, UploadTooLarge  # noqa: E402
+
+
+@pytest.fixture
+def uploads(tmp_path) -> ResumableUploads:
+    return ResumableUploads(root_dir=str(tmp_path), ttl_seconds=3600, max_bytes=10, max_open=2)
+
+
+@pytest.fixture
+def client(uploads, monkeypatch) -> TestClient:
+    monkeypatch.setattr(main, "resumable_uploads", uploads)
+    monkeypatch.setattr(main, "UPLOAD_MAX_CHUNK_BYTES", 8)
+    return TestClient(main.app)
+
+
+def test_chunks_are_appended_in_order(uploads):
+    upload_id = uploads.create()
+
+    assert uploads.append(upload_id, 0, b"abc") == 3
+    assert uploads.append(upload_id, 3, b"de") == 5
+    with open(uploads.path(upload_id), "rb") as f:
+        assert f.read() == b"abcde"
+
+
+def test_out_of_order_chunk_reports_offset(uploads):
+    upload_id = uploads.create()
+    uploads.append(upload_id, 0, b"abc")
+
+    with pytest.raises(UploadConflict) as raised:
+        uploads.append(upload_id, 1, b"x")
+    assert raised.value.offset == 3
+
+
+def test_upload_size_is_capped(uploads):
+    upload_id = uploads.create()
+    uploads.append(upload_id, 0, b"a" * 8)
+
+    with pytest.raises(UploadTooLarge):
+        uploads.append(upload_id, 8, b"abc")
+    assert uploads.offset(upload_id) == 8
+
+
+def test_open_uploads_are_capped(uploads):
+    first = uploads.create()
+    uploads.create()
+    with pytest.raises(TooManyUploads):
+        uploads.create()
+
+    uploads.discard(first)
+    assert uploads.create()
+
+
+def test_endpoints_map_limits_to_status_codes(client):
+    upload_id = client.post("/datasets/uploads").json()["upload_id"]
+    client.post("/datasets/uploads")
+    assert client.post("/datasets/uploads").status_code == 429
+
+    url = f"/datasets/uploads/{upload_id}"
+    assert client.patch(url, headers={"Upload-Offset": "0"}, content=b"abc").json()["offset"] == 3
+    conflict = client.patch(url, headers={"Upload-Offset": "0"}, content=b"abc")
+    assert conflict.status_code == 409
+    assert conflict.json()["detail"]["offset"] == 3
+    # Larger than a chunk, then past the upload's maximum size.
+    assert client.patch(url, headers={"Upload-Offset": "3"}, content=b"a" * 9).status_code == 413
+    assert client.patch(url, headers={"Upload-Offset": "3"}, content=b"a" * 8).status_code == 413
+    assert client.get(url).json()["offset"] == 3
+
+
+@pytest.mark.parametrize("content_length", ["abc", "-1", "1.5"])
+def test_malformed_content_length_is_rejected(client, content_length):
+    upload_id = client.post("/datasets/uploads").json()["upload_id"]
+
+    response = client.patch(
+        f"/datasets/uploads/{upload_id}",
+        headers={"Upload-Offset": "0", "Content-Length": content_length},
+    )
+
+    assert response.status_code == 400
+    assert client.get(f"/datasets/uploads/{upload_id}").json()["offset"] == 0
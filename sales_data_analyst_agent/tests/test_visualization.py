@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+from visualization import OTHER_LABEL, build_payload, lttb_indices
+
+
+def test_top_n_with_numeric_group_key():
+    # As returned by df.groupby('Year')['Sales'].sum()
+    totals = pd.Series(
+        [31, 32, 33, 34, 30, 29, 28], index=pd.Index(range(2018, 2025), name="Year"), name="Sales"
+    )
+
+    payload = build_payload("bar", totals, max_points=1000, top_n=5)
+
+    assert payload["columns"] == ["Year", "Sales"]
+    assert payload["data"]["Year"] == [2021, 2020, 2019, 2018, OTHER_LABEL]
+    assert payload["data"]["Sales"] == [34, 33, 32, 31, 30 + 29 + 28]
+    assert payload["meta"] == {
+        "original_rows": 7, "returned_rows": 5, "downsampled": True, "method": "top_n",
+    }
+
+
+def test_top_n_with_string_group_key():
+    frame = pd.DataFrame({"Region": list("ABCDEF"), "Sales": [5, 1, 6, 2, 4, 3]})
+
+    payload = build_payload("pie", frame, max_points=1000, top_n=3)
+
+    assert payload["data"] == {"Region": ["C", "A", OTHER_LABEL], "Sales": [6, 5, 10]}
+
+
+def test_small_results_are_returned_as_is():
+    frame = pd.DataFrame({"Region": ["A", "B"], "Sales": [1.5, None]})
+
+    payload = build_payload("bar", frame, max_points=1000, top_n=5)
+
+    assert payload["data"] == {"Region": ["A", "B"], "Sales": [1.5, None]}
+    assert payload["meta"]["downsampled"] is False
+
+
+def test_scatter_is_capped_with_lttb():
+    x = np.arange(10_000, dtype=float)
+    frame = pd.DataFrame({"x": x, "y": np.sin(x / 500)})
+
+    payload = build_payload("scatter", frame, max_points=200, top_n=20)
+
+    assert payload["meta"]["method"] == "lttb"
+    assert len(payload["data"]["x"]) == 200
+    # The ends of the series are always kept.
+    assert payload["data"]["x"][0] == 0 and payload["data"]["x"][-1] == 9_999
+
+
+def test_lttb_keeps_peaks():
+    y = np.zeros(1000)
+    y[500] = 10
+    assert 500 in lttb_indices(np.arange(1000, dtype=float), y, 50)
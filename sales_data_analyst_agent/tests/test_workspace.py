@@ -0,0 +1,134 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from expression_engine import evaluate
+from workspace import dataset_name, plan_query, scan_frame, scan_table
+
+ROWS = 1_000
+
+
+@pytest.fixture
+def frames() -> dict[str, pd.DataFrame]:
+    rng = np.random.default_rng(0)
+    orders = pd.DataFrame({
+        "order_id": np.arange(ROWS),
+        "store_id": rng.integers(0, 20, ROWS),
+        "region": rng.choice(["North", "South", "East", "West"], ROWS),
+        "amount": rng.integers(1, 100_000, ROWS) / 100,
+        "units": rng.integers(1, 20, ROWS),
+        "note": [None if i % 7 else f"note {i}" for i in range(ROWS)],
+    })
+    stores = pd.DataFrame({
+        "store_id": np.arange(20),
+        "city": [f"City {i % 5}" for i in range(20)],
+        "size": rng.choice(["small", "large"], 20),
+    })
+    return {"orders": orders, "stores": stores}
+
+
+EXPRESSIONS = [
+    "orders[orders['region'] == 'West']['amount'].sum()",
+    "orders[(orders['amount'] > 500) & ~orders['region'].isin(['North', 'East'])]['units'].mean()",
+    "orders[orders['note'].isna()]['amount'].max()",
+    "orders[orders['units'] >= 10].groupby('region')['amount'].sum()",
+    "orders[orders['region'] != 'South'].sort_values('amount').head(5)",
+    "orders.groupby('region')['units'].sum()",
+    "orders.sum()",
+    "orders[orders['region'] == 'East'].merge(stores, on='store_id').groupby('city')['amount'].sum()",
+    "orders.merge(stores[stores['size'] == 'large'], on='store_id')['units'].sum()",
+    "orders.merge(stores, on='store_id').drop_duplicates(subset=['city'])['city'].sort_values().tolist()",
+]
+
+
+def _schemas(frames):
+    return {name: {col: str(dtype) for col, dtype in df.dtypes.items()} for name, df in frames.items()}
+
+
+def _evaluate_planned(expression, frames, from_arrow: bool):
+    plan = plan_query(expression, _schemas(frames))
+    if from_arrow:
+        loaded = {
+            name: scan_table(pa.Table.from_pandas(frames[name], preserve_index=False), scan, 1024**3)
+            for name, scan in plan.scans.items()
+        }
+    else:
+        loaded = {name: scan_frame(frames[name], scan) for name, scan in plan.scans.items()}
+    return evaluate(plan.expression, loaded.get("df"), loaded)
+
+
+def _assert_same(expected, actual):
+    if isinstance(expected, pd.DataFrame):
+        pd.testing.assert_frame_equal(expected, actual[expected.columns], check_dtype=False)
+    elif isinstance(expected, pd.Series):
+        pd.testing.assert_series_equal(expected, actual, check_dtype=False)
+    else:
+        assert expected == pytest.approx(actual)
+
+
+@pytest.mark.parametrize("from_arrow", [False, True], ids=["memory", "arrow"])
+@pytest.mark.parametrize("expression", EXPRESSIONS)
+def test_planned_results_match_pandas(frames, expression, from_arrow):
+    names = {name: df.copy() for name, df in frames.items()}
+    expected = evaluate(expression, None, names)
+
+    _assert_same(expected, _evaluate_planned(expression, frames, from_arrow))
+
+
+def test_filter_and_projection_are_pushed_down(frames):
+    plan = plan_query("orders[orders['region'] == 'West']['amount'].sum()", _schemas(frames))
+
+    scan = plan.scans["orders"]
+    assert plan.expression == "orders['amount'].sum()"
+    assert scan.row_filter == "df['region'] == 'West'"
+    assert scan.columns == ["amount"]
+    assert scan.filter_columns == ["region"]
+
+
+def test_join_loads_only_named_columns(frames):
+    plan = plan_query(
+        "orders.merge(stores, on='store_id').groupby('city')['amount'].sum()", _schemas(frames)
+    )
+
+    assert sorted(plan.scans["orders"].columns) == ["amount", "store_id"]
+    assert sorted(plan.scans["stores"].columns) == ["city", "store_id"]
+
+
+@pytest.mark.parametrize("expression", [
+    "orders.sum()",
+    "orders.merge(stores)['amount'].sum()",
+    "orders[orders['region'] == 'West']",
+    "orders.apply(lambda row: row['amount'] * 2, axis=1).sum()",
+])
+def test_expressions_that_may_read_any_column_load_every_column(frames, expression):
+    assert plan_query(expression, _schemas(frames)).scans["orders"].columns is None
+
+
+def test_arrow_filter_keeps_original_row_labels(frames):
+    plan = plan_query("orders[orders['amount'] > 900]", _schemas(frames))
+    table = pa.Table.from_pandas(frames["orders"], preserve_index=False)
+
+    loaded = scan_table(table, plan.scans["orders"], 1024**3)
+
+    expected = frames["orders"][frames["orders"]["amount"] > 900]
+    assert loaded.index.tolist() == expected.index.tolist()
+
+
+def test_oversized_scans_are_refused(frames):
+    plan = plan_query("orders['amount'].sum()", _schemas(frames))
+    table = pa.Table.from_pandas(frames["orders"], preserve_index=False)
+
+    with pytest.raises(MemoryError):
+        scan_table(table, plan.scans["orders"], max_bytes=1024)
+
+
+@pytest.mark.parametrize("label, name", [
+    ("Orders.csv", "orders"),
+    ("Q3 sales.csv", "q3_sales"),
+    ("2024.csv", "data_2024"),
+    ("df.csv", "df_data"),
+    ("class.csv", "class_data"),
+])
+def test_dataset_names(label, name):
+    assert dataset_name(label) == name
@@ -0,0 +1,129 @@
+import fcntl
+import os
+import re
+import time
+import uuid
+from typing import Optional
+
+# Upload ids are generated here; anything else is rejected before touching the filesystem.
+UPLOAD_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+
+class UploadConflict(ValueError):
+    """Raised when a chunk does not start where the upload currently ends."""
+
+    def __init__(self, message: str, offset: int):
+        super().__init__(message)
+        self.offset = offset
+
+
+class UploadTooLarge(ValueError):
+    """Raised when a chunk would take an upload past the maximum upload size."""
+
+
+class TooManyUploads(ValueError):
+    """Raised when starting an upload while the maximum number are already open."""
+
+
+class ResumableUploads:
+    """
+    Uploads assembled from sequential chunks, so large files can be sent in pieces
+    and resumed after a dropped connection.
+
+    Each upload is a `<upload_id>.part` file under `root_dir`. Its size is the offset
+    the next chunk must start at, so an upload can be resumed from the file alone,
+    even after a restart or by another worker process. Uploads not written to for
+    `ttl_seconds` are deleted.
+
+    At most `max_open` uploads are in progress at once, across workers, and each
+    may grow to at most `max_bytes`, so clients cannot fill `root_dir` before the
+    TTL catches up with them.
+    """
+
+    def __init__(self, root_dir: str, ttl_seconds: float, max_bytes: int, max_open: int):
+        self.root_dir = root_dir
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.max_open = max_open
+        os.makedirs(root_dir, exist_ok=True)
+
+    def create(self) -> str:
+        """
+        Starts an empty upload and returns its id.
+
+        Raises:
+            TooManyUploads: If `max_open` uploads are already in progress.
+        """
+        self.sweep()
+        # Counting and creating under one lock keeps workers from racing past the limit.
+        with open(os.path.join(self.root_dir, ".lock"), "wb") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            open_uploads = sum(1 for name in os.listdir(self.root_dir) if name.endswith(".part"))
+            if open_uploads >= self.max_open:
+                raise TooManyUploads(
+                    f"{open_uploads} uploads are already in progress. Finish or cancel one first."
+                )
+            upload_id = uuid.uuid4().hex
+            open(self.path(upload_id), "wb").close()
+        return upload_id
+
+    def offset(self, upload_id: str) -> Optional[int]:
+        """The number of bytes received so far, or None if the upload does not exist."""
+        try:
+            return os.path.getsize(self.path(upload_id))
+        except (KeyError, FileNotFoundError):
+            return None
+
+    def append(self, upload_id: str, offset: int, data: bytes) -> int:
+        """
+        Writes a chunk that starts at `offset` and returns the new offset.
+
+        Raises:
+            KeyError: If the upload does not exist.
+            UploadConflict: If `offset` is not where the upload ends, or another
+                chunk is being written to it.
+            UploadTooLarge: If the chunk would make the upload larger than `max_bytes`.
+        """
+        try:
+            f = open(self.path(upload_id), "r+b")
+        except FileNotFoundError:
+            raise KeyError(upload_id)
+        with f:
+            # The lock is held on the file itself, so it also excludes other worker processes.
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                current = os.fstat(f.fileno()).st_size
+                raise UploadConflict("Another chunk is being written to this upload.", current)
+            current = f.seek(0, os.SEEK_END)
+            if offset != current:
+                raise UploadConflict(f"Expected a chunk starting at offset {current}.", current)
+            if current + len(data) > self.max_bytes:
+                raise UploadTooLarge(f"Uploads may be at most {self.max_bytes} bytes.")
+            f.write(data)
+            return offset + len(data)
+
+    def discard(self, upload_id: str) -> None:
+        try:
+            os.remove(self.path(upload_id))
+        except (KeyError, FileNotFoundError):
+            pass
+
+    def sweep(self) -> int:
+        """Deletes uploads idle for longer than the TTL. Returns how many were deleted."""
+        cutoff = time.time() - self.ttl_seconds
+        removed = 0
+        for name in os.listdir(self.root_dir):
+            path = os.path.join(self.root_dir, name)
+            if name.endswith(".part") and os.path.getmtime(path) < cutoff:
+                try:
+                    os.remove(path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
+    def path(self, upload_id: str) -> str:
+        if not UPLOAD_ID_PATTERN.fullmatch(upload_id):
+            raise KeyError(upload_id)
+        return os.path.join(self.root_dir, f"{upload_id}.part")
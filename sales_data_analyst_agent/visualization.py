@@ -0,0 +1,152 @@
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+
+OTHER_LABEL = "Other"
+
+
+def build_payload(
+    chart_type: str, data: Any, max_points: int, top_n: int
+) -> dict[str, Any]:
+    """
+    Turns a query result into a bounded, columnar chart payload.
+
+    Scatter plots keep at most `max_points` points, chosen with
+    Largest-Triangle-Three-Buckets when x is numeric (so the shape of the series
+    survives) and a seeded random sample otherwise. Bar and pie charts keep the
+    `top_n - 1` largest categories and fold the rest into a single "Other" slice.
+
+    Returns:
+        Dict[str, Any]: `chart_type`, the ordered `columns`, `data` mapping each
+        column to a list of values, and `meta` describing any downsampling.
+    """
+    frame = _to_frame(data)
+    original_rows = len(frame)
+    method: Optional[str] = None
+
+    if chart_type == "scatter" and original_rows > max_points:
+        frame, method = _downsample_scatter(frame, max_points)
+    elif chart_type in ("bar", "pie") and original_rows > top_n:
+        frame, method = _top_n_with_other(frame, top_n), "top_n"
+
+    return {
+        "chart_type": chart_type,
+        "columns": [str(col) for col in frame.columns],
+        "data": _columnar(frame),
+        "meta": {
+            "original_rows": original_rows,
+            "returned_rows": len(frame),
+            "downsampled": method is not None,
+            "method": method,
+        },
+    }
+
+
+def _to_frame(data: Any) -> pd.DataFrame:
+    if isinstance(data, pd.DataFrame):
+        return data.reset_index() if _has_meaningful_index(data) else data
+    if isinstance(data, pd.Series):
+        return data.reset_index(name=data.name if data.name is not None else "value")
+    if isinstance(data, dict):
+        return pd.DataFrame({"label": list(data.keys()), "value": list(data.values())})
+    if isinstance(data, list):
+        return pd.DataFrame(data)
+    raise ValueError(
+        f"Cannot build a chart from a result of type {type(data).__name__}."
+    )
+
+
+def _has_meaningful_index(frame: pd.DataFrame) -> bool:
+    # Group keys live in the index unless the expression called reset_index().
+    return not isinstance(frame.index, pd.RangeIndex) or any(
+        name is not None for name in frame.index.names
+    )
+
+
+def _numeric_columns(frame: pd.DataFrame) -> list:
+    return [
+        col for col in frame.columns
+        if pd.api.types.is_numeric_dtype(frame[col]) and not pd.api.types.is_bool_dtype(frame[col])
+    ]
+
+
+def _downsample_scatter(
+    frame: pd.DataFrame, max_points: int
+) -> tuple[pd.DataFrame, Optional[str]]:
+    numeric = _numeric_columns(frame)
+    if len(numeric) >= 2 and len(frame.columns) >= 2 and frame.columns[0] in numeric:
+        x_col = frame.columns[0]
+        y_col = next(col for col in numeric if col != x_col)
+        points = frame.dropna(subset=[x_col, y_col]).sort_values(x_col, kind="stable")
+        if len(points) > max_points:
+            indices = lttb_indices(
+                points[x_col].to_numpy(dtype=float),
+                points[y_col].to_numpy(dtype=float),
+                max_points,
+            )
+            return points.iloc[indices], "lttb"
+        # Dropping rows with a missing coordinate was enough.
+        return points, None
+    sampled = frame.sample(n=max_points, random_state=0).sort_index()
+    return sampled, "random"
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: picks `threshold` points of a series sorted by x
+    that best preserve its visual shape. Always keeps the first and last points.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    bucket_size = (n - 2) / (threshold - 2)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third vertex of the triangle.
+        next_start = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        if next_start >= next_end:
+            next_start, next_end = n - 1, n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        start = int(i * bucket_size) + 1
+        end = max(int((i + 1) * bucket_size) + 1, start + 1)
+        areas = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+    selected[-1] = n - 1
+    return selected
+
+
+def _top_n_with_other(frame: pd.DataFrame, top_n: int) -> pd.DataFrame:
+    # The first column is the group key, even when it is numeric (a year or store id).
+    label_col = frame.columns[0]
+    value_col = next((col for col in _numeric_columns(frame) if col != label_col), None)
+    if value_col is None:
+        return frame.head(top_n)
+
+    ranked = frame.sort_values(value_col, ascending=False, kind="stable")
+    head, rest = ranked.iloc[: top_n - 1], ranked.iloc[top_n - 1 :]
+    other = {col: None for col in frame.columns}
+    other[value_col] = rest[value_col].sum()
+    other[label_col] = OTHER_LABEL
+    return pd.concat([head, pd.DataFrame([other])], ignore_index=True)
+
+
+def _columnar(frame: pd.DataFrame) -> dict[str, list]:
+    columns = {}
+    for col in frame.columns:
+        series = frame[col]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            values = [None if pd.isna(v) else v.isoformat() for v in series]
+        else:
+            values = series.astype(object).where(series.notna(), None).tolist()
+        columns[str(col)] = values
+    return columns
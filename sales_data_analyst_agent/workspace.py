@@ -0,0 +1,555 @@
+import ast
+import keyword
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+import pandas as pd
+
+from expression_engine import SAFE_BUILTINS, evaluate
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # pyarrow is optional; without it there is no columnar store to scan
+    pa = None
+    pc = None
+
+# Names a dataset can never be given, since expressions already use them.
+RESERVED_NAMES = {"df", "pd"} | set(SAFE_BUILTINS)
+
+# The name every filter is rewritten to refer to, so it can be evaluated on its own.
+FILTER_FRAME = "df"
+
+# Methods whose result has the receiver's columns (and maybe more). Whether such a
+# result depends on every column is decided by what the expression does with it next.
+ROW_METHODS = {
+    "sort_values", "sort_index", "head", "tail", "nlargest", "nsmallest",
+    "reset_index", "set_index", "copy", "assign", "rename", "astype", "fillna", "round",
+}
+
+# Methods that compare whole rows unless they are given a subset of columns.
+SUBSET_METHODS = {"drop_duplicates", "duplicated", "dropna", "value_counts"}
+
+MERGE_KEYWORDS = {"on", "left_on", "right_on", "left_index", "right_index"}
+DEFAULT_MERGE_SUFFIXES = ("_x", "_y")
+
+_COMPARATORS = {
+    ast.Eq: "equal", ast.NotEq: "not_equal", ast.Lt: "less", ast.LtE: "less_equal",
+    ast.Gt: "greater", ast.GtE: "greater_equal",
+}
+_FLIPPED = {
+    ast.Eq: ast.Eq, ast.NotEq: ast.NotEq, ast.Lt: ast.Gt, ast.LtE: ast.GtE,
+    ast.Gt: ast.Lt, ast.GtE: ast.LtE,
+}
+
+
+def dataset_name(label: str) -> str:
+    """
+    Turns a file name or label into the identifier a dataset is referred to by in
+    expressions, e.g. `orders` for "Orders.csv" and `q3_sales` for "Q3 sales.csv".
+    """
+    stem = os.path.splitext(os.path.basename(label.strip()))[0].lower()
+    name = re.sub(r"\W+", "_", stem, flags=re.ASCII).strip("_") or "data"
+    if name[0].isdigit():
+        name = f"data_{name}"
+    if keyword.iskeyword(name) or name in RESERVED_NAMES:
+        name = f"{name}_data"
+    return name
+
+
+@dataclass
+class Scan:
+    """How one dataset is loaded for an expression."""
+
+    # Columns to load, or None for every column
+    columns: Optional[list[str]]
+    # Row mask over `df`, applied while loading, e.g. "df['Region'] == 'West'"
+    row_filter: Optional[str] = None
+    # Columns only the row filter reads; dropped once it has been applied
+    filter_columns: list[str] = field(default_factory=list)
+
+
+@dataclass
+class QueryPlan:
+    # The expression to evaluate, with the filters that were pushed down removed
+    expression: str
+    scans: dict[str, Scan]
+
+
+def referenced_datasets(expression: str, names) -> set[str]:
+    """The dataset names an expression refers to."""
+    tree = ast.parse(expression.strip(), mode="eval")
+    return {node.id for node in ast.walk(tree) if isinstance(node, ast.Name)} & set(names)
+
+
+def plan_query(expression: str, schemas: dict[str, dict[str, str]]) -> QueryPlan:
+    """
+    Works out how to load each dataset an expression refers to.
+
+    `schemas` maps each dataset name the expression uses to its columns. Two things
+    are pushed below the load:
+      - Row filters: when a dataset is only used as `name[<mask>]`, where the mask
+        compares its columns with literals (`==`, `<`, `isin`, ... joined by `&`, `|`
+        and `~`), only the matching rows are loaded and the expression uses them as is.
+      - Projection: a dataset is loaded with only the columns the expression names,
+        unless some part of the expression may depend on columns it does not name
+        (e.g. returning a whole frame, `.sum()` over a frame, `merge` without `on`,
+        or a lambda over rows); then every column is loaded.
+    Loaded rows keep their original row labels, so results match evaluating the
+    expression against the full datasets.
+    """
+    tree = ast.parse(expression.strip(), mode="eval")
+    filters = {}
+    for name in schemas:
+        pushed = _pushable_filter(tree, name)
+        if pushed is not None:
+            filters[name] = pushed.slice
+            tree = _ReplaceNode(pushed, ast.Name(id=name, ctx=ast.Load())).visit(tree)
+
+    analysis = _ColumnUsage(schemas)
+    analysis.run(tree)
+
+    scans = {}
+    for name, schema in schemas.items():
+        columns = None if name in analysis.whole else analysis.columns(name)
+        scan = Scan(columns=columns)
+        mask = filters.get(name)
+        if mask is not None:
+            scan.row_filter = ast.unparse(_Rename(name, FILTER_FRAME).visit(_copy(mask)))
+            filter_columns = _mask_columns(mask)
+            if columns is not None:
+                scan.filter_columns = [c for c in filter_columns if c not in columns]
+        scans[name] = scan
+    return QueryPlan(expression=ast.unparse(tree), scans=scans)
+
+
+def scan_frame(df: pd.DataFrame, scan: Scan) -> pd.DataFrame:
+    """Applies a scan to a DataFrame that is already in memory."""
+    if scan.row_filter is None:
+        # Selecting columns would only copy data that is resident anyway.
+        return df
+    mask = evaluate(scan.row_filter, df)
+    return df.loc[mask, scan.columns] if scan.columns is not None else df[mask]
+
+
+def scan_table(table: "pa.Table", scan: Scan, max_bytes: int) -> pd.DataFrame:
+    """
+    Loads a scan from an Arrow table, e.g. one memory-mapped from the columnar store.
+
+    Columns are selected and rows filtered in Arrow, so only what the expression
+    needs is converted to pandas. Filters Arrow cannot evaluate with pandas'
+    semantics are applied in pandas after the projected load instead.
+
+    Raises:
+        MemoryError: If the projected data is larger than `max_bytes`.
+    """
+    columns = scan.columns if scan.columns is not None else table.column_names
+    table = table.select(_load_columns(columns, scan.filter_columns, table.column_names))
+    indices = None
+    if scan.row_filter is not None:
+        try:
+            mask = _arrow_mask(ast.parse(scan.row_filter, mode="eval").body, table)
+        except (pa.ArrowException, _NotPushable):
+            mask = None
+        if mask is not None:
+            indices = pc.indices_nonzero(mask)
+            table = table.take(indices)
+
+    loaded = table.select(list(columns))
+    if scan.row_filter is not None and indices is None:
+        # The filter runs in pandas, so its columns are loaded too.
+        loaded = table
+    check_load_size(loaded.nbytes, max_bytes)
+    df = loaded.to_pandas()
+    if indices is not None:
+        df.index = pd.Index(indices.to_numpy(), dtype="int64")
+    elif scan.row_filter is not None:
+        df = df.loc[evaluate(scan.row_filter, df), list(columns)]
+    return df
+
+
+def _load_columns(columns, filter_columns, available) -> list[str]:
+    missing = [c for c in [*columns, *filter_columns] if c not in available]
+    if missing:
+        raise KeyError(f"Columns not found: {missing}")
+    return list(dict.fromkeys([*columns, *filter_columns]))
+
+
+def check_load_size(nbytes: int, max_bytes: int) -> None:
+    """Raises MemoryError if a scan would load more than `max_bytes`."""
+    if nbytes > max_bytes:
+        raise MemoryError(
+            f"The data this expression needs is {nbytes / 1024**2:.0f} MB, more than the "
+            f"{max_bytes / 1024**2:.0f} MB that can be loaded at once. Filter the rows or "
+            "select fewer columns before joining."
+        )
+
+
+class _NotPushable(Exception):
+    pass
+
+
+def _arrow_mask(node: ast.AST, table: "pa.Table"):
+    """
+    Evaluates a row filter over `df` with Arrow compute functions. Nulls compare the
+    way NaN does in pandas: unequal to everything, so `!=` keeps them and every other
+    comparison drops them.
+    """
+    if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.BitAnd, ast.BitOr)):
+        combine = pc.and_ if isinstance(node.op, ast.BitAnd) else pc.or_
+        return combine(_arrow_mask(node.left, table), _arrow_mask(node.right, table))
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Invert):
+        return pc.invert(_arrow_mask(node.operand, table))
+    if isinstance(node, ast.Compare):
+        op, left, right = type(node.ops[0]), node.left, node.comparators[0]
+        if _column(left, FILTER_FRAME) is None:
+            op, left, right = _FLIPPED[op], right, left
+        column = table.column(_column(left, FILTER_FRAME))
+        result = getattr(pc, _COMPARATORS[op])(column, _literal(right))
+        return pc.fill_null(result, op is ast.NotEq)
+    if isinstance(node, ast.Call):
+        column = table.column(_column(node.func.value, FILTER_FRAME))
+        values = pa.array([_literal(elt) for elt in node.args[0].elts])
+        return pc.fill_null(pc.is_in(column, value_set=values), False)
+    raise _NotPushable()
+
+
+def _pushable_filter(tree: ast.Expression, name: str) -> Optional[ast.Subscript]:
+    """
+    The `name[<mask>]` subscript to push down, if the dataset is used nowhere else
+    in the expression.
+    """
+    candidates = [
+        node for node in ast.walk(tree)
+        if isinstance(node, ast.Subscript)
+        and _is_name(node.value, name)
+        and _is_mask(node.slice, name)
+    ]
+    if len(candidates) != 1:
+        return None
+    uses = sum(1 for node in ast.walk(tree) if _is_name(node, name))
+    if uses != sum(1 for node in ast.walk(candidates[0]) if _is_name(node, name)):
+        return None
+    return candidates[0]
+
+
+def _is_mask(node: ast.AST, name: str) -> bool:
+    if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.BitAnd, ast.BitOr)):
+        return _is_mask(node.left, name) and _is_mask(node.right, name)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Invert):
+        return _is_mask(node.operand, name)
+    if isinstance(node, ast.Compare):
+        if len(node.ops) != 1 or type(node.ops[0]) not in _COMPARATORS:
+            return False
+        left, right = node.left, node.comparators[0]
+        return (_column(left, name) is not None and _is_literal(right)) or (
+            _column(right, name) is not None and _is_literal(left)
+        )
+    return (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Attribute)
+        and node.func.attr == "isin"
+        and _column(node.func.value, name) is not None
+        and len(node.args) == 1
+        and not node.keywords
+        and isinstance(node.args[0], (ast.List, ast.Tuple))
+        and all(_is_literal(elt) for elt in node.args[0].elts)
+    )
+
+
+def _mask_columns(mask: ast.AST) -> list[str]:
+    return list(dict.fromkeys(
+        node.slice.value for node in ast.walk(mask)
+        if isinstance(node, ast.Subscript) and isinstance(node.slice, ast.Constant)
+    ))
+
+
+def _column(node: ast.AST, name: str) -> Optional[str]:
+    """The column of `<name>['col']`."""
+    if (
+        isinstance(node, ast.Subscript)
+        and _is_name(node.value, name)
+        and isinstance(node.slice, ast.Constant)
+        and isinstance(node.slice.value, str)
+    ):
+        return node.slice.value
+    return None
+
+
+def _is_literal(node: ast.AST) -> bool:
+    try:
+        _literal(node)
+    except _NotPushable:
+        return False
+    return True
+
+
+def _literal(node: ast.AST) -> Any:
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float, bool, str)):
+        return node.value
+    if (
+        isinstance(node, ast.UnaryOp)
+        and isinstance(node.op, ast.USub)
+        and isinstance(node.operand, ast.Constant)
+        and isinstance(node.operand.value, (int, float))
+        and not isinstance(node.operand.value, bool)
+    ):
+        return -node.operand.value
+    raise _NotPushable()
+
+
+def _is_name(node: ast.AST, name: str) -> bool:
+    return isinstance(node, ast.Name) and node.id == name
+
+
+def _column_labels(node: ast.AST) -> bool:
+    """Whether a subscript selects columns: `['a']` or `[['a', 'b']]`."""
+    if isinstance(node, ast.Constant):
+        return isinstance(node.value, str)
+    return (
+        isinstance(node, (ast.List, ast.Tuple))
+        and bool(node.elts)
+        and all(isinstance(elt, ast.Constant) and isinstance(elt.value, str) for elt in node.elts)
+    )
+
+
+def _copy(node: ast.AST) -> ast.AST:
+    return ast.parse(ast.unparse(node), mode="eval").body
+
+
+class _ReplaceNode(ast.NodeTransformer):
+    def __init__(self, target: ast.AST, replacement: ast.AST):
+        self.target = target
+        self.replacement = replacement
+
+    def visit(self, node: ast.AST) -> ast.AST:
+        if node is self.target:
+            return self.replacement
+        return super().visit(node)
+
+
+class _Rename(ast.NodeTransformer):
+    def __init__(self, old: str, new: str):
+        self.old = old
+        self.new = new
+
+    def visit_Name(self, node: ast.Name) -> ast.Name:
+        return ast.Name(id=self.new, ctx=node.ctx) if node.id == self.old else node
+
+
+class _ColumnUsage:
+    """
+    Finds the datasets an expression may need every column of.
+
+    Each sub-expression is classified by what it evaluates to: a frame with all of
+    some datasets' columns ("frame"), a groupby over one ("grouped"), its `.loc`
+    indexer ("loc"), or anything else (None). Selecting columns from a frame ends
+    its dependence on the others; any use not known to be safe marks its datasets
+    as needing every column.
+    """
+
+    def __init__(self, schemas: dict[str, dict[str, str]]):
+        self.schemas = schemas
+        self.whole: set[str] = set()
+        self.strings: set[str] = set()
+        self.suffixes: set[str] = set(DEFAULT_MERGE_SUFFIXES)
+
+    def run(self, tree: ast.Expression) -> None:
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Constant) and isinstance(node.value, str):
+                self.strings.add(node.value)
+            if isinstance(node, ast.Attribute):
+                self.strings.add(node.attr)
+            if isinstance(node, ast.keyword) and node.arg in ("suffixes", "lsuffix", "rsuffix"):
+                self.suffixes |= {
+                    n.value for n in ast.walk(node.value)
+                    if isinstance(n, ast.Constant) and isinstance(n.value, str)
+                }
+        self._use(tree.body)
+
+    def columns(self, name: str) -> list[str]:
+        """The dataset's columns the expression names, in schema order."""
+        named = []
+        for column in self.schemas[name]:
+            if (
+                column in self.strings
+                or any(f"{column}{suffix}" in self.strings for suffix in self.suffixes)
+            ):
+                named.append(column)
+        # A frame with no columns loses its row count, which `len(name)` may need.
+        return named or list(self.schemas[name])[:1]
+
+    def _use(self, node: ast.AST) -> None:
+        """Visits a sub-expression used in a way the analysis does not model."""
+        kind = self._visit(node)
+        if kind is not None:
+            self.whole |= kind[1]
+
+    def _use_arguments(self, node: ast.Call) -> None:
+        for arg in node.args:
+            self._use(arg)
+        for kw in node.keywords:
+            self._use(kw.value)
+
+    def _visit(self, node: ast.AST) -> Optional[tuple[str, frozenset]]:
+        if isinstance(node, ast.Name):
+            return ("frame", frozenset([node.id])) if node.id in self.schemas else None
+        if isinstance(node, ast.Subscript):
+            return self._subscript(node)
+        if isinstance(node, ast.Attribute):
+            return self._attribute(node)
+        if isinstance(node, ast.Call):
+            return self._call(node)
+        for child in ast.iter_child_nodes(node):
+            self._use(child)
+        return None
+
+    def _is_column(self, names: frozenset, attr: str) -> bool:
+        return any(attr in self.schemas[name] for name in names)
+
+    def _subscript(self, node: ast.Subscript):
+        receiver = self._visit(node.value)
+        if receiver is None:
+            self._use(node.slice)
+            return None
+        kind, names = receiver
+        if kind in ("frame", "grouped") and _column_labels(node.slice):
+            return None
+        if kind == "frame":
+            # A row mask or slice keeps every column.
+            self._use(node.slice)
+            return receiver
+        if kind == "loc":
+            if not isinstance(node.slice, ast.Tuple):
+                self._use(node.slice)
+                return ("frame", names)
+            if len(node.slice.elts) == 2 and _column_labels(node.slice.elts[1]):
+                self._use(node.slice.elts[0])
+                return None
+        self.whole |= names
+        self._use(node.slice)
+        return None
+
+    def _attribute(self, node: ast.Attribute):
+        receiver = self._visit(node.value)
+        if receiver is None:
+            return None
+        kind, names = receiver
+        if kind == "frame" and node.attr == "loc":
+            return ("loc", names)
+        if kind in ("frame", "grouped") and self._is_column(names, node.attr):
+            return None
+        self.whole |= names
+        return None
+
+    def _call(self, node: ast.Call):
+        func = node.func
+        if not isinstance(func, ast.Attribute):
+            if isinstance(func, ast.Name) and func.id == "len" and len(node.args) == 1:
+                # The row count does not depend on which columns are loaded.
+                self._visit(node.args[0])
+                return None
+            self._use(func)
+            self._use_arguments(node)
+            return None
+        if _is_name(func.value, "pd"):
+            return self._pandas_function(func.attr, node)
+
+        receiver = self._visit(func.value)
+        if receiver is None:
+            self._use_arguments(node)
+            return None
+        kind, names = receiver
+        method = func.attr
+        has_lambda = any(isinstance(n, ast.Lambda) for a in _arguments(node) for n in ast.walk(a))
+
+        if kind == "frame" and method in ("merge", "join"):
+            return self._merge(names, node, keyed=method == "join" or _has_merge_keys(node))
+        if kind == "frame" and not has_lambda:
+            if method in ROW_METHODS:
+                self._use_arguments(node)
+                return receiver
+            if method in SUBSET_METHODS and _has_subset(node):
+                self._use_arguments(node)
+                return None if method in ("value_counts", "duplicated") else receiver
+            if method == "groupby":
+                self._use_arguments(node)
+                return ("grouped", names)
+            if method in ("agg", "aggregate") and node.args and isinstance(node.args[0], ast.Dict):
+                self._use_arguments(node)
+                return None
+            if method == "pivot_table" and any(kw.arg == "values" for kw in node.keywords):
+                self._use_arguments(node)
+                return None
+        if kind == "grouped" and not has_lambda:
+            named_aggregation = not node.args and bool(node.keywords)
+            if method in ("agg", "aggregate") and (
+                named_aggregation or (node.args and isinstance(node.args[0], ast.Dict))
+            ):
+                self._use_arguments(node)
+                return None
+            if method in ("size", "ngroup", "cumcount"):
+                return None
+        self.whole |= names
+        self._use_arguments(node)
+        return None
+
+    def _pandas_function(self, function: str, node: ast.Call):
+        if function == "merge":
+            frames = frozenset()
+            for arg in _arguments(node):
+                kind = self._visit(arg)
+                if kind is not None and kind[0] == "frame":
+                    frames |= kind[1]
+                elif kind is not None:
+                    self.whole |= kind[1]
+            if not _has_merge_keys(node):
+                self.whole |= frames
+            return ("frame", frames) if frames else None
+        if function == "concat" and node.args and isinstance(node.args[0], (ast.List, ast.Tuple)):
+            frames = frozenset()
+            for elt in node.args[0].elts:
+                kind = self._visit(elt)
+                if kind is not None and kind[0] == "frame":
+                    frames |= kind[1]
+                elif kind is not None:
+                    self.whole |= kind[1]
+            for kw in node.keywords:
+                self._use(kw.value)
+            return ("frame", frames) if frames else None
+        if function == "pivot_table" and any(kw.arg == "values" for kw in node.keywords):
+            for arg in _arguments(node):
+                self._visit(arg)
+            return None
+        self._use_arguments(node)
+        return None
+
+    def _merge(self, names: frozenset, node: ast.Call, keyed: bool):
+        frames = names
+        for arg in _arguments(node):
+            kind = self._visit(arg)
+            if kind is not None and kind[0] == "frame":
+                frames |= kind[1]
+            elif kind is not None:
+                self.whole |= kind[1]
+        if not keyed:
+            # Without keys, merge joins on every column the two frames share.
+            self.whole |= frames
+        return ("frame", frames)
+
+
+def _arguments(node: ast.Call) -> list[ast.AST]:
+    return [*node.args, *(kw.value for kw in node.keywords)]
+
+
+def _has_merge_keys(node: ast.Call) -> bool:
+    return any(kw.arg in MERGE_KEYWORDS for kw in node.keywords)
+
+
+def _has_subset(node: ast.Call) -> bool:
+    if any(kw.arg == "subset" for kw in node.keywords):
+        return True
+    # drop_duplicates, duplicated and value_counts take the subset first.
+    return bool(node.args) and node.func.attr != "dropna" and _column_labels(node.args[0])